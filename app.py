@@ -3,7 +3,7 @@ import tagui as t
 import random
 import time
 from urllib.parse import urlparse
-from product_fetcher import fetch_and_save_products
+import ingestion_core
 from pymongo import MongoClient
 from google.cloud import bigquery
 from google.cloud.exceptions import NotFound
@@ -170,6 +170,8 @@ def run_rpa_tagui_script():
     my_new_ip = r.load("ip_proxy.txt")
     category_urls = r.load("category_url.txt").splitlines()
     random.shuffle(category_urls)
+    # Đọc số sản phẩm của từng danh mục trước, sau đó crawl tất cả trong một lần chạy ingestion
+    slug_limits = {}
     try:
         for url in category_urls:
             if my_ip == my_new_ip:
@@ -183,12 +185,17 @@ def run_rpa_tagui_script():
                 total_products_str = r.read('//*[@id="__next"]/div[1]/main/div/div[4]/div[2]/div[2]/div/div[6]/div[1]/span')
                 total_products = int(total_products_str)
                 r.wait(random_sleep(9, 10))
-                fetch_and_save_products(start_page=1, end_page=1, limit_value=total_products, slug_value=slug)
+                slug_limits[slug] = total_products
     except Exception as e:
         print(f"Error URL {url}: {str(e)}")
     finally:
         r.close()
 
+    ingestion_core.crawl_categories(
+        list(slug_limits), ingestion_core.configured_sinks(['mongo', 'archive']),
+        start_page=1, end_page=1, limits=slug_limits
+    )
+
 def run_bigquery_upload():
     product_data = fetch_mongo_data()
     upload_to_bigquery(product_data)
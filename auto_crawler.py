@@ -7,7 +7,7 @@ import time
 # Thêm đường dẫn
 sys.path.append('d:/Jupyter notebook/KingfoodMart')
 
-from crawl_kf import fetch_and_save_products
+import ingestion_core
 
 def load_categories():
     """Đọc danh sách categories từ file txt"""
@@ -35,27 +35,18 @@ def daily_crawl_job():
     print(f"🕙 Starting daily crawl at {datetime.now()}")
     
     categories = load_categories()
+    slugs = [extract_slug_from_url(category_url) for category_url in categories]
+    print(f"📂 Crawling {len(slugs)} categories")
     
-    for i, category_url in enumerate(categories, 1):
-        try:
-            slug = extract_slug_from_url(category_url)
-            
-            print(f"📂 [{i}/{len(categories)}] Crawling: {slug}")
-            
-            fetch_and_save_products(
-                start_page=1,
-                end_page=5,
-                limit_value=102,
-                slug_value=slug,
-                target_date=datetime.now()
-            )
-            
-            print(f"✅ Completed: {slug}")
-            time.sleep(3)  # Nghỉ 3s giữa các category để tránh spam
-            
-        except Exception as e:
-            print(f"❌ Error crawling {slug}: {e}")
-            continue  # Tiếp tục với category tiếp theo
+    # Một lần chạy ingestion cho mọi danh mục (kết nối, nạp trạng thái, metrics chỉ khởi tạo một lần)
+    try:
+        stats = ingestion_core.crawl_categories(
+            slugs, ingestion_core.configured_sinks(['mysql', 'archive']),
+            start_page=1, end_page=5, limit=102, target_date=datetime.now()
+        )
+        print(f"✅ Completed: {stats}")
+    except Exception as e:
+        print(f"❌ Error crawling categories: {e}")
     
     print(f"🎉 All categories completed at {datetime.now()}")
 
@@ -0,0 +1,338 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from unittest import mock
+
+import numpy as np
+
+import synthetic_data
+
+logger = logging.getLogger(__name__)
+
+# Benchmark cho toàn pipeline trên dữ liệu giả lập (synthetic_data):
+#   generate   - sinh catalog + document Mongo
+#   fetch_mongo - product_fetcher.fetch_and_save_products (API giả trong tiến trình)
+#   fetch_mysql - test.fetch_and_save_products (API giả trong tiến trình)
+#   migration  - MongoToMySQLMigration.migrate_data
+#   dashboard  - các hàm fetch_* của dashboard (bỏ qua cache Streamlit)
+# Chạy với MongoDB/MySQL local: các stage ghi dữ liệu dùng database riêng (--mongo-database,
+# --mysql-database) và migration sẽ xóa/tạo lại bảng trong database đó.
+STAGES = ['generate', 'fetch_mongo', 'fetch_mysql', 'migration', 'dashboard']
+
+FAKE_API_URL = 'http://synthetic.local/graphql'
+
+
+class StageResult:
+    """Kết quả một stage: số đơn vị xử lý, thời gian, độ trễ từng đơn vị và bộ nhớ đỉnh"""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.seconds = 0.0
+        self.latencies = []
+        self.peak_bytes = 0
+
+    def as_dict(self):
+        if self.latencies:
+            p50, p95, p99 = (round(float(value), 2)
+                             for value in np.percentile(np.array(self.latencies) * 1000, [50, 95, 99]))
+        else:
+            p50 = p95 = p99 = None
+        return {
+            'stage': self.name,
+            'unit': self.unit,
+            'items': self.items,
+            'seconds': round(self.seconds, 3),
+            'throughput_per_s': round(self.items / self.seconds, 1) if self.seconds else 0.0,
+            'p50_ms': p50,
+            'p95_ms': p95,
+            'p99_ms': p99,
+            'peak_mb': round(self.peak_bytes / (1024 * 1024), 1),
+        }
+
+
+@contextmanager
+def measure(result):
+    """Đo thời gian và bộ nhớ đỉnh (tracemalloc) của một stage"""
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result.seconds += time.perf_counter() - start
+        result.peak_bytes = max(result.peak_bytes, tracemalloc.get_traced_memory()[1])
+
+
+class CallTimeline:
+    """
+    Bọc một hàm và ghi thời điểm mỗi lần gọi; khoảng cách giữa hai lần gọi liên tiếp
+    là độ trễ xử lý một đơn vị (một trang API, một batch migration).
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.calls = []
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append(time.perf_counter())
+        return self.func(*args, **kwargs)
+
+    def latencies(self, end_time):
+        marks = self.calls + [end_time]
+        return [b - a for a, b in zip(marks, marks[1:])]
+
+
+class FakeResponse:
+    """Đủ thuộc tính của requests.Response mà các fetcher sử dụng"""
+
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self._body = body
+        self.text = json.dumps(body, ensure_ascii=False)
+
+    def json(self):
+        return self._body
+
+
+def make_fake_post(catalog):
+    """requests.post giả: trả trang ListingProductsBySlug từ catalog trong bộ nhớ"""
+    grouped = synthetic_data.products_by_slug(catalog)
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        variables = json['variables']
+        products = grouped.get(variables['slug'], [])
+        return FakeResponse(synthetic_data.listing_page(products, variables['slug'],
+                                                        variables['page'], variables['limit']))
+    return fake_post
+
+
+@contextmanager
+def offline_fetcher(catalog):
+    """
+    Thay requests.post/time.sleep/url của ingestion_core bằng bản giả trong tiến trình.
+    Archive phản hồi được ghi vào thư mục tạm và log ingest chỉ hiện cảnh báo trở lên.
+    """
+    import ingestion_core
+    import response_archive
+
+    timeline = CallTimeline(make_fake_post(catalog))
+    previous_dir = os.getcwd()
+    ingest_logger = logging.getLogger('ingest')
+    previous_level = ingest_logger.level
+    with tempfile.TemporaryDirectory() as work_dir:
+        archive = response_archive.ResponseArchive(os.path.join(work_dir, 'response_archive'))
+        with mock.patch.object(ingestion_core.requests, 'post', timeline), \
+                mock.patch('time.sleep', lambda seconds: None), \
+                mock.patch.object(ingestion_core, 'url', FAKE_API_URL), \
+                mock.patch.object(response_archive, 'get_archive', lambda: archive), \
+                mock.patch('builtins.print', lambda *args, **kwargs: None):
+            os.chdir(work_dir)
+            ingest_logger.setLevel(logging.WARNING)
+            try:
+                yield timeline
+            finally:
+                archive.close()
+                ingest_logger.setLevel(previous_level)
+                os.chdir(previous_dir)
+
+
+def run_fetch_stage(name, args, call_fetcher):
+    """Chạy fetcher cho mọi danh mục trong args.days ngày, đo độ trễ theo trang"""
+    rng = random.Random(args.seed)
+    catalog = synthetic_data.generate_catalog(args.products, seed=args.seed)
+    grouped = synthetic_data.products_by_slug(catalog)
+    result = StageResult(name, 'page')
+    start_date = datetime.now() - timedelta(days=args.days - 1)
+
+    for day in range(args.days):
+        target_date = start_date + timedelta(days=day)
+        with offline_fetcher(catalog) as timeline, measure(result):
+            for slug, products in grouped.items():
+                last_page = synthetic_data.page_count(len(products), args.limit)
+                call_fetcher(last_page, slug, target_date)
+            end_time = time.perf_counter()
+        # Lần gọi cuối của mỗi danh mục là trang rỗng báo hết dữ liệu (hoặc trang cuối)
+        result.latencies.extend(timeline.latencies(end_time))
+        result.items += len(timeline.calls)
+        synthetic_data.advance_day(catalog, rng)
+    return result
+
+
+def stage_generate(args):
+    result = StageResult('generate', 'document')
+    with measure(result):
+        documents = synthetic_data.generate_mongo_documents(args.products, args.days, seed=args.seed)
+    result.items = len(documents)
+    return result
+
+
+def stage_fetch_mongo(args):
+    import product_fetcher
+    from pymongo import MongoClient
+
+    client = MongoClient(os.getenv('MONGO_URI'))
+    collection = client[args.mongo_database]['kf_new']
+    collection.drop()
+    try:
+        with mock.patch.object(product_fetcher, 'collection', collection):
+            # product_fetcher luôn ghi theo ngày hiện tại nên các ngày giả lập cập nhật cùng một ngày
+            return run_fetch_stage(
+                'fetch_mongo', args,
+                lambda last_page, slug, target_date: product_fetcher.fetch_and_save_products(
+                    1, last_page, args.limit, slug)
+            )
+    finally:
+        client.close()
+
+
+def stage_fetch_mysql(args):
+    import test as mysql_fetcher
+    import mysql.connector
+
+    def benchmark_connection():
+        return mysql.connector.connect(
+            host=os.getenv('MYSQL_HOST', 'localhost'),
+            port=int(os.getenv('MYSQL_PORT', '3306')),
+            user=os.getenv('MYSQL_USERNAME', 'root'),
+            password=os.getenv('MYSQL_PASSWORD', '123456789@'),
+            database=args.mysql_database,
+        )
+
+    with mock.patch.object(mysql_fetcher, 'create_connection', benchmark_connection):
+        return run_fetch_stage(
+            'fetch_mysql', args,
+            lambda last_page, slug, target_date: mysql_fetcher.fetch_and_save_products(
+                1, last_page, args.limit, slug, target_date=target_date)
+        )
+
+
+def stage_migration(args):
+    from pymongo import MongoClient
+    from migration2_script import MongoToMySQLMigration
+
+    documents = synthetic_data.generate_mongo_documents(args.products, args.days, seed=args.seed)
+    client = MongoClient(os.getenv('MONGO_URI'))
+    collection = client[args.mongo_database]['kf_new']
+    collection.drop()
+    collection.insert_many(documents)
+    client.close()
+
+    migration = MongoToMySQLMigration()
+    migration.create_table_structure()
+    timeline = CallTimeline(migration.migrate_products_batch)
+    result = StageResult('migration', 'document')
+    with mock.patch.object(migration, 'migrate_products_batch', timeline), \
+            mock.patch('builtins.print', lambda *a, **k: None), \
+            measure(result):
+        migration.migrate_data(batch_size=args.batch_size)
+        end_time = time.perf_counter()
+    # Độ trễ theo batch quy về mỗi document
+    for latency in timeline.latencies(end_time):
+        result.latencies.extend([latency / args.batch_size] * args.batch_size)
+    result.items = migration.migration_stats['total_processed']
+    return result
+
+
+def dashboard_queries():
+    """Các fetch_* tiêu biểu với bộ lọc mặc định của dashboard"""
+    import dashboard
+    end = datetime.now()
+    start = end - timedelta(days=30)
+    return [
+        ('fetch_sales_kpis', dashboard.fetch_sales_kpis, (start, end, 'Tất cả', 'all', '')),
+        ('fetch_revenue_by_category_time', dashboard.fetch_revenue_by_category_time, ('day', start, end)),
+        ('fetch_sales_trend', dashboard.fetch_sales_trend, ('day', start, end)),
+        ('fetch_best_worst_sellers', dashboard.fetch_best_worst_sellers, (start, end, 10)),
+        ('fetch_category_analysis', dashboard.fetch_category_analysis, ()),
+        ('fetch_stock_history_page', dashboard.fetch_stock_history_page, (start, end)),
+        ('fetch_inventory_summary', dashboard.fetch_inventory_summary, ()),
+    ]
+
+
+def stage_dashboard(args):
+    os.environ['DASHBOARD_MYSQL_DATABASE'] = args.mysql_database
+    results = []
+    for name, func, query_args in dashboard_queries():
+        # __wrapped__ là hàm gốc, không qua st.cache_data: đo chi phí truy vấn thật
+        raw_func = getattr(func, '__wrapped__', func)
+        result = StageResult(f"dashboard.{name}", 'query')
+        with measure(result):
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                raw_func(*query_args)
+                result.latencies.append(time.perf_counter() - start)
+        result.items = args.repeat
+        results.append(result)
+    return results
+
+
+STAGE_RUNNERS = {
+    'generate': stage_generate,
+    'fetch_mongo': stage_fetch_mongo,
+    'fetch_mysql': stage_fetch_mysql,
+    'migration': stage_migration,
+    'dashboard': stage_dashboard,
+}
+
+
+def print_report(rows):
+    def ms(value):
+        return f"{value:>9.2f}" if value is not None else f"{'-':>9}"
+
+    header = f"{'stage':<42}{'items':>9}{'sec':>9}{'items/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['stage']:<42}{row['items']:>9}{row['seconds']:>9.2f}{row['throughput_per_s']:>11.1f}"
+              f"{ms(row['p50_ms'])}{ms(row['p95_ms'])}{ms(row['p99_ms'])}{row['peak_mb']:>9.1f}")
+
+
+def main():
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    parser = argparse.ArgumentParser(description='Benchmark pipeline KingFoodMart trên dữ liệu giả lập')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=['generate'],
+                        help='Các stage cần chạy (mặc định: generate)')
+    parser.add_argument('--products', type=int, default=2000, help='Số sản phẩm trong catalog')
+    parser.add_argument('--days', type=int, default=7, help='Số ngày lịch sử')
+    parser.add_argument('--limit', type=int, default=102, help='Số sản phẩm mỗi trang API')
+    parser.add_argument('--batch-size', type=int, default=200, help='Batch size của migration')
+    parser.add_argument('--repeat', type=int, default=20, help='Số lần lặp mỗi truy vấn dashboard')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mongo-database', default='kf_benchmark')
+    parser.add_argument('--mysql-database', default='kfm_benchmark')
+    parser.add_argument('--json', dest='json_path', help='Ghi kết quả ra file JSON')
+    args = parser.parse_args()
+
+    # migration đọc database từ biến môi trường
+    os.environ['MONGO_DATABASE'] = args.mongo_database
+    os.environ['MYSQL_DATABASE'] = args.mysql_database
+
+    tracemalloc.start()
+    rows = []
+    for stage in args.stages:
+        outcome = STAGE_RUNNERS[stage](args)
+        for result in outcome if isinstance(outcome, list) else [outcome]:
+            rows.append(result.as_dict())
+    tracemalloc.stop()
+
+    print_report(rows)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': rows}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Đặt thư mục gốc của repo vào sys.path để tests/ import được các module (migration2_script, ...)
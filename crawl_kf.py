@@ -3,7 +3,7 @@ import tagui as t
 import random
 import time
 from urllib.parse import urlparse
-from test import fetch_and_save_products
+import ingestion_core
 
 def random_sleep(lower_limit, upper_limit):
     if lower_limit > upper_limit:
@@ -20,6 +20,8 @@ my_ip = "unknown"
 # my_new_ip = r.load("ip_proxy.txt")
 category_urls = r.load("category_url.txt").splitlines()
 random.shuffle(category_urls)
+# Đọc số sản phẩm của từng danh mục trước, sau đó crawl tất cả trong một lần chạy ingestion
+slug_limits = {}
 try:   
     for url in category_urls:
         try:
@@ -52,7 +54,7 @@ try:
             
             print(f"Total products: {total_products}")
             r.wait(random_sleep(2, 3))
-            fetch_and_save_products(start_page=1, end_page=3, limit_value=total_products, slug_value=slug)
+            slug_limits[slug] = total_products
             
         except Exception as e:
             print(f"Error processing {url}: {e}")
@@ -64,3 +66,8 @@ except Exception as e:
 finally:
     r.close()
 
+ingestion_core.crawl_categories(
+    list(slug_limits), ingestion_core.configured_sinks(['mysql', 'archive']),
+    start_page=1, end_page=3, limits=slug_limits
+)
+
@@ -1,3 +1,4 @@
+import os
 import streamlit as st
 import mysql.connector
 import pandas as pd
@@ -6,13 +7,18 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import time
 import logging
-import hashlib
 import json
 import decimal
 import re
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
+import functools
 import numpy as np
+import dashboard_db
+import metrics
+import duckdb_backend
+import time_buckets
+import price_segments
+from inventory_snapshot import INVENTORY_STATUSES
+from product_search import load_search_index, resolve_keyword, product_id_filter_sql
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -20,22 +26,10 @@ logger = logging.getLogger(__name__)
 
 # Database connection configurations
 def get_db_connection():
-    """Kết nối đến MySQL database"""
+    """Mượn kết nối MySQL từ pool dùng chung (close() trả kết nối về pool)"""
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            database='kfm',
-            user='root',
-            password='123456789@',
-            port=3306,
-            autocommit=True,
-            use_unicode=True,
-            charset='utf8mb4',
-            collation='utf8mb4_unicode_ci',
-            connection_timeout=10
-        )
+        connection = dashboard_db.get_connection()
         if connection.is_connected():
-            logger.info("Kết nối MySQL thành công")
             return connection
         else:
             logger.error("MySQL connection failed")
@@ -46,9 +40,35 @@ def get_db_connection():
     except Exception as e:
         logger.error(f"Lỗi kết nối MySQL: {e}")
         return None
+
+def get_analytics_connection():
+    """
+    Kết nối cho các truy vấn tổng hợp trên daily_sales_rollup: DuckDB khi DASHBOARD_BACKEND=duckdb
+    và file đã được dựng, ngược lại dùng MySQL. Cùng giao diện cursor()/close().
+    """
+    if duckdb_backend.duckdb_enabled():
+        try:
+            return duckdb_backend.DuckDBConnection()
+        except Exception as e:
+            logger.error(f"Lỗi mở DuckDB, dùng MySQL: {e}")
+    return get_db_connection()
+
+# Lọc ngày bằng khoảng [day_start(từ ngày), day_after(đến ngày)) trên chính cột date
+# thay vì DATE(cột), để MySQL dùng được index trên cột date
+def day_start(value):
+    """00:00 của ngày (nhận date hoặc datetime)"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return datetime.combine(value, datetime.min.time())
+
+def day_after(value):
+    """00:00 của ngày kế tiếp - cận trên (không bao gồm) của khoảng lọc"""
+    return day_start(value) + timedelta(days=1)
+
+@dashboard_db.cached_query('trend')
 def fetch_revenue_by_category_time(view_type='day', start_date=None, end_date=None):
-    """Lấy doanh thu theo danh mục và thời gian cho stacked bar chart"""
-    connection = get_db_connection()
+    """Lấy doanh thu theo danh mục và thời gian cho stacked bar chart (từ daily_sales_rollup)"""
+    connection = get_analytics_connection()
     if connection is not None:
         try:
             cursor = connection.cursor()
@@ -58,69 +78,93 @@ def fetch_revenue_by_category_time(view_type='day', start_date=None, end_date=No
             if not end_date:
                 end_date = datetime.now()
             
-            # Truy vấn dữ liệu theo view_type
-            if view_type == 'day':
-                query = """
-                SELECT DATE(sh.date) as period, p.category,
-                       COALESCE(SUM(sh.stock_decreased * p.price), 0) as revenue
-                FROM stock_history sh
-                JOIN product p ON sh.product_id = p.product_id
-                WHERE sh.stock_decreased > 0
-                AND DATE(sh.date) >= %s AND DATE(sh.date) <= %s
-                GROUP BY DATE(sh.date), p.category
-                ORDER BY DATE(sh.date), p.category
-                """
-            elif view_type == 'week':
-                query = """
-                SELECT CONCAT(YEAR(sh.date), '-W', LPAD(WEEK(sh.date), 2, '0')) as period, p.category,
-                       COALESCE(SUM(sh.stock_decreased * p.price), 0) as revenue
-                FROM stock_history sh
-                JOIN product p ON sh.product_id = p.product_id
-                WHERE sh.stock_decreased > 0
-                AND DATE(sh.date) >= %s AND DATE(sh.date) <= %s
-                GROUP BY YEAR(sh.date), WEEK(sh.date), p.category
-                ORDER BY YEAR(sh.date), WEEK(sh.date), p.category
-                """
-            elif view_type == 'month':
-                query = """
-                SELECT DATE_FORMAT(sh.date, '%Y-%m') as period, p.category,
-                       COALESCE(SUM(sh.stock_decreased * p.price), 0) as revenue
-                FROM stock_history sh
-                JOIN product p ON sh.product_id = p.product_id
-                WHERE sh.stock_decreased > 0
-                AND DATE(sh.date) >= %s AND DATE(sh.date) <= %s
-                GROUP BY DATE_FORMAT(sh.date, '%Y-%m'), p.category
-                ORDER BY DATE_FORMAT(sh.date, '%Y-%m'), p.category
-                """
-            else:  # year
-                query = """
-                SELECT YEAR(sh.date) as period, p.category,
-                       COALESCE(SUM(sh.stock_decreased * p.price), 0) as revenue
-                FROM stock_history sh
-                JOIN product p ON sh.product_id = p.product_id
-                WHERE sh.stock_decreased > 0
-                AND DATE(sh.date) >= %s AND DATE(sh.date) <= %s
-                GROUP BY YEAR(sh.date), p.category
-                ORDER BY YEAR(sh.date), p.category
-                """
+            joins, where, params = rollup_filter_sql(start_date, end_date)
+            query = f"""
+            SELECT r.date, r.category, COALESCE(SUM(r.revenue), 0) as revenue
+            FROM daily_sales_rollup r{joins}{where}
+            GROUP BY r.date, r.category
+            """
             
-            cursor.execute(query, [start_date, end_date])
+            cursor.execute(query, params)
             results = cursor.fetchall()
             
-            if results:
-                df = pd.DataFrame(list(results), columns=['period', 'category', 'revenue'])
-                return df
-            else:
+            if not results:
                 return pd.DataFrame(columns=['period', 'category', 'revenue'])
+            
+            # Ma trận kỳ × danh mục liên tục (kỳ không bán = 0)
+            dates, categories, revenues = zip(*results)
+            return time_buckets.dense_matrix(dates, categories, revenues, start_date, end_date, view_type)
                 
         except Exception as e:
             logger.error(f"Lỗi truy vấn doanh thu theo danh mục và thời gian: {e}")
             return pd.DataFrame(columns=['period', 'category', 'revenue'])
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return pd.DataFrame(columns=['period', 'category', 'revenue'])
 
+# Từ khóa tìm kiếm được giải thành tập product_id một lần (index trigram không dấu trong bộ nhớ)
+# thay vì `p.name LIKE '%từ khóa%'` quét toàn bảng product ở mọi truy vấn
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_product_search_index(data_version):
+    """Search index tên sản phẩm, dựng lại khi data_version thay đổi"""
+    connection = get_db_connection()
+    if connection is None:
+        raise RuntimeError("Không có kết nối MySQL để dựng search index")
+    try:
+        cursor = connection.cursor()
+        return load_search_index(cursor)
+    finally:
+        connection.close()
+
+@dashboard_db.cached_query('catalog')
+def resolve_search_keyword(search_keyword):
+    """
+    KeywordFilter của từ khóa (product_id khớp không phân biệt dấu, hoặc None để lọc bằng LIKE).
+    Gọi một lần mỗi lần rerun trước khi mượn kết nối, rồi truyền vào các fetch_*.
+    """
+    return resolve_keyword(search_keyword, lambda: get_product_search_index(dashboard_db.get_data_version()))
+
+# Điều kiện phân khúc giá dùng chung (alias p = product)
+PRICE_RANGE_CONDITIONS = {
+    'high': "p.price > 75000",
+    'medium': "p.price BETWEEN 31500 AND 75000",
+    'low': "p.price < 31500",
+}
+
+def rollup_filter_sql(start_date=None, end_date=None, category=None, keyword_filter=None, price_range=None):
+    """
+    Tạo phần JOIN/WHERE cho truy vấn trên daily_sales_rollup (alias r).
+    Chỉ join product khi cần lọc theo giá. Trả về (joins, where, params).
+    """
+    joins = ""
+    conditions = []
+    params = []
+    
+    if start_date:
+        conditions.append("r.date >= %s")
+        params.append(day_start(start_date).date())
+    
+    if end_date:
+        conditions.append("r.date <= %s")
+        params.append(day_start(end_date).date())
+    
+    if category and category not in ('Tất cả', 'all'):
+        conditions.append("r.category = %s")
+        params.append(category)
+    
+    if keyword_filter:
+        keyword_sql, keyword_params = product_id_filter_sql("r.product_id", keyword_filter)
+        conditions.append(keyword_sql)
+        params.extend(keyword_params)
+    
+    price_condition = PRICE_RANGE_CONDITIONS.get(price_range)
+    if price_condition:
+        joins = " JOIN product p ON r.product_id = p.product_id"
+        conditions.append(price_condition)
+    
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return joins, where, params
+
 def main():
     st.set_page_config(
         page_title="☕ Coffee Shop Dashboard",
@@ -199,41 +243,42 @@ def main():
 
 # Database watcher class
 class DatabaseWatcher:
-    def __init__(self):
-        self.last_hash = None
-        self.observers = []
+    """
+    Phát hiện dữ liệu thay đổi qua data_version (job ghi dữ liệu tăng sau mỗi lần commit),
+    không quét product/stock_history. Việc đọc MySQL còn được giới hạn bởi min_interval
+    và cache VERSION_POLL_TTL dùng chung giữa các phiên, độc lập với số lần rerun.
+    """
+    def __init__(self, min_interval=dashboard_db.VERSION_POLL_TTL):
+        self.min_interval = min_interval
+        self.last_version = None
+        self.last_poll = 0.0
     
-    def get_database_hash(self):
-        """Tạo hash từ dữ liệu database để detect thay đổi"""
-        try:
-            connection = get_db_connection()
-            if connection:
-                cursor = connection.cursor()
-                
-                # Get hash of key tables
-                cursor.execute("SELECT COUNT(*), COALESCE(MAX(UNIX_TIMESTAMP(updated_at)), UNIX_TIMESTAMP(NOW())) FROM product")
-                product_data = cursor.fetchone()
-                
-                cursor.execute("SELECT COUNT(*), COALESCE(MAX(UNIX_TIMESTAMP(date)), UNIX_TIMESTAMP(NOW())) FROM stock_history")
-                stock_data = cursor.fetchone()
-                
-                # Create hash
-                data_string = f"{product_data}{stock_data}"
-                return hashlib.md5(data_string.encode()).hexdigest()
-        except Exception as e:
-            logger.error(f"Lỗi tạo hash database: {e}")
-            return None
+    def get_data_version(self):
+        """Phiên bản dữ liệu hiện tại (None nếu không đọc được)"""
+        return dashboard_db.get_data_version()
     
     def check_for_changes(self):
-        """Check for database changes"""
-        current_hash = self.get_database_hash()
-        if current_hash and current_hash != self.last_hash:
-            self.last_hash = current_hash
+        """True nếu data_version đã tăng kể từ lần kiểm tra trước"""
+        now = time.monotonic()
+        if now - self.last_poll < self.min_interval:
+            return False
+        self.last_poll = now
+        
+        current_version = self.get_data_version()
+        if current_version is None:
+            return False
+        if self.last_version is None:
+            # Lần kiểm tra đầu chỉ ghi nhận trạng thái, không phải thay đổi
+            self.last_version = current_version
+            return False
+        if current_version != self.last_version:
+            self.last_version = current_version
             return True
         return False
 
 # Enhanced data fetching functions
-def fetch_slow_sellers(start_date=None, end_date=None, limit=10, category_filter=None, search_keyword=None):
+@dashboard_db.cached_query('analysis')
+def fetch_slow_sellers(start_date=None, end_date=None, limit=10, category_filter=None, keyword_filter=None):
     connection = get_db_connection()
     if connection is not None:
         try:
@@ -246,17 +291,18 @@ def fetch_slow_sellers(start_date=None, end_date=None, limit=10, category_filter
             """
             params = []
             if start_date:
-                query += " AND (sh.date IS NULL OR DATE(sh.date) >= %s)"
-                params.append(start_date)
+                query += " AND (sh.date IS NULL OR sh.date >= %s)"
+                params.append(day_start(start_date))
             if end_date:
-                query += " AND (sh.date IS NULL OR DATE(sh.date) <= %s)"
-                params.append(end_date)
+                query += " AND (sh.date IS NULL OR sh.date < %s)"
+                params.append(day_after(end_date))
             if category_filter and category_filter != 'Tất cả':
                 query += " AND p.category = %s"
                 params.append(category_filter)
-            if search_keyword:
-                query += " AND p.name LIKE %s"
-                params.append(f"%{search_keyword}%")
+            if keyword_filter:
+                keyword_sql, keyword_params = product_id_filter_sql("p.product_id", keyword_filter)
+                query += f" AND {keyword_sql}"
+                params.extend(keyword_params)
             query += " GROUP BY p.product_id, p.name HAVING transaction_count >= 1 AND transaction_count <= 10 ORDER BY transaction_count ASC"
             cursor.execute(query, params)
             results = cursor.fetchall()
@@ -275,51 +321,73 @@ def fetch_slow_sellers(start_date=None, end_date=None, limit=10, category_filter
             logger.error(f'Lỗi truy vấn sản phẩm bán chậm: {e}')
             return pd.DataFrame(columns=pd.Index(['product_name', 'transaction_count']))
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return pd.DataFrame(columns=pd.Index(['product_name', 'transaction_count']))
 
-@st.cache_data(ttl=60)
-def fetch_inventory_status():
-    """Lấy trạng thái tồn kho"""
+@dashboard_db.cached_query('inventory')
+def fetch_inventory_summary():
+    """Số sản phẩm và tổng tồn kho theo trạng thái (GROUP BY trên inventory_snapshot)"""
+    empty_df = pd.DataFrame(columns=pd.Index(['status', 'product_count', 'total_stock']))
+    connection = get_db_connection()
+    if connection is not None:
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+            SELECT status, COUNT(*) as product_count, COALESCE(SUM(stock_quantity), 0) as total_stock
+            FROM inventory_snapshot
+            GROUP BY status
+            """)
+            results = cursor.fetchall()
+            if not results:
+                return empty_df
+            df = pd.DataFrame(list(results), columns=empty_df.columns)
+            # Sắp theo thứ tự trạng thái cố định thay vì thứ tự chữ cái
+            order = {status: i for i, status in enumerate(INVENTORY_STATUSES)}
+            return df.sort_values('status', key=lambda s: s.map(order)).reset_index(drop=True)
+        except Exception as e:
+            logger.error(f"Lỗi truy vấn tổng hợp tồn kho: {e}")
+            return empty_df
+        finally:
+            connection.close()
+    return empty_df
+
+@dashboard_db.cached_query('inventory')
+def fetch_inventory_status(status=None):
+    """Lấy danh sách sản phẩm của một trạng thái tồn kho (None = tất cả)"""
+    columns = pd.Index(['product_name', 'stock_quantity', 'status', 'price', 'category'])
     connection = get_db_connection()
     if connection is not None:
         try:
             cursor = connection.cursor()
             
             query = """
-            SELECT 
-                p.name,
-                p.stock_quantity,
-                CASE 
-                    WHEN p.stock_quantity = 0 THEN 'Hết hàng'
-                    WHEN p.stock_quantity <= 10 THEN 'Sắp hết'
-                    WHEN p.stock_quantity <= 50 THEN 'Tồn kho thấp'
-                    ELSE 'Tồn kho tốt'
-                END as status,
-                p.price,
-                p.category
-            FROM product p
-            ORDER BY p.stock_quantity ASC
+            SELECT name, stock_quantity, status, price, category
+            FROM inventory_snapshot
             """
+            params = []
             
-            cursor.execute(query)
+            if status:
+                query += " WHERE status = %s"
+                params.append(status)
+            
+            query += " ORDER BY stock_quantity ASC"
+            
+            cursor.execute(query, params)
             results = cursor.fetchall()
             
             if results:
-                df = pd.DataFrame(list(results), columns=pd.Index(['product_name', 'stock_quantity', 'status', 'price', 'category']))
-                return df
+                return pd.DataFrame(list(results), columns=columns)
             else:
-                return pd.DataFrame(columns=pd.Index(['product_name', 'stock_quantity', 'status', 'price', 'category']))
+                return pd.DataFrame(columns=columns)
         except Exception as e:
             logger.error(f"Lỗi truy vấn trạng thái tồn kho: {e}")
-            return pd.DataFrame(columns=pd.Index(['product_name', 'stock_quantity', 'status', 'price', 'category']))
+            return pd.DataFrame(columns=columns)
         finally:
-            if connection.is_connected():
-                connection.close()
-    return pd.DataFrame(columns=pd.Index(['product_name', 'stock_quantity', 'status', 'price', 'category']))
+            connection.close()
+    return pd.DataFrame(columns=columns)
 
-def fetch_all_products(category_filter=None, search_keyword=None):
+@dashboard_db.cached_query('catalog')
+def fetch_all_products(category_filter=None, keyword_filter=None):
     connection = get_db_connection()
     if connection is not None:
         try:
@@ -342,9 +410,10 @@ def fetch_all_products(category_filter=None, search_keyword=None):
                 query += " AND category = %s"
                 params.append(category_filter)
             
-            if search_keyword:
-                query += " AND name LIKE %s"
-                params.append(f"%{search_keyword}%")
+            if keyword_filter:
+                keyword_sql, keyword_params = product_id_filter_sql("product_id", keyword_filter)
+                query += f" AND {keyword_sql}"
+                params.extend(keyword_params)
             
             query += " ORDER BY name"
             
@@ -365,137 +434,154 @@ def fetch_all_products(category_filter=None, search_keyword=None):
                 'ID', 'Tên sản phẩm', 'Danh mục', 'Giá', 'Tồn kho', 'Khuyến mãi', 'Ngày'
             ]))
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return pd.DataFrame(columns=pd.Index([
         'ID', 'Tên sản phẩm', 'Danh mục', 'Giá', 'Tồn kho', 'Khuyến mãi', 'Ngày'
     ]))
 
-def fetch_all_stock_history(start_date=None, end_date=None, category_filter=None, search_keyword=None):
-    """Lấy tất cả lịch sử tồn kho, có thể lọc theo khoảng thời gian"""
+# Báo cáo chi tiết phân trang theo keyset (date, id): mỗi trang chỉ đọc page_size dòng
+# bắt đầu từ khóa của dòng cuối trang trước, không OFFSET và không tải toàn bộ lịch sử
+DETAIL_PAGE_SIZES = [50, 100, 200, 500]
+
+STOCK_HISTORY_COLUMNS = ['ID', 'Tên sản phẩm', 'Nhập kho', 'Xuất kho', 'Ngày']
+PRICE_HISTORY_COLUMNS = ['ID', 'Tên sản phẩm', 'Giá mới', 'Giá cũ', 'Ngày']
+# Giới hạn đếm số dòng khớp bộ lọc; vượt quá thì hiển thị "10,000+"
+HISTORY_COUNT_CAP = 10000
+
+def history_filter_sql(alias, start_date=None, end_date=None, category_filter=None, keyword_filter=None):
+    """Điều kiện lọc chung cho stock_history/price_history (join product alias p). Trả về (where, params)"""
+    conditions = ["1=1"]
+    params = []
+    
+    if start_date:
+        conditions.append(f"{alias}.date >= %s")
+        params.append(day_start(start_date))
+    
+    if end_date:
+        conditions.append(f"{alias}.date < %s")
+        params.append(day_after(end_date))
+    
+    if category_filter and category_filter != 'Tất cả':
+        conditions.append("p.category = %s")
+        params.append(category_filter)
+    
+    if keyword_filter:
+        keyword_sql, keyword_params = product_id_filter_sql(f"{alias}.product_id", keyword_filter)
+        conditions.append(keyword_sql)
+        params.extend(keyword_params)
+    
+    return " WHERE " + " AND ".join(conditions), params
+
+def _fetch_keyset_page(table, alias, select_columns, df_columns, start_date, end_date,
+                       category_filter, keyword_filter, page_size, descending, after):
+    """
+    Đọc một trang lịch sử sắp theo (date, id). `after` là khóa (date, id) của dòng cuối
+    trang trước (None = trang đầu). Trả về (DataFrame, khóa của trang kế tiếp hoặc None).
+    """
     connection = get_db_connection()
-    if connection is not None:
-        try:
-            cursor = connection.cursor()
-            query = """
-            SELECT 
-                sh.id,
-                p.name as product_name,
-                sh.stock_increased,
-                sh.stock_decreased,
-                sh.date
-            FROM stock_history sh
-            JOIN product p ON sh.product_id = p.product_id
-            WHERE 1=1
-            """
-            params = []
-            
-            if start_date:
-                query += " AND DATE(sh.date) >= %s"
-                params.append(start_date)
-            
-            if end_date:
-                query += " AND DATE(sh.date) <= %s"
-                params.append(end_date)
-            
-            if category_filter and category_filter != 'Tất cả':
-                query += " AND p.category = %s"
-                params.append(category_filter)
-            
-            if search_keyword:
-                query += " AND p.name LIKE %s"
-                params.append(f"%{search_keyword}%")
-                
-            query += " ORDER BY sh.date DESC"
-            
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            
-            if results:
-                df = pd.DataFrame(list(results), columns=pd.Index([
-                    'ID', 'Tên sản phẩm', 'Nhập kho', 'Xuất kho', 'Ngày'
-                ]))
-                return df
-            else:
-                return pd.DataFrame(columns=pd.Index([
-                    'ID', 'Tên sản phẩm', 'Nhập kho', 'Xuất kho', 'Ngày'
-                ]))
-        except Exception as e:
-            logger.error(f"Lỗi truy vấn lịch sử tồn kho: {e}")
-            return pd.DataFrame(columns=pd.Index([
-                'ID', 'Tên sản phẩm', 'Nhập kho', 'Xuất kho', 'Ngày'
-            ]))
-        finally:
-            if connection.is_connected():
-                connection.close()
-    return pd.DataFrame(columns=pd.Index([
-        'ID', 'Tên sản phẩm', 'Nhập kho', 'Xuất kho', 'Ngày'
-    ]))
+    if connection is None:
+        return pd.DataFrame(columns=pd.Index(df_columns)), None
+    try:
+        cursor = connection.cursor()
+        where, params = history_filter_sql(alias, start_date, end_date, category_filter, keyword_filter)
+        
+        if after is not None:
+            op = "<" if descending else ">"
+            where += f" AND ({alias}.date {op} %s OR ({alias}.date = %s AND {alias}.id {op} %s))"
+            params.extend([after[0], after[0], after[1]])
+        
+        direction = "DESC" if descending else "ASC"
+        # Lấy dư một dòng để biết còn trang sau hay không
+        query = f"""
+        SELECT {select_columns}
+        FROM {table} {alias}
+        JOIN product p ON {alias}.product_id = p.product_id
+        {where}
+        ORDER BY {alias}.date {direction}, {alias}.id {direction}
+        LIMIT %s
+        """
+        params.append(page_size + 1)
+        
+        cursor.execute(query, params)
+        results = cursor.fetchall()
+        
+        next_after = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            last = results[-1]
+            next_after = (last[-1], last[0])
+        
+        return pd.DataFrame(list(results), columns=pd.Index(df_columns)), next_after
+    except Exception as e:
+        logger.error(f"Lỗi truy vấn trang {table}: {e}")
+        return pd.DataFrame(columns=pd.Index(df_columns)), None
+    finally:
+        connection.close()
 
-def fetch_all_price_history(start_date=None, end_date=None, category_filter=None, search_keyword=None):
-    """Lấy tất cả lịch sử giá, có thể lọc theo khoảng thời gian"""
+def _count_history_rows(table, alias, start_date, end_date, category_filter, keyword_filter):
+    """
+    Số dòng khớp bộ lọc để hiển thị số trang, đếm tối đa HISTORY_COUNT_CAP + 1 dòng
+    (không quét toàn bộ lịch sử chỉ để in tổng). Kết quả > HISTORY_COUNT_CAP nghĩa là "nhiều hơn".
+    """
     connection = get_db_connection()
-    if connection is not None:
-        try:
-            cursor = connection.cursor()
-            query = """
-            SELECT 
-                ph.id,
-                p.name as product_name,
-                ph.price,
-                ph.original_price,
-                ph.date
-            FROM price_history ph
-            JOIN product p ON ph.product_id = p.product_id
-            WHERE 1=1
-            """
-            params = []
-            
-            if start_date:
-                query += " AND DATE(ph.date) >= %s"
-                params.append(start_date)
-            
-            if end_date:
-                query += " AND DATE(ph.date) <= %s"
-                params.append(end_date)
-            
-            if category_filter and category_filter != 'Tất cả':
-                query += " AND p.category = %s"
-                params.append(category_filter)
-            
-            if search_keyword:
-                query += " AND p.name LIKE %s"
-                params.append(f"%{search_keyword}%")
-                
-            query += " ORDER BY ph.date DESC"
-            
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            
-            if results:
-                df = pd.DataFrame(list(results), columns=pd.Index([
-                    'ID', 'Tên sản phẩm', 'Giá mới', 'Giá cũ', 'Ngày'
-                ]))
-                return df
-            else:
-                return pd.DataFrame(columns=pd.Index([
-                    'ID', 'Tên sản phẩm', 'Giá mới', 'Giá cũ', 'Ngày'
-                ]))
-        except Exception as e:
-            logger.error(f"Lỗi truy vấn lịch sử giá: {e}")
-            return pd.DataFrame(columns=pd.Index([
-                'ID', 'Tên sản phẩm', 'Giá mới', 'Giá cũ', 'Ngày'
-            ]))
-        finally:
-            if connection.is_connected():
-                connection.close()
-    return pd.DataFrame(columns=pd.Index([
-        'ID', 'Tên sản phẩm', 'Giá mới', 'Giá cũ', 'Ngày'
-    ]))
+    if connection is None:
+        return 0
+    try:
+        cursor = connection.cursor()
+        where, params = history_filter_sql(alias, start_date, end_date, category_filter, keyword_filter)
+        cursor.execute(f"""
+        SELECT COUNT(*) FROM (
+            SELECT 1
+            FROM {table} {alias}
+            JOIN product p ON {alias}.product_id = p.product_id
+            {where}
+            LIMIT %s
+        ) capped
+        """, params + [HISTORY_COUNT_CAP + 1])
+        result = cursor.fetchone()
+        return int(result[0]) if result else 0
+    except Exception as e:
+        logger.error(f"Lỗi đếm {table}: {e}")
+        return 0
+    finally:
+        connection.close()
 
+@dashboard_db.cached_query('detail')
+def fetch_stock_history_page(start_date=None, end_date=None, category_filter=None, keyword_filter=None,
+                             page_size=100, descending=True, after=None):
+    """Một trang lịch sử tồn kho. Trả về (DataFrame, khóa trang kế tiếp)"""
+    return _fetch_keyset_page(
+        'stock_history', 'sh',
+        "sh.id, p.name as product_name, sh.stock_increased, sh.stock_decreased, sh.date",
+        STOCK_HISTORY_COLUMNS, start_date, end_date, category_filter, keyword_filter,
+        page_size, descending, after
+    )
+
+@dashboard_db.cached_query('detail')
+def fetch_price_history_page(start_date=None, end_date=None, category_filter=None, keyword_filter=None,
+                             page_size=100, descending=True, after=None):
+    """Một trang lịch sử giá. Trả về (DataFrame, khóa trang kế tiếp)"""
+    return _fetch_keyset_page(
+        'price_history', 'ph',
+        "ph.id, p.name as product_name, ph.price, ph.original_price, ph.date",
+        PRICE_HISTORY_COLUMNS, start_date, end_date, category_filter, keyword_filter,
+        page_size, descending, after
+    )
+
+@dashboard_db.cached_query('detail')
+def count_stock_history(start_date=None, end_date=None, category_filter=None, keyword_filter=None):
+    """Số dòng lịch sử tồn kho khớp bộ lọc (tối đa HISTORY_COUNT_CAP + 1)"""
+    return _count_history_rows('stock_history', 'sh', start_date, end_date, category_filter, keyword_filter)
+
+@dashboard_db.cached_query('detail')
+def count_price_history(start_date=None, end_date=None, category_filter=None, keyword_filter=None):
+    """Số dòng lịch sử giá khớp bộ lọc (tối đa HISTORY_COUNT_CAP + 1)"""
+    return _count_history_rows('price_history', 'ph', start_date, end_date, category_filter, keyword_filter)
+
+@dashboard_db.cached_query('analysis')
 def fetch_sales_summary():
-    """Lấy tổng hợp bán hàng theo sản phẩm"""
-    connection = get_db_connection()
+    """Lấy tổng hợp bán hàng theo sản phẩm (doanh thu theo giá lịch sử từ daily_sales_rollup)"""
+    connection = get_analytics_connection()
     if connection is not None:
         try:
             cursor = connection.cursor()
@@ -506,12 +592,16 @@ def fetch_sales_summary():
                 p.category,
                 p.price,
                 p.stock_quantity,
-                COALESCE(SUM(sh.stock_decreased), 0) as total_sold,
-                COALESCE(SUM(sh.stock_decreased * p.price), 0) as total_revenue,
-                COUNT(DISTINCT DATE(sh.date)) as days_sold
+                COALESCE(s.units_sold, 0) as total_sold,
+                COALESCE(s.revenue, 0) as total_revenue,
+                COALESCE(s.days_sold, 0) as days_sold
             FROM product p
-            LEFT JOIN stock_history sh ON p.product_id = sh.product_id AND sh.stock_decreased > 0
-            GROUP BY p.product_id, p.name, p.category, p.price, p.stock_quantity
+            LEFT JOIN (
+                SELECT product_id, SUM(units_sold) as units_sold, SUM(revenue) as revenue,
+                       COUNT(DISTINCT date) as days_sold
+                FROM daily_sales_rollup
+                GROUP BY product_id
+            ) s ON p.product_id = s.product_id
             ORDER BY total_revenue DESC
             """
             cursor.execute(query)
@@ -535,14 +625,14 @@ def fetch_sales_summary():
                 'Đã bán', 'Doanh thu', 'Số ngày bán'
             ]))
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return pd.DataFrame(columns=pd.Index([
         'ID', 'Tên sản phẩm', 'Danh mục', 'Giá', 'Tồn kho', 
         'Đã bán', 'Doanh thu', 'Số ngày bán'
     ]))
     
 # Original functions (keeping all existing functions)
+@dashboard_db.cached_query('catalog')
 def fetch_total_products():
     """Lấy tổng số sản phẩm"""
     connection = get_db_connection()
@@ -564,48 +654,22 @@ def fetch_total_products():
             logger.error(f"Lỗi truy vấn sản phẩm: {e}")
             return 0
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return 0
 
-def fetch_total_revenue(start_date=None, end_date=None, category=None, price_range=None, search_keyword=None):
-    """Lấy tổng doanh thu theo điều kiện"""
-    connection = get_db_connection()
+@dashboard_db.cached_query('kpi')
+def fetch_total_revenue(start_date=None, end_date=None, category=None, price_range=None, keyword_filter=None):
+    """Lấy tổng doanh thu theo điều kiện (từ daily_sales_rollup)"""
+    connection = get_analytics_connection()
     if connection is not None:
         try:
             cursor = connection.cursor()
             
-            query = """
-            SELECT COALESCE(SUM(sh.stock_decreased * p.price), 0) as total_revenue
-            FROM stock_history sh
-            JOIN product p ON sh.product_id = p.product_id
-            WHERE sh.stock_decreased > 0
+            joins, where, params = rollup_filter_sql(start_date, end_date, category, keyword_filter, price_range)
+            query = f"""
+            SELECT COALESCE(SUM(r.revenue), 0) as total_revenue
+            FROM daily_sales_rollup r{joins}{where}
             """
-            params = []
-            
-            if start_date:
-                query += " AND DATE(sh.date) >= %s"
-                params.append(start_date)
-            
-            if end_date:
-                query += " AND DATE(sh.date) <= %s"
-                params.append(end_date)
-            
-            if category and category != 'all':
-                query += " AND p.category = %s"
-                params.append(category)
-            
-            if search_keyword:
-                query += " AND p.name LIKE %s"
-                params.append(f"%{search_keyword}%")
-            
-            if price_range and price_range != 'all':
-                if price_range == 'high':
-                    query += " AND p.price > 75000"
-                elif price_range == 'medium':
-                    query += " AND p.price BETWEEN 31500 AND 75000"
-                elif price_range == 'low':
-                    query += " AND p.price < 31500"
             
             cursor.execute(query, params)
             result = cursor.fetchone()
@@ -618,61 +682,83 @@ def fetch_total_revenue(start_date=None, end_date=None, category=None, price_ran
             logger.error(f"Lỗi truy vấn doanh thu: {e}")
             return 0
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return 0
 
-def fetch_total_stock():
-    """Lấy tổng tồn kho hiện tại"""
-    connection = get_db_connection()
+@dashboard_db.cached_query('kpi')
+def fetch_sales_kpis(start_date=None, end_date=None, category_filter=None, price_range=None, keyword_filter=None):
+    """
+    Lấy 4 KPI đầu trang bán hàng trong một lần truy vấn:
+    số sản phẩm, doanh thu, số lượng đã bán và số danh mục theo bộ lọc
+    """
+    empty_kpis = {'product_count': 0, 'revenue': 0, 'units_sold': 0, 'category_count': 0}
+    connection = get_analytics_connection()
     if connection is not None:
         try:
             cursor = connection.cursor()
-            cursor.execute("SELECT COALESCE(SUM(stock_quantity), 0) FROM product")
+            
+            # Điều kiện trên product cho số sản phẩm / số danh mục
+            product_conditions = ""
+            product_params = []
+            if category_filter and category_filter != 'Tất cả':
+                product_conditions += " AND p.category = %s"
+                product_params.append(category_filter)
+            if keyword_filter:
+                keyword_sql, keyword_params = product_id_filter_sql("p.product_id", keyword_filter)
+                product_conditions += f" AND {keyword_sql}"
+                product_params.extend(keyword_params)
+            
+            # Doanh thu áp dụng cả phân khúc giá, số lượng bán thì không (giữ như các KPI cũ)
+            revenue_joins, revenue_where, revenue_params = rollup_filter_sql(
+                start_date, end_date, category_filter, keyword_filter, price_range
+            )
+            sold_joins, sold_where, sold_params = rollup_filter_sql(
+                start_date, end_date, category_filter, keyword_filter
+            )
+            
+            query = f"""
+            SELECT
+                (SELECT COUNT(*) FROM product p WHERE 1=1{product_conditions}) as product_count,
+                (SELECT COALESCE(SUM(r.revenue), 0)
+                 FROM daily_sales_rollup r{revenue_joins}{revenue_where}) as revenue,
+                (SELECT COALESCE(SUM(r.units_sold), 0)
+                 FROM daily_sales_rollup r{sold_joins}{sold_where}) as units_sold,
+                (SELECT COUNT(DISTINCT p.category) FROM product p
+                 WHERE p.category IS NOT NULL{product_conditions}) as category_count
+            """
+            params = product_params + revenue_params + sold_params + product_params
+            
+            cursor.execute(query, params)
             result = cursor.fetchone()
             if result is not None:
-                (total_stock,) = result
-                return total_stock
-            else:
-                return 0
+                product_count, revenue, units_sold, category_count = result
+                return {
+                    'product_count': int(product_count or 0),
+                    'revenue': revenue or 0,
+                    'units_sold': int(units_sold or 0),
+                    'category_count': int(category_count or 0)
+                }
+            return empty_kpis
         except Exception as e:
-            logger.error(f"Lỗi truy vấn tồn kho: {e}")
-            return 0
+            logger.error(f"Lỗi truy vấn KPI bán hàng: {e}")
+            return empty_kpis
         finally:
-            if connection.is_connected():
-                connection.close()
-    return 0
+            connection.close()
+    return empty_kpis
 
-def fetch_total_sold(start_date=None, end_date=None, category_filter=None, search_keyword=None):
-    """Lấy tổng số sản phẩm đã bán"""
-    connection = get_db_connection()
+@dashboard_db.cached_query('kpi')
+def fetch_total_sold(start_date=None, end_date=None, category_filter=None, keyword_filter=None):
+    """Lấy tổng số sản phẩm đã bán (từ daily_sales_rollup)"""
+    connection = get_analytics_connection()
     if connection is not None:
         try:
             cursor = connection.cursor()
             
-            query = """
-            SELECT COALESCE(SUM(sh.stock_decreased), 0) as total_sold
-            FROM stock_history sh
-            JOIN product p ON sh.product_id = p.product_id
-            WHERE sh.stock_decreased > 0
+            joins, where, params = rollup_filter_sql(start_date, end_date, category_filter, keyword_filter)
+            query = f"""
+            SELECT COALESCE(SUM(r.units_sold), 0) as total_sold
+            FROM daily_sales_rollup r{joins}{where}
             """
-            params = []
-            
-            if start_date:
-                query += " AND DATE(sh.date) >= %s"
-                params.append(start_date)
-            
-            if end_date:
-                query += " AND DATE(sh.date) <= %s"
-                params.append(end_date)
-            
-            if category_filter and category_filter != 'Tất cả':
-                query += " AND p.category = %s"
-                params.append(category_filter)
-            
-            if search_keyword:
-                query += " AND p.name LIKE %s"
-                params.append(f"%{search_keyword}%")
             
             cursor.execute(query, params)
             result = cursor.fetchone()
@@ -685,11 +771,11 @@ def fetch_total_sold(start_date=None, end_date=None, category_filter=None, searc
             logger.error(f"Lỗi truy vấn số lượng bán: {e}")
             return 0
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return 0
 
-def fetch_best_worst_sellers(start_date=None, end_date=None, limit=10, category_filter=None, search_keyword=None):
+@dashboard_db.cached_query('analysis')
+def fetch_best_worst_sellers(start_date=None, end_date=None, limit=10, category_filter=None, keyword_filter=None):
     """Lấy sản phẩm bán chạy nhất (bao gồm cả sản phẩm chưa bán)"""
     connection = get_db_connection()
     if connection is not None:
@@ -705,20 +791,21 @@ def fetch_best_worst_sellers(start_date=None, end_date=None, limit=10, category_
             params = []
             
             if start_date:
-                query += " AND (sh.date IS NULL OR DATE(sh.date) >= %s)"
-                params.append(start_date)
+                query += " AND (sh.date IS NULL OR sh.date >= %s)"
+                params.append(day_start(start_date))
             
             if end_date:
-                query += " AND (sh.date IS NULL OR DATE(sh.date) <= %s)"
-                params.append(end_date)
+                query += " AND (sh.date IS NULL OR sh.date < %s)"
+                params.append(day_after(end_date))
             
             if category_filter and category_filter != 'Tất cả':
                 query += " AND p.category = %s"
                 params.append(category_filter)
             
-            if search_keyword:
-                query += " AND p.name LIKE %s"
-                params.append(f"%{search_keyword}%")
+            if keyword_filter:
+                keyword_sql, keyword_params = product_id_filter_sql("p.product_id", keyword_filter)
+                query += f" AND {keyword_sql}"
+                params.extend(keyword_params)
             
             # Bỏ điều kiện HAVING total_sold > 0 để hiển thị cả sản phẩm chưa bán
             query += " GROUP BY p.product_id, p.name ORDER BY total_sold DESC LIMIT %s"
@@ -736,13 +823,13 @@ def fetch_best_worst_sellers(start_date=None, end_date=None, limit=10, category_
             logger.error(f"Lỗi truy vấn sản phẩm bán chạy: {e}")
             return pd.DataFrame(columns=pd.Index(['product_name', 'total_sold']))
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return pd.DataFrame(columns=pd.Index(['product_name', 'total_sold']))
 
-def fetch_sales_trend(view_type='day', start_date=None, end_date=None, category_filter=None, search_keyword=None):
-    """Lấy xu hướng bán hàng theo ngày/tháng/năm với chuỗi thời gian liên tục"""
-    connection = get_db_connection()
+@dashboard_db.cached_query('trend')
+def fetch_sales_trend(view_type='day', start_date=None, end_date=None, category_filter=None, keyword_filter=None):
+    """Lấy xu hướng bán hàng theo ngày/tháng/năm với chuỗi thời gian liên tục (từ daily_sales_rollup)"""
+    connection = get_analytics_connection()
     if connection is not None:
         try:
             cursor = connection.cursor()
@@ -753,176 +840,114 @@ def fetch_sales_trend(view_type='day', start_date=None, end_date=None, category_
             if not end_date:
                 end_date = datetime.now()
             
-            # Truy vấn dữ liệu thực tế
-            if view_type == 'day':
-                query = """
-                SELECT DATE(sh.date) as period, 
-                       COALESCE(SUM(sh.stock_decreased * p.price), 0) as revenue
-                FROM stock_history sh
-                JOIN product p ON sh.product_id = p.product_id
-                WHERE sh.stock_decreased > 0
-                AND DATE(sh.date) >= %s
-                AND DATE(sh.date) <= %s
-                """
-            elif view_type == 'month':
-                query = """
-                SELECT DATE_FORMAT(sh.date, '%Y-%m') as period, 
-                       COALESCE(SUM(sh.stock_decreased * p.price), 0) as revenue
-                FROM stock_history sh
-                JOIN product p ON sh.product_id = p.product_id
-                WHERE sh.stock_decreased > 0
-                AND DATE(sh.date) >= %s
-                AND DATE(sh.date) <= %s
-                """
-            else:  # year
-                query = """
-                SELECT YEAR(sh.date) as period, 
-                       COALESCE(SUM(sh.stock_decreased * p.price), 0) as revenue
-                FROM stock_history sh
-                JOIN product p ON sh.product_id = p.product_id
-                WHERE sh.stock_decreased > 0
-                AND DATE(sh.date) >= %s
-                AND DATE(sh.date) <= %s
-                """
-            
-            params = [start_date, end_date]
-            
-            if category_filter and category_filter != 'Tất cả':
-                query += " AND p.category = %s"
-                params.append(category_filter)
-            
-            if search_keyword:
-                query += " AND p.name LIKE %s"
-                params.append(f"%{search_keyword}%")
-            
-            if view_type == 'day':
-                query += " GROUP BY DATE(sh.date) ORDER BY DATE(sh.date)"
-            elif view_type == 'month':
-                query += " GROUP BY DATE_FORMAT(sh.date, '%Y-%m') ORDER BY DATE_FORMAT(sh.date, '%Y-%m')"
-            else:
-                query += " GROUP BY YEAR(sh.date) ORDER BY YEAR(sh.date)"
+            # Lấy doanh thu theo ngày từ rollup, gom kỳ và điền kỳ trống bằng time_buckets
+            joins, where, params = rollup_filter_sql(start_date, end_date, category_filter, keyword_filter)
+            query = f"""
+            SELECT r.date, COALESCE(SUM(r.revenue), 0) as revenue
+            FROM daily_sales_rollup r{joins}{where}
+            GROUP BY r.date
+            """
             
             cursor.execute(query, params)
             results = cursor.fetchall()
             
-            # Tạo DataFrame từ kết quả truy vấn
-            if results:
-                sales_df = pd.DataFrame(list(results), columns=pd.Index(['period', 'revenue']))
-            else:
-                sales_df = pd.DataFrame(columns=pd.Index(['period', 'revenue']))
-            
-            # Tạo chuỗi thời gian liên tục
-            if view_type == 'day':
-                date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-                full_range = pd.DataFrame({'period': date_range.strftime('%Y-%m-%d')})
-            elif view_type == 'month':
-                date_range = pd.date_range(start=start_date, end=end_date, freq='M')
-                full_range = pd.DataFrame({'period': date_range.strftime('%Y-%m')})
-            else:  # year
-                date_range = pd.date_range(start=start_date, end=end_date, freq='Y')
-                full_range = pd.DataFrame({'period': date_range.strftime('%Y')})
-            
-            # Merge với dữ liệu thực tế
-            if not sales_df.empty:
-                # Chuyển đổi period thành string để merge
-                sales_df['period'] = sales_df['period'].astype(str)
-                full_range['period'] = full_range['period'].astype(str)
-                
-                # Merge và fill revenue = 0 cho những ngày không có dữ liệu
-                result_df = pd.merge(full_range, sales_df, on='period', how='left')
-                result_df['revenue'] = result_df['revenue'].fillna(0)
-            else:
-                result_df = full_range
-                result_df['revenue'] = 0
-            
-            return result_df
+            dates = [row[0] for row in results]
+            revenues = [row[1] for row in results]
+            return time_buckets.dense_series(dates, revenues, start_date, end_date, view_type)
             
         except Exception as e:
             logger.error(f"Lỗi truy vấn xu hướng: {e}")
             return pd.DataFrame(columns=pd.Index(['period', 'revenue']))
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return pd.DataFrame(columns=pd.Index(['period', 'revenue']))
 
-def fetch_price_segments_kmeans(category_filter=None, search_keyword=None):
-    """Lấy phân khúc giá sử dụng thuật toán K-Means"""
-    connection = get_db_connection()
-    if connection is not None:
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_price_segment_model(data_version):
+    """Model K-Means toàn catalog cho data_version (đọc từ đĩa hoặc huấn luyện một lần)"""
+    def fetch_features():
+        connection = get_db_connection()
+        if connection is None:
+            raise RuntimeError("Không có kết nối MySQL để huấn luyện phân khúc giá")
         try:
             cursor = connection.cursor()
-            
-            query = """
-            SELECT p.price, p.name, p.stock_quantity,
-                   COALESCE(SUM(sh.stock_decreased), 0) as total_sold
-            FROM product p
-            LEFT JOIN stock_history sh ON p.product_id = sh.product_id AND sh.stock_decreased > 0
-            WHERE p.price > 0
-            """
-            
-            params = []
-            
-            if category_filter and category_filter != 'Tất cả':
-                query += " AND p.category = %s"
-                params.append(category_filter)
-            
-            if search_keyword:
-                query += " AND p.name LIKE %s"
-                params.append(f"%{search_keyword}%")
-            
-            query += " GROUP BY p.product_id, p.price, p.name, p.stock_quantity"
-            
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            
-            if results and len(results) >= 3:
-                df = pd.DataFrame(list(results), columns=['price', 'name', 'stock_quantity', 'total_sold'])
-                
-                # Prepare data for K-Means (price and stock_quantity)
-                X = df[['price', 'stock_quantity']].values
-                scaler = StandardScaler()
-                X_scaled = scaler.fit_transform(X)
-                
-                # Apply K-Means clustering with 3 clusters
-                kmeans = KMeans(n_clusters=3, random_state=42, n_init=10)
-                clusters = kmeans.fit_predict(X_scaled)
-                
-                # Add cluster labels to dataframe
-                df['cluster'] = clusters
-                
-                # Determine cluster names based on average price
-                cluster_stats = df.groupby('cluster')['price'].mean().sort_values()
-                cluster_names = {}
-                for i, cluster_id in enumerate(cluster_stats.index):
-                    if i == 0:
-                        cluster_names[cluster_id] = 'Giá thấp'
-                    elif i == 1:
-                        cluster_names[cluster_id] = 'Giá trung'
-                    else:
-                        cluster_names[cluster_id] = 'Giá cao'
-                
-                df['price_segment'] = df['cluster'].map(cluster_names)
-                
-                # Count products and total sold in each segment
-                segment_summary = df.groupby('price_segment').agg({
-                    'name': 'count',
-                    'total_sold': 'sum'
-                }).reset_index()
-                segment_summary.columns = ['price_segment', 'product_count', 'total_sold']
-                
-                return segment_summary
-            else:
-                # Fallback to traditional segmentation if not enough data
-                return pd.DataFrame(columns=pd.Index(['price_segment', 'product_count', 'total_sold']))
-                
-        except Exception as e:
-            logger.error(f"Lỗi phân khúc giá: {e}")
-            return pd.DataFrame(columns=pd.Index(['price_segment', 'product_count', 'total_sold']))
+            cursor.execute("SELECT price, stock_quantity FROM product WHERE price > 0")
+            return cursor.fetchall()
         finally:
-            if connection.is_connected():
-                connection.close()
-    return pd.DataFrame(columns=pd.Index(['price_segment', 'product_count', 'total_sold']))
+            connection.close()
+    
+    return price_segments.load_or_train(data_version, fetch_features)
+
+@dashboard_db.cached_query('analysis')
+def fetch_price_segments_kmeans(category_filter=None, keyword_filter=None, _segment_model=None):
+    """
+    Lấy phân khúc giá: gán sản phẩm đã lọc vào các cụm K-Means của toàn catalog.
+    _segment_model: model đã lấy sẵn ở nơi gọi (không tính vào khóa cache vì đã gắn với data_version);
+    nếu không có thì nạp sau khi đã trả kết nối về pool.
+    """
+    empty_df = pd.DataFrame(columns=pd.Index(['price_segment', 'product_count', 'total_sold']))
+    connection = get_db_connection()
+    if connection is None:
+        return empty_df
+    try:
+        cursor = connection.cursor()
+        
+        query = """
+        SELECT p.price, p.stock_quantity, COALESCE(s.units_sold, 0) as total_sold
+        FROM product p
+        LEFT JOIN (
+            SELECT product_id, SUM(units_sold) as units_sold
+            FROM daily_sales_rollup
+            GROUP BY product_id
+        ) s ON p.product_id = s.product_id
+        WHERE p.price > 0
+        """
+        
+        params = []
+        
+        if category_filter and category_filter != 'Tất cả':
+            query += " AND p.category = %s"
+            params.append(category_filter)
+        
+        if keyword_filter:
+            keyword_sql, keyword_params = product_id_filter_sql("p.product_id", keyword_filter)
+            query += f" AND {keyword_sql}"
+            params.extend(keyword_params)
+        
+        cursor.execute(query, params)
+        results = cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Lỗi phân khúc giá: {e}")
+        return empty_df
+    finally:
+        # Trả kết nối trước khi nạp/huấn luyện model (việc này cũng cần một kết nối từ pool)
+        connection.close()
+    
+    if not results:
+        return empty_df
+    
+    try:
+        model = _segment_model
+        if model is None:
+            model = get_price_segment_model(dashboard_db.get_data_version())
+        if model is None:
+            return empty_df
+        
+        df = pd.DataFrame(list(results), columns=['price', 'stock_quantity', 'total_sold'])
+        df['price_segment'] = price_segments.assign_segments(model, df[['price', 'stock_quantity']].values)
+        
+        # Count products and total sold in each segment
+        segment_summary = df.groupby('price_segment').agg(
+            product_count=('price', 'count'),
+            total_sold=('total_sold', 'sum')
+        ).reset_index()
+        
+        return segment_summary
+    except Exception as e:
+        logger.error(f"Lỗi phân khúc giá: {e}")
+        return empty_df
 
+@dashboard_db.cached_query('catalog')
 def fetch_categories():
     """Lấy danh sách danh mục"""
     connection = get_db_connection()
@@ -936,25 +961,30 @@ def fetch_categories():
             logger.error(f"Lỗi truy vấn danh mục: {e}")
             return []
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return []
 
-def fetch_category_analysis(category_filter=None, search_keyword=None):
-    """Lấy dữ liệu phân tích theo danh mục"""
-    connection = get_db_connection()
+@dashboard_db.cached_query('analysis')
+def fetch_category_analysis(category_filter=None, keyword_filter=None):
+    """Lấy dữ liệu phân tích theo danh mục (doanh số từ daily_sales_rollup)"""
+    connection = get_analytics_connection()
     if connection is not None:
         try:
             cursor = connection.cursor()
             
+            # Gộp rollup theo sản phẩm trước rồi mới join product để đếm sản phẩm không bị nhân dòng
             query = """
             SELECT 
                 p.category,
                 COUNT(p.product_id) as product_count,
-                COALESCE(SUM(sh.stock_decreased * p.price), 0) as total_revenue,
-                COALESCE(SUM(sh.stock_decreased), 0) as total_sold
+                COALESCE(SUM(s.revenue), 0) as total_revenue,
+                COALESCE(SUM(s.units_sold), 0) as total_sold
             FROM product p
-            LEFT JOIN stock_history sh ON p.product_id = sh.product_id AND sh.stock_decreased > 0
+            LEFT JOIN (
+                SELECT product_id, SUM(revenue) as revenue, SUM(units_sold) as units_sold
+                FROM daily_sales_rollup
+                GROUP BY product_id
+            ) s ON p.product_id = s.product_id
             WHERE p.category IS NOT NULL
             """
             
@@ -964,9 +994,10 @@ def fetch_category_analysis(category_filter=None, search_keyword=None):
                 query += " AND p.category = %s"
                 params.append(category_filter)
             
-            if search_keyword:
-                query += " AND p.name LIKE %s"
-                params.append(f"%{search_keyword}%")
+            if keyword_filter:
+                keyword_sql, keyword_params = product_id_filter_sql("p.product_id", keyword_filter)
+                query += f" AND {keyword_sql}"
+                params.extend(keyword_params)
             
             query += " GROUP BY p.category ORDER BY total_revenue DESC"
             
@@ -982,10 +1013,10 @@ def fetch_category_analysis(category_filter=None, search_keyword=None):
             logger.error(f"Lỗi truy vấn phân tích danh mục: {e}")
             return pd.DataFrame(columns=pd.Index(['category', 'product_count', 'total_revenue', 'total_sold']))
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return pd.DataFrame(columns=pd.Index(['category', 'product_count', 'total_revenue', 'total_sold']))
 
+@dashboard_db.cached_query('detail')
 def fetch_price_history(product_id=None, limit=20):
     """Lấy lịch sử giá sản phẩm"""
     connection = get_db_connection()
@@ -1028,10 +1059,10 @@ def fetch_price_history(product_id=None, limit=20):
             logger.error(f"Lỗi truy vấn lịch sử giá: {e}")
             return pd.DataFrame(columns=pd.Index(['date', 'product_name', 'price', 'original_price']))
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return pd.DataFrame(columns=pd.Index(['date', 'product_name', 'price', 'original_price']))
 
+@dashboard_db.cached_query('detail')
 def fetch_stock_changes(limit=20):
     """Lấy lịch sử thay đổi tồn kho"""
     connection = get_db_connection()
@@ -1060,8 +1091,7 @@ def fetch_stock_changes(limit=20):
             logger.error(f"Lỗi truy vấn lịch sử tồn kho: {e}")
             return pd.DataFrame(columns=pd.Index(['date', 'product_name', 'stock_increased', 'stock_decreased']))
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return pd.DataFrame(columns=pd.Index(['date', 'product_name', 'stock_increased', 'stock_decreased']))
 
 def test_connection():
@@ -1111,7 +1141,7 @@ def test_connection():
                        MAX(date) as max_date,
                        COUNT(DISTINCT product_id) as unique_products
                 FROM price_history 
-                WHERE DATE(date) >= '2025-03-01' AND DATE(date) <= '2025-03-31'
+                WHERE date >= '2025-03-01' AND date < '2025-04-01'
             """)
             march_data = cursor.fetchone()
             if march_data:
@@ -1123,7 +1153,7 @@ def test_connection():
                 SELECT ph.date, ph.price, ph.original_price, COALESCE(p.name, CONCAT('Product ', ph.product_id)) as name
                 FROM price_history ph
                 LEFT JOIN product p ON ph.product_id = p.product_id
-                WHERE DATE(ph.date) >= '2025-03-01' AND DATE(ph.date) <= '2025-03-31'
+                WHERE ph.date >= '2025-03-01' AND ph.date < '2025-04-01'
                 LIMIT 5
             """)
             sample_data = cursor.fetchall()
@@ -1136,11 +1166,11 @@ def test_connection():
             logger.error(f"Lỗi kiểm tra database: {e}")
             st.error(f"Lỗi kiểm tra database: {e}")
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     else:
         st.error("Không thể kết nối MySQL!")
 
+@dashboard_db.cached_query('detail')
 def get_changed_products_in_period(start_date, end_date):
     connection = get_db_connection()
     if connection is not None:
@@ -1154,9 +1184,9 @@ def get_changed_products_in_period(start_date, end_date):
                    MAX(date) as max_date,
                    COUNT(DISTINCT product_id) as unique_products
             FROM price_history 
-            WHERE DATE(date) >= %s AND DATE(date) <= %s
+            WHERE date >= %s AND date < %s
             """
-            cursor.execute(debug_query, [start_date, end_date])
+            cursor.execute(debug_query, [day_start(start_date), day_after(end_date)])
             debug_result = cursor.fetchone()
             logger.info(f"Debug price_history for {start_date} to {end_date}: {debug_result}")
             
@@ -1167,11 +1197,11 @@ def get_changed_products_in_period(start_date, end_date):
                    MIN(ph.date) as first_change, MAX(ph.date) as last_change
             FROM price_history ph
             LEFT JOIN product p ON ph.product_id = p.product_id
-            WHERE DATE(ph.date) >= %s AND DATE(ph.date) <= %s
+            WHERE ph.date >= %s AND ph.date < %s
             GROUP BY ph.product_id, p.name
             ORDER BY change_count DESC, name
             """
-            cursor.execute(price_query, [start_date, end_date])
+            cursor.execute(price_query, [day_start(start_date), day_after(end_date)])
             price_changes = []
             for row in cursor.fetchall():
                 name, count, first_change, last_change = row
@@ -1191,12 +1221,12 @@ def get_changed_products_in_period(start_date, end_date):
                    MIN(sh.date) as first_change, MAX(sh.date) as last_change
             FROM stock_history sh
             LEFT JOIN product p ON sh.product_id = p.product_id
-            WHERE DATE(sh.date) >= %s AND DATE(sh.date) <= %s
+            WHERE sh.date >= %s AND sh.date < %s
             AND (sh.stock_increased > 0 OR sh.stock_decreased > 0)
             GROUP BY sh.product_id, p.name
             ORDER BY change_count DESC, name
             """
-            cursor.execute(stock_query, [start_date, end_date])
+            cursor.execute(stock_query, [day_start(start_date), day_after(end_date)])
             stock_changes = []
             for row in cursor.fetchall():
                 name, count, import_count, export_count, first_change, last_change = row
@@ -1217,10 +1247,78 @@ def get_changed_products_in_period(start_date, end_date):
             logger.error(f"Lỗi lấy sản phẩm thay đổi: {e}")
             return None
         finally:
-            if connection.is_connected():
-                connection.close()
+            connection.close()
     return None
 
+def render_history_pages(key, fetch_page, count_rows, start_date, end_date, category_filter, keyword_filter, empty_message):
+    """
+    Bảng lịch sử phân trang: chọn số dòng/trang, thứ tự ngày và nút Trước/Sau.
+    session_state giữ chồng khóa keyset của các trang đã đi qua; đổi bộ lọc thì quay về trang đầu.
+    """
+    ctrl_col1, ctrl_col2 = st.columns(2)
+    with ctrl_col1:
+        page_size = st.selectbox("Số dòng/trang:", DETAIL_PAGE_SIZES, index=1, key=f"{key}_page_size")
+    with ctrl_col2:
+        sort_order = st.selectbox("Sắp xếp:", ["Mới nhất trước", "Cũ nhất trước"], key=f"{key}_sort")
+    descending = sort_order == "Mới nhất trước"
+    
+    cursor_key = f"{key}_cursors"
+    filters = (start_date, end_date, category_filter, keyword_filter, page_size, descending)
+    if st.session_state.get(f"{key}_filters") != filters or cursor_key not in st.session_state:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[cursor_key] = [None]
+    cursors = st.session_state[cursor_key]
+    
+    page_df, next_after = fetch_page(start_date, end_date, category_filter, keyword_filter,
+                                     page_size=page_size, descending=descending, after=cursors[-1])
+    total_rows = count_rows(start_date, end_date, category_filter, keyword_filter)
+    
+    if page_df.empty:
+        st.info(empty_message)
+        return
+    
+    page_df = page_df.copy()
+    page_df['Ngày'] = pd.to_datetime(page_df['Ngày'], errors='coerce')
+    # Chiều cao cố định để bảng cuộn trong khung thay vì kéo dài cả trang
+    st.dataframe(page_df, use_container_width=True, hide_index=True, height=min(35 * (len(page_df) + 1) + 3, 600))
+    
+    nav_col1, nav_col2, nav_col3 = st.columns([1, 2, 1])
+    with nav_col1:
+        st.button("◀ Trước", key=f"{key}_prev", disabled=len(cursors) == 1,
+                  on_click=lambda: cursors.pop(), use_container_width=True)
+    with nav_col2:
+        if total_rows > HISTORY_COUNT_CAP:
+            total_pages = f"{-(-HISTORY_COUNT_CAP // page_size):,}+"
+            total_label = f"{HISTORY_COUNT_CAP:,}+"
+        else:
+            total_pages = max(1, -(-total_rows // page_size))
+            total_label = f"{total_rows:,}"
+        st.caption(f"Trang {len(cursors)}/{total_pages} · {total_label} bản ghi")
+    with nav_col3:
+        st.button("Sau ▶", key=f"{key}_next", disabled=next_after is None,
+                  on_click=lambda: cursors.append(next_after), use_container_width=True)
+
+def render_auto_refresh(refresh_interval):
+    """
+    Fragment tự chạy lại mỗi refresh_interval giây, chỉ đọc data_version (đã cache ngắn hạn).
+    Toàn trang chỉ rerun khi job ingestion/migration đã ghi dữ liệu mới.
+    """
+    if 'db_watcher' not in st.session_state:
+        st.session_state.db_watcher = DatabaseWatcher()
+    watcher = st.session_state.db_watcher
+    
+    @st.fragment(run_every=refresh_interval)
+    def poll_data_version():
+        if watcher.check_for_changes():
+            st.session_state.last_update = datetime.now()
+            st.markdown('<div class="auto-refresh">🔄 Phát hiện thay đổi - Đang cập nhật...</div>', unsafe_allow_html=True)
+            st.rerun()
+        
+        st.caption(f"Phiên bản dữ liệu: {watcher.last_version} | Kiểm tra mỗi {refresh_interval}s | "
+                   f"Cập nhật lần cuối: {st.session_state.last_update.strftime('%H:%M:%S')}")
+    
+    poll_data_version()
+
 def main():
     st.set_page_config(
         page_title="KingFoodMart Dashboard",
@@ -1229,10 +1327,12 @@ def main():
         initial_sidebar_state="expanded"
     )
     
-    # Initialize session state
-    if 'watcher' not in st.session_state:
-        st.session_state.watcher = DatabaseWatcher()
+    # Endpoint /metrics riêng cho dashboard (migration có thể đang dùng METRICS_PORT)
+    dashboard_metrics_port = os.getenv('DASHBOARD_METRICS_PORT')
+    if dashboard_metrics_port:
+        metrics.start_http_server(dashboard_metrics_port)
     
+    # Initialize session state
     if 'last_update' not in st.session_state:
         st.session_state.last_update = datetime.now()
     
@@ -1333,27 +1433,13 @@ def main():
     # Force refresh data button
     if st.sidebar.button("🔄 Làm mới dữ liệu", type="secondary"):
         # Clear cache and rerun
-        st.cache_data.clear()
+        dashboard_db.invalidate_query_cache()
         st.rerun()
     
-    # Auto refresh logic
+    # Auto refresh logic: chỉ rerun khi data_version thay đổi
     if auto_refresh:
-        # Check for database changes
-        if st.session_state.watcher.check_for_changes():
-            st.sidebar.markdown('<div class="auto-refresh">🔄 Phát hiện thay đổi - Đang cập nhật...</div>', unsafe_allow_html=True)
-            st.rerun()
-        
-        # Time-based refresh
-        time_diff = (datetime.now() - st.session_state.last_update).total_seconds()
-        if time_diff >= refresh_interval:
-            st.session_state.last_update = datetime.now()
-            st.sidebar.markdown('<div class="auto-refresh">⏰ Cập nhật theo thời gian</div>', unsafe_allow_html=True)
-            st.rerun()
-        
-        # Show countdown
-        remaining = refresh_interval - time_diff
-        st.sidebar.progress(1 - (remaining / refresh_interval))
-        st.sidebar.text(f"Cập nhật tiếp theo trong: {remaining:.0f}s")
+        with st.sidebar:
+            render_auto_refresh(refresh_interval)
     
 
 
@@ -1396,30 +1482,49 @@ def main():
         if search_keyword:
             filter_info.append(f"Tìm kiếm: **{search_keyword}**")
         
+        # Giải từ khóa một lần trước mọi truy vấn (không lồng kết nối trong các fetch_*)
+        keyword_filter = resolve_search_keyword(search_keyword) if search_keyword else None
+        
         if filter_info:
             st.info(f"🔍 Bộ lọc đang áp dụng: {' | '.join(filter_info)} | Thời gian: {start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}")
         else:
             st.info(f"📊 Hiển thị tất cả dữ liệu | Thời gian: {start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}")
         st.divider()
         
-        # KPI Section - Áp dụng bộ lọc
+        # Các truy vấn chỉ phụ thuộc bộ lọc ở sidebar/tìm kiếm được gửi song song ngay từ đầu,
+        # phần hiển thị bên dưới lấy kết quả theo thứ tự trên trang
+        # data_version và model phân khúc được lấy ở đây (thread render) rồi truyền vào, để mỗi
+        # thread phụ chỉ mượn đúng một kết nối và không chờ pool trong khi đang giữ kết nối
+        data_version = dashboard_db.get_data_version()
+        try:
+            segment_model = get_price_segment_model(data_version)
+        except Exception as e:
+            logger.error(f"Lỗi nạp model phân khúc giá: {e}")
+            segment_model = None
+        sales_queries = dashboard_db.submit_queries({
+            'kpis': (fetch_sales_kpis, start_date, end_date, selected_category, price_range, keyword_filter),
+            'sellers': (fetch_best_worst_sellers, start_date, end_date, 10, selected_category, keyword_filter),
+            'trend': (fetch_sales_trend, view_type, start_date, end_date, selected_category, keyword_filter),
+            'price_segments': (functools.partial(fetch_price_segments_kmeans, _segment_model=segment_model),
+                               selected_category, keyword_filter),
+            'category_analysis': (fetch_category_analysis, selected_category, keyword_filter),
+        }, data_version)
+        
+        # KPI Section - Áp dụng bộ lọc (một truy vấn cho cả 4 chỉ số)
+        kpis = sales_queries['kpis'].result()
+        total_products = kpis['product_count']
+        total_revenue = kpis['revenue']
+        total_sold = kpis['units_sold']
+        
         kpi_col1, kpi_col2, kpi_col3, kpi_col4 = st.columns(4)
         
         with kpi_col1:
-            # Áp dụng bộ lọc cho tổng sản phẩm
-            filtered_products = fetch_all_products(selected_category, search_keyword)
-            total_products = len(filtered_products) if not filtered_products.empty else 0
             st.metric("Tổng sản phẩm", f"{total_products:,}")
         
         with kpi_col2:
-            # Áp dụng bộ lọc cho doanh thu
-            category_param = selected_category if selected_category != 'Tất cả' else 'all'
-            total_revenue = fetch_total_revenue(start_date, end_date, category_param, price_range, search_keyword)
             st.metric("Tổng doanh thu", f"{total_revenue:,.0f}₫")
         
         with kpi_col3:
-            # Áp dụng bộ lọc cho số lượng đã bán
-            total_sold = fetch_total_sold(start_date, end_date, selected_category, search_keyword)
             st.metric("Đã bán", f"{total_sold:,}")
             
             # Thông báo nếu có sản phẩm nhưng không có doanh số
@@ -1429,10 +1534,9 @@ def main():
         with kpi_col4:
             # Hiển thị số danh mục được lọc
             if selected_category != 'Tất cả':
-                st.metric("Danh mục", "1")
+                st.metric("Danh mục", f"{kpis['category_count']:,}")
             else:
-                all_categories = fetch_categories()
-                st.metric("Tổng danh mục", f"{len(all_categories):,}")
+                st.metric("Tổng danh mục", f"{kpis['category_count']:,}")
         
         # Charts Section
         st.header("📈 Biểu đồ phân tích")
@@ -1524,7 +1628,7 @@ def main():
             st.warning("📅 **Gợi ý**: Có thể dữ liệu bán hàng nằm ngoài khoảng thời gian hiện tại. Hãy thử mở rộng 'Từ ngày' trong sidebar.")
 
         st.subheader("📊 Sản phẩm bán chạy")
-        sellers_df = fetch_best_worst_sellers(start_date, end_date, 10, selected_category, search_keyword)
+        sellers_df = sales_queries['sellers'].result()
         if not sellers_df.empty:
             # Hiển thị cả sản phẩm chưa bán (total_sold = 0)
             fig_sellers = px.bar(
@@ -1566,7 +1670,7 @@ def main():
         # Trend chart
         st.subheader("📈 Xu hướng bán hàng")
 
-        trend_df = fetch_sales_trend(view_type, start_date, end_date, selected_category, search_keyword)
+        trend_df = sales_queries['trend'].result()
 
         if not trend_df.empty:
             # Xử lý dữ liệu theo view_type
@@ -1637,7 +1741,7 @@ def main():
             
         # Price segment chart
         st.subheader("🎯 Phân khúc giá")
-        price_df = fetch_price_segments_kmeans(selected_category, search_keyword)
+        price_df = sales_queries['price_segments'].result()
         if not price_df.empty:
             # Kiểm tra nếu có ít nhất một phân khúc có doanh số > 0
             if price_df['total_sold'].sum() > 0:
@@ -1677,7 +1781,7 @@ def main():
         
         # Category analysis charts
         st.subheader("📊 Phân tích theo danh mục")
-        category_df = fetch_category_analysis(selected_category, search_keyword)
+        category_df = sales_queries['category_analysis'].result()
         if not category_df.empty and len(category_df) > 1:
             # Bar chart - Revenue by category (full width, larger)
             fig_bar = px.bar(
@@ -1764,50 +1868,23 @@ def main():
 
 
         detail_col1, detail_col2 = st.columns(2)
+        date_range_label = f"{start_date_detail.strftime('%d/%m/%Y')} - {end_date_detail.strftime('%d/%m/%Y')}"
         
         with detail_col1:
             st.subheader("📈 Lịch sử thay đổi giá")
-            # Pass the date range directly to the fetch function
-            price_history_display_df = fetch_all_price_history(start_date_detail, end_date_detail, selected_category, search_keyword)
-            if not price_history_display_df.empty:
-                # Ensure 'Ngày' column is datetime for proper display and further processing if needed
-                price_history_display_df['Ngày'] = pd.to_datetime(price_history_display_df['Ngày'], errors='coerce')
-                
-                # The dataframe is already filtered by SQL, so just use it directly
-                filtered_price_display = price_history_display_df
-                
-                if not filtered_price_display.empty:
-                    st.dataframe(filtered_price_display, use_container_width=True)
-                    st.info(f"📊 Có {len(filtered_price_display)} thay đổi giá trong khoảng thời gian đã chọn")
-                else:
-                    # The warning message should reflect that no data was found for the *selected* range
-                    st.warning(f"""
-                    ⚠️ **Không có dữ liệu lịch sử giá trong khoảng ngày đã chọn ({start_date_detail.strftime('%d/%m/%Y')} - {end_date_detail.strftime('%d/%m/%Y')})**
-                    """)
-            else:
-                st.info("Không có dữ liệu lịch sử giá")
+            render_history_pages(
+                "price_history", fetch_price_history_page, count_price_history,
+                start_date_detail, end_date_detail, selected_category, keyword_filter,
+                f"Không có dữ liệu lịch sử giá trong khoảng ngày đã chọn ({date_range_label})"
+            )
         
         with detail_col2:
             st.subheader("📦 Lịch sử thay đổi tồn kho")
-            # Pass the date range directly to the fetch function
-            stock_changes_display_df = fetch_all_stock_history(start_date_detail, end_date_detail, selected_category, search_keyword)
-            if not stock_changes_display_df.empty:
-                # Ensure 'Ngày' column is datetime for proper display and further processing if needed
-                stock_changes_display_df['Ngày'] = pd.to_datetime(stock_changes_display_df['Ngày'], errors='coerce')
-                
-                # The dataframe is already filtered by SQL, so just use it directly
-                filtered_stock_display = stock_changes_display_df
-                
-                if not filtered_stock_display.empty:
-                    st.dataframe(filtered_stock_display, use_container_width=True)
-                    st.info(f"📊 Có {len(filtered_stock_display)} thay đổi tồn kho trong khoảng thời gian đã chọn")
-                else:
-                    # The warning message should reflect that no data was found for the *selected* range
-                    st.warning(f"""
-                    ⚠️ **Không có dữ liệu thay đổi tồn kho trong khoảng thời gian đã chọn ({start_date_detail.strftime('%d/%m/%Y')} - {end_date_detail.strftime('%d/%m/%Y')})**
-                    """)
-            else:
-                st.info("Không có dữ liệu thay đổi tồn kho")
+            render_history_pages(
+                "stock_history", fetch_stock_history_page, count_stock_history,
+                start_date_detail, end_date_detail, selected_category, keyword_filter,
+                f"Không có dữ liệu thay đổi tồn kho trong khoảng ngày đã chọn ({date_range_label})"
+            )
         
 
 
@@ -1815,43 +1892,41 @@ def main():
         # Inventory Dashboard - Only inventory report and details
         st.header("📦 Báo cáo Tồn kho")
         
-        # Inventory KPIs
+        # Inventory KPIs - đếm theo trạng thái trên inventory_snapshot
+        inventory_summary = fetch_inventory_summary()
+        status_counts = dict(zip(inventory_summary['status'], inventory_summary['product_count']))
+        
         kpi_col1, kpi_col2, kpi_col3, kpi_col4 = st.columns(4)
         
         with kpi_col1:
-            total_stock = fetch_total_stock()
+            total_stock = int(inventory_summary['total_stock'].sum()) if not inventory_summary.empty else 0
             st.metric("Tổng tồn kho", f"{total_stock:,}")
         
-        # Fetch inventory data once and reuse
-        inventory_df = fetch_inventory_status()
-        
         with kpi_col2:
-            out_of_stock = len(inventory_df[inventory_df['status'] == 'Hết hàng']) if not inventory_df.empty else 0
+            out_of_stock = status_counts.get('Hết hàng', 0)
             st.metric("Hết hàng", f"{out_of_stock:,}", delta=f"-{out_of_stock}" if out_of_stock > 0 else "0")
         
         with kpi_col3:
-            low_stock = len(inventory_df[inventory_df['status'].isin(['Sắp hết', 'Tồn kho thấp'])]) if not inventory_df.empty else 0
+            low_stock = status_counts.get('Sắp hết', 0) + status_counts.get('Tồn kho thấp', 0)
             st.metric("Tồn kho thấp", f"{low_stock:,}", delta=f"-{low_stock}" if low_stock > 0 else "0")
         
         with kpi_col4:
-            good_stock = len(inventory_df[inventory_df['status'] == 'Tồn kho tốt']) if not inventory_df.empty else 0
+            good_stock = status_counts.get('Tồn kho tốt', 0)
             st.metric("Tồn kho tốt", f"{good_stock:,}", delta=f"+{good_stock}" if good_stock > 0 else "0")
         
         # Inventory details table
-        if not inventory_df.empty:
+        if not inventory_summary.empty:
             st.subheader("📋 Chi tiết tồn kho")
             
-            # Filter by status
+            # Filter by status - chỉ tải danh sách sản phẩm của trạng thái được chọn
             status_filter = st.selectbox(
                 "Lọc theo trạng thái:",
-                options=['Tất cả'] + list(inventory_df['status'].unique()),
+                options=list(inventory_summary['status']) + ['Tất cả'],
+                format_func=lambda s: f"{s} ({status_counts[s]:,})" if s in status_counts else s,
                 key='status_filter'
             )
             
-            if status_filter != 'Tất cả':
-                filtered_df = inventory_df[inventory_df['status'] == status_filter]
-            else:
-                filtered_df = inventory_df
+            filtered_df = fetch_inventory_status(None if status_filter == 'Tất cả' else status_filter)
             
             # Display table without color coding
             st.dataframe(
@@ -1862,6 +1937,5 @@ def main():
             st.info("Không có dữ liệu tồn kho để hiển thị")
 
 
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,169 @@
+import os
+import time
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+import mysql.connector
+from mysql.connector import pooling
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+import metrics
+from data_version import read_data_version
+
+logger = logging.getLogger(__name__)
+
+# mysql-connector giới hạn pool tối đa 32 kết nối
+POOL_SIZE = min(int(os.getenv('DASHBOARD_POOL_SIZE', '8')), 32)
+POOL_WAIT_TIMEOUT = 10  # giây chờ khi pool đang hết kết nối rảnh
+# Số truy vấn chạy song song cho toàn tiến trình (executor dùng chung mọi phiên), tối đa nửa pool
+# để luôn còn kết nối cho các truy vấn chạy trực tiếp trong thread render của các phiên
+QUERY_WORKERS = max(1, min(int(os.getenv('DASHBOARD_QUERY_WORKERS', '4')), POOL_SIZE // 2))
+
+
+@st.cache_resource
+def get_connection_pool():
+    """Pool kết nối MySQL dùng chung cho mọi lần rerun của dashboard"""
+    logger.info(f"Tạo MySQL connection pool ({POOL_SIZE} kết nối)")
+    return pooling.MySQLConnectionPool(
+        pool_name='dashboard_pool',
+        pool_size=POOL_SIZE,
+        pool_reset_session=True,
+        host=os.getenv('DASHBOARD_MYSQL_HOST', 'localhost'),
+        database=os.getenv('DASHBOARD_MYSQL_DATABASE', 'kfm'),
+        user=os.getenv('DASHBOARD_MYSQL_USER', 'root'),
+        password=os.getenv('DASHBOARD_MYSQL_PASSWORD', '123456789@'),
+        port=int(os.getenv('DASHBOARD_MYSQL_PORT', '3306')),
+        autocommit=True,
+        use_unicode=True,
+        charset='utf8mb4',
+        collation='utf8mb4_unicode_ci',
+        connection_timeout=10
+    )
+
+
+def get_connection():
+    """
+    Mượn một kết nối từ pool và kiểm tra sức khỏe trước khi trả về.
+    Gọi connection.close() để trả kết nối về pool (không đóng TCP).
+    """
+    pool = get_connection_pool()
+    deadline = time.monotonic() + POOL_WAIT_TIMEOUT
+    while True:
+        try:
+            connection = pool.get_connection()
+            break
+        except pooling.errors.PoolError:
+            # Pool đang cạn, chờ kết nối khác được trả về
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+    try:
+        # Health check: kết nối idle có thể đã bị server cắt (wait_timeout)
+        connection.ping(reconnect=True, attempts=2, delay=1)
+    except mysql.connector.Error:
+        connection.close()
+        raise
+    return connection
+
+
+# TTL (giây) theo nhóm truy vấn. Cache đã gắn với data_version nên TTL chỉ là giới hạn an toàn
+QUERY_TTL = {
+    'kpi': 600,
+    'inventory': 600,
+    'detail': 900,
+    'trend': 1800,
+    'analysis': 1800,
+    'catalog': 3600,
+}
+
+# Chu kỳ tối đa giữa hai lần đọc data_version từ MySQL
+VERSION_POLL_TTL = 5
+
+
+@st.cache_data(ttl=VERSION_POLL_TTL, show_spinner=False)
+def get_data_version():
+    """Phiên bản dữ liệu hiện tại (do ingestion/migration tăng sau mỗi lần ghi)"""
+    connection = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+        try:
+            return read_data_version(cursor)
+        finally:
+            cursor.close()
+    except Exception as e:
+        logger.error(f"Lỗi đọc data_version: {e}")
+        return None
+    finally:
+        if connection:
+            connection.close()
+
+
+DASHBOARD_QUERY_SECONDS = metrics.histogram('dashboard_query_seconds', 'Thời gian chạy truy vấn fetch_* (cache miss)')
+DASHBOARD_FETCH_CALLS = metrics.counter('dashboard_fetch_calls_total', 'Số lần gọi fetch_* (cả cache hit)')
+
+
+def cached_query(kind):
+    """
+    Cache kết quả fetch_* theo toàn bộ tham số lọc (ngày, danh mục, từ khóa, phân khúc giá)
+    cộng với data_version hiện tại. Rerun có cùng bộ lọc được phục vụ từ bộ nhớ và chỉ
+    truy vấn lại khi job ghi dữ liệu đã tăng version.
+    """
+    def decorator(func):
+        def versioned(data_version, *args, **kwargs):
+            with DASHBOARD_QUERY_SECONDS.time(query=func.__name__):
+                return func(*args, **kwargs)
+        # Streamlit tạo khóa cache từ module + qualname nên giữ tên của hàm gốc
+        versioned.__module__ = func.__module__
+        versioned.__qualname__ = func.__qualname__
+        cached = st.cache_data(ttl=QUERY_TTL[kind], show_spinner=False)(versioned)
+
+        @functools.wraps(func)
+        def wrapper(*args, data_version=None, **kwargs):
+            # data_version truyền sẵn khi chạy trong thread phụ (submit_queries) để không đọc lại ở đó
+            DASHBOARD_FETCH_CALLS.inc(query=func.__name__)
+            if data_version is None:
+                data_version = get_data_version()
+            return cached(data_version, *args, **kwargs)
+
+        wrapper.clear = cached.clear
+        return wrapper
+    return decorator
+
+
+def invalidate_query_cache():
+    """Xóa toàn bộ cache truy vấn (nút làm mới thủ công)"""
+    st.cache_data.clear()
+
+
+def _run_with_context(ctx, func, args, kwargs):
+    # Gắn ScriptRunContext của lần render để st.cache_data hoạt động trong thread phụ
+    if ctx is not None:
+        add_script_run_ctx(ctx=ctx)
+    return func(*args, **kwargs)
+
+
+@st.cache_resource
+def get_query_executor():
+    """Thread pool dùng chung cho mọi phiên: tổng số truy vấn song song không vượt QUERY_WORKERS"""
+    return ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix='dashboard-query')
+
+
+def submit_queries(queries, data_version=None):
+    """
+    Chạy song song các fetch_* (cached_query) độc lập, mỗi thread mượn một kết nối riêng từ pool.
+    queries: dict tên -> (hàm, *tham số). Mọi thứ cần kết nối khác (data_version, từ khóa đã giải,
+    model) phải được lấy ở thread render và truyền vào, để thread phụ chỉ giữ đúng một kết nối.
+    Trả về dict tên -> Future; gọi .result() theo thứ tự hiển thị trên trang.
+    """
+    if data_version is None:
+        data_version = get_data_version()
+    ctx = get_script_run_ctx()
+    executor = get_query_executor()
+    return {
+        name: executor.submit(_run_with_context, ctx, func, args, {'data_version': data_version})
+        for name, (func, *args) in queries.items()
+    }
@@ -0,0 +1,56 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Mỗi job ghi dữ liệu (ingestion, migration) tăng version của nguồn mình sau khi commit.
+# Dashboard chỉ cần đọc một dòng tổng để biết dữ liệu đã thay đổi hay chưa.
+DATA_VERSION_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS `data_version` (
+    `source` VARCHAR(64) PRIMARY KEY,
+    `version` BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+def ensure_data_version_table(cursor):
+    """Tạo bảng data_version nếu chưa có"""
+    cursor.execute(DATA_VERSION_TABLE_SQL)
+
+
+def bump_data_version(cursor, source):
+    """Tăng version của một nguồn ghi; commit cùng transaction với dữ liệu"""
+    cursor.execute("""
+        INSERT INTO data_version (source, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, (source,))
+
+
+def read_data_version(cursor):
+    """
+    Đọc version dữ liệu hiện tại (tổng version các nguồn, chỉ tăng).
+    Nếu chưa có bảng data_version thì dùng id lớn nhất của migration_log, cuối cùng là
+    UPDATE_TIME của các bảng dữ liệu trong information_schema. Mọi nhánh đều O(1).
+    """
+    try:
+        cursor.execute("SELECT COALESCE(SUM(version), 0) FROM data_version")
+        result = cursor.fetchone()
+        return int(result[0]) if result else 0
+    except Exception as e:
+        logger.warning(f"data_version không khả dụng, dùng migration_log: {e}")
+
+    try:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM migration_log")
+        result = cursor.fetchone()
+        return int(result[0]) if result else 0
+    except Exception as e:
+        logger.warning(f"migration_log không khả dụng, dùng information_schema: {e}")
+
+    cursor.execute("""
+        SELECT COALESCE(UNIX_TIMESTAMP(MAX(UPDATE_TIME)), 0)
+        FROM information_schema.tables
+        WHERE table_schema = DATABASE()
+        AND table_name IN ('product', 'stock_history', 'price_history')
+    """)
+    result = cursor.fetchone()
+    return int(result[0]) if result else 0
@@ -0,0 +1,117 @@
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Backend phân tích của dashboard: 'mysql' (mặc định) hoặc 'duckdb'.
+# Với 'duckdb', các truy vấn tổng hợp trên daily_sales_rollup chạy trên file DuckDB được
+# dựng lại từ snapshot Parquet sau mỗi lần migration, không tranh tài nguyên với job ghi MySQL.
+DASHBOARD_BACKEND = os.getenv('DASHBOARD_BACKEND', 'mysql').lower()
+DUCKDB_PATH = os.getenv('DUCKDB_PATH', 'analytics.duckdb')
+
+# Placeholder kiểu mysql-connector (%s) -> DuckDB (?)
+_PLACEHOLDER = re.compile(r'%s')
+
+
+def duckdb_enabled():
+    """True nếu dashboard được cấu hình dùng DuckDB và file đã được dựng"""
+    return DASHBOARD_BACKEND == 'duckdb' and os.path.exists(DUCKDB_PATH)
+
+
+class DuckDBCursor:
+    """Cursor tối thiểu tương thích mysql-connector: execute(query, params), fetchone, fetchall"""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._result = None
+
+    def execute(self, query, params=None):
+        self._result = self._connection.execute(_PLACEHOLDER.sub('?', query), list(params or []))
+        return self
+
+    def fetchone(self):
+        return self._result.fetchone()
+
+    def fetchall(self):
+        return self._result.fetchall()
+
+    def close(self):
+        self._result = None
+
+
+class DuckDBConnection:
+    """Kết nối chỉ đọc tới DUCKDB_PATH, dùng được ở chỗ của kết nối MySQL trong dashboard"""
+
+    def __init__(self, path=DUCKDB_PATH):
+        import duckdb
+        self._connection = duckdb.connect(path, read_only=True)
+
+    def cursor(self):
+        return DuckDBCursor(self._connection)
+
+    def close(self):
+        self._connection.close()
+
+
+def _parquet_glob(parquet_dir, table_name):
+    return os.path.join(parquet_dir, table_name, '**', '*.parquet').replace("'", "''")
+
+
+def refresh_from_parquet(parquet_dir, duckdb_path=DUCKDB_PATH):
+    """
+    Dựng lại file DuckDB từ snapshot Parquet (product mới nhất, price_history, stock_history)
+    và tính daily_sales_rollup bằng ASOF JOIN theo giá có hiệu lực tại ngày bán.
+    Ghi ra file tạm rồi thay thế để dashboard không đọc phải file đang dựng dở.
+    """
+    import duckdb
+    from duckdb.typing import VARCHAR
+    from product_search import search_name
+
+    tmp_path = f"{duckdb_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = duckdb.connect(tmp_path)
+    try:
+        def read(table_name):
+            return f"read_parquet('{_parquet_glob(parquet_dir, table_name)}', hive_partitioning = true)"
+
+        # name_search tính bằng cùng hàm chuẩn hóa với MySQL (product_search) cho lọc từ khóa
+        conn.create_function('search_name', search_name, [VARCHAR], VARCHAR)
+        # product được xuất theo ngày snapshot: chỉ lấy phân vùng mới nhất
+        conn.execute(f"""
+            CREATE TABLE product AS
+            SELECT * EXCLUDE (dt, category),
+                   NULLIF(CAST(category AS VARCHAR), 'unknown') AS category,
+                   search_name(name) AS name_search
+            FROM {read('product')}
+            WHERE dt = (SELECT max(dt) FROM {read('product')})
+        """)
+        for table_name in ('price_history', 'stock_history'):
+            conn.execute(f"""
+                CREATE TABLE {table_name} AS
+                SELECT * EXCLUDE (dt, category) FROM {read(table_name)}
+            """)
+
+        conn.execute("""
+            CREATE TABLE daily_sales_rollup AS
+            SELECT CAST(sh.date AS DATE) AS date,
+                   COALESCE(p.category, '') AS category,
+                   sh.product_id,
+                   SUM(sh.stock_decreased) AS units_sold,
+                   SUM(sh.stock_decreased * COALESCE(ph.price, p.price)) AS revenue
+            FROM stock_history sh
+            JOIN product p ON sh.product_id = p.product_id
+            ASOF LEFT JOIN price_history ph
+                ON sh.product_id = ph.product_id AND sh.date >= ph.date
+            WHERE sh.stock_decreased > 0
+            GROUP BY ALL
+        """)
+        row_count = conn.execute("SELECT COUNT(*) FROM daily_sales_rollup").fetchone()[0]
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, duckdb_path)
+    logger.info(f"DuckDB analytics refreshed at {duckdb_path} ({row_count} rollup rows)")
+    return row_count
@@ -0,0 +1,54 @@
+import os
+import sys
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# Logging cho ingestion (product_fetcher.py, test.py): vòng lặp chỉ đẩy record vào hàng đợi,
+# một thread nền ghi ra console/file nên I/O chậm (console Windows) không chặn crawl.
+# Mặc định INFO = một dòng tóm tắt mỗi trang; INGEST_LOG_LEVEL=DEBUG để xem từng sản phẩm.
+INGEST_LOG_LEVEL = os.getenv('INGEST_LOG_LEVEL', 'INFO').upper()
+INGEST_LOG_FILE = os.getenv('INGEST_LOG_FILE')
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+
+_listener = None
+_lock = threading.Lock()
+
+
+def setup_ingest_logging(level=None, log_file=None):
+    """Gắn QueueHandler vào logger 'ingest' và chạy QueueListener (chỉ một lần mỗi tiến trình)"""
+    global _listener
+    with _lock:
+        ingest_logger = logging.getLogger('ingest')
+        if _listener is not None:
+            if level:
+                ingest_logger.setLevel(level)
+            return ingest_logger
+        ingest_logger.setLevel(level or INGEST_LOG_LEVEL)
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = [logging.StreamHandler(sys.stdout)]
+        log_file = log_file or INGEST_LOG_FILE
+        if log_file:
+            handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        ingest_logger.addHandler(QueueHandler(log_queue))
+        # Không chuyển lên root để tránh in hai lần khi ứng dụng đã cấu hình basicConfig
+        ingest_logger.propagate = False
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        # Xả hết hàng đợi trước khi tiến trình thoát
+        atexit.register(_listener.stop)
+        return ingest_logger
+
+
+def get_logger(name):
+    """Logger con của 'ingest' (ví dụ ingest.product_fetcher)"""
+    setup_ingest_logging()
+    return logging.getLogger(f"ingest.{name}")
@@ -0,0 +1,763 @@
+import os
+import time
+import json
+import argparse
+import threading
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from dotenv import load_dotenv
+
+import metrics
+import ingest_logging
+import response_archive
+
+load_dotenv()
+
+logger = ingest_logging.get_logger('core')
+
+# Lõi ingestion dùng chung: một vòng lặp phân trang gọi API ListingProductsBySlug, parse mỗi trang
+# một lần thành VariantRecord rồi phát song song tới các sink đã cấu hình:
+#   mongo    - collection kf_new (product_fetcher.save_products_page)
+#   mysql    - product/price_history/stock_history (test.save_products_page)
+#   archive  - response_archive (phản hồi thô, dùng cho replay_backfill)
+#   bigquery - bảng staging BigQuery (load job NDJSON, MERGE vào bảng chính làm phía BigQuery)
+# Mỗi sink có một worker riêng xử lý các trang theo đúng thứ tự; một lần crawl nạp mọi store:
+#   INGEST_SINKS=mongo,mysql,archive python ingestion_core.py --slugs bua-an-san-tien-loi
+url = os.getenv("API_URL")
+INGEST_SINKS = os.getenv('INGEST_SINKS')
+SINK_BACKLOG = int(os.getenv('INGEST_SINK_BACKLOG', '4'))
+PAGE_DELAY = float(os.getenv('INGEST_PAGE_DELAY', '1'))
+DEFAULT_LIMIT = 102
+MAX_RETRIES = 3
+# Số trang lỗi liên tiếp (đã hết lượt thử lại) trước khi dừng slug, tránh lặp vô hạn khi end_page mở
+MAX_CONSECUTIVE_FAILURES = int(os.getenv('INGEST_MAX_CONSECUTIVE_FAILURES', '3'))
+REQUEST_TIMEOUT = 30
+NO_PROMOTION = "Không có khuyến mãi"
+
+headers = {
+    "Content-Type": "application/json",
+    "User-Agent": "Mozilla/5.0"
+}
+
+LISTING_QUERY = """
+    query ListingProductsBySlug($slug: String, $page: Int, $limit: Int, $filters: [ListingProductBySlugInput], $order: ListingProductSortEnum, $direction: OrderDirectionEnum) {
+      listingProductsBySlug(
+        slug: $slug
+        page: $page
+        limit: $limit
+        filters: $filters
+        order: $order
+        direction: $direction
+      ) {
+        total
+        page
+        limit
+        data {
+          id
+          discountPercent
+          discountPrice
+          thumbnail
+          giftItems {
+            id
+            name
+            thumbnail
+            promotionInfo {
+              id
+              type
+              name
+              promotionSummary
+              promotionApplyLimit
+              __typename
+            }
+            __typename
+          }
+          images
+          inStock
+          isAlcohol
+          name
+          olClub {
+            discountPrice
+            discountPercent
+            __typename
+          }
+          originalPrice
+          slug
+          thumbnail
+          teasingInfo {
+            hasDelivery
+            openDate
+            deliveryDate
+            limitNote
+            receivedNoti
+            promotionId
+            variantId
+            productId
+            __typename
+          }
+          itemTrait {
+            itemType
+            itemPromotion
+            isTeasing
+            __typename
+          }
+          variants {
+            teasingInfo {
+              hasDelivery
+              openDate
+              deliveryDate
+              limitNote
+              receivedNoti
+              promotionId
+              variantId
+              productId
+              __typename
+            }
+            itemTrait {
+              itemType
+              itemPromotion
+              isTeasing
+              __typename
+            }
+            id
+            discountPercent
+            discountPrice
+            images
+            name
+            originalPrice
+            price
+            sku
+            inStock
+            thumbnail
+            stockItem {
+              quantity
+              maxSaleQuantity
+              minSaleQuantity
+              __typename
+            }
+            unit {
+              id
+              name
+              __typename
+            }
+            giftItems {
+              id
+              name
+              thumbnail
+              __typename
+            }
+            unitConversion {
+              isBaseVariant
+              baseUnitName
+              pricePerBaseUnit
+              conversion
+              formatPricePerBaseUnit
+              originalPricePerBaseUnit
+              __typename
+            }
+            isOrdered
+            isSelected
+            slug
+            isOnlineSale
+            isSale
+            preOrder {
+              counter {
+                ordered
+                remain
+                __typename
+              }
+              promotionDetail {
+                id
+                endAt
+                deliveryDate
+                termAndCondition {
+                  title
+                  content
+                  __typename
+                }
+                __typename
+              }
+              deliveryDate
+              __typename
+            }
+            groupBuy {
+              levelPrice {
+                level
+                price
+                costSavings
+                isSelected
+                discountTicker {
+                  tickerId
+                  position
+                  isOverride
+                  isImage
+                  type
+                  code
+                  name
+                  textColor
+                  backgroundColor
+                  strokeColor
+                  imageUrl
+                  deliveryDisplayText
+                  __typename
+                }
+                __typename
+              }
+              incentivePercent
+              groupCount
+              promotionDetail {
+                id
+                endAt
+                deliveryDate
+                __typename
+              }
+              __typename
+            }
+            deliveryDate
+            promotionInfoItems {
+              id
+              type
+              name
+              promotionSummary
+              promotionApplyLimit
+              __typename
+            }
+            promotionSummary
+            promotionApplyLimit
+            warnMsg {
+              type
+              message
+              __typename
+            }
+            orderedCounter
+            metadata
+            hasOneInManyLimitation
+            limitQuantity
+            highlightedData {
+              highlightedInfos {
+                code
+                text
+                textColor
+                backgroundColor
+                fillColor
+                fillRatio
+                headingIcon
+                boughtCustomerNames
+                hoverable
+                underlying
+                gifts {
+                  imageUrl
+                  name
+                  quantity
+                  sku
+                  isDisabled
+                  badgeItem {
+                    badgeId
+                    position
+                    isOverride
+                    isImage
+                    type
+                    code
+                    name
+                    textColor
+                    backgroundColor
+                    strokeColor
+                    imageUrl
+                    deliveryDisplayText
+                    __typename
+                    }
+                  __typename
+                }
+                __typename
+              }
+              __typename
+            }
+            __typename
+          }
+          isActive
+          subCate
+          tickerItems {
+            tickerId
+            isImage
+            type
+            code
+            name
+            textColor
+            backgroundColor
+            strokeColor
+            imageUrl
+            __typename
+          }
+          badgeItems {
+            badgeId
+            isImage
+            type
+            code
+            name
+            textColor
+            backgroundColor
+            strokeColor
+            imageUrl
+            __typename
+          }
+          __typename
+        }
+        cateId
+        subCateId
+        specCateId
+        brandId
+        __typename
+      }
+    }
+    """
+
+
+# Một biến thể đã chuẩn hóa từ một trang API (giá trị đã ép kiểu, không âm)
+VariantRecord = namedtuple('VariantRecord', [
+    'product_id', 'parent_id', 'name', 'category', 'date', 'stock_quantity', 'total_sold',
+    'price', 'original_price', 'promotion', 'description',
+])
+
+# Một trang gửi tới các sink: body là JSON thô (cho archive), records là các VariantRecord đã parse
+PageBatch = namedtuple('PageBatch', ['slug', 'page', 'date', 'fetched_at', 'body', 'records'])
+
+HTTP_PAGE_SECONDS = metrics.histogram('ingest_http_page_seconds', 'Thời gian gọi API cho một trang')
+HTTP_RESPONSES = metrics.counter('ingest_http_responses_total', 'Số phản hồi API theo mã trạng thái')
+PAGE_WRITE_SECONDS = metrics.histogram('ingest_page_write_seconds', 'Thời gian ghi DB cho toàn bộ biến thể của một trang')
+VARIANTS_WRITTEN = metrics.counter('ingest_variants_written_total', 'Số biến thể đã ghi')
+SINK_ERRORS = metrics.counter('ingest_sink_errors_total', 'Số trang ghi thất bại theo sink')
+
+
+def build_payload(slug, page, limit):
+    return {
+        "operationName": "ListingProductsBySlug",
+        "query": LISTING_QUERY,
+        "variables": {
+            "limit": limit,
+            "page": page,
+            "slug": slug,
+            "filters": []
+        }
+    }
+
+
+def page_products(body):
+    """Danh sách sản phẩm (phần `data`) của một phản hồi ListingProductsBySlug"""
+    return ((body or {}).get('data') or {}).get('listingProductsBySlug', {}).get('data') or []
+
+
+def _non_negative_int(value):
+    return max(0, int(value)) if value is not None else 0
+
+
+def parse_promotion(product):
+    """Nối promotionSummary của mọi quà tặng; không có thì trả NO_PROMOTION"""
+    promotion_texts = []
+    for gift_item in product.get("giftItems") or []:
+        promotion_info = gift_item.get("promotionInfo")
+        if promotion_info:
+            promotion_texts.append(promotion_info.get("promotionSummary") or "Khuyến mãi")
+    return ", ".join(promotion_texts) if promotion_texts else NO_PROMOTION
+
+
+def parse_products(products, slug, date_str):
+    """Chuẩn hóa các sản phẩm của một trang thành danh sách VariantRecord"""
+    records = []
+    for product in products:
+        if not product:
+            continue
+        description = (product.get("descriptionJson") or {}).get("introduction") or ""
+        promotion = parse_promotion(product)
+        logger.debug("Product %s promotion: %s", product.get("id"), promotion)
+
+        for variant in product.get("variants") or []:
+            try:
+                original_price = variant.get("originalPrice") or 0
+                price = variant.get("discountPrice")
+                records.append(VariantRecord(
+                    product_id=variant["id"],
+                    parent_id=product.get("id"),
+                    name=str(variant.get("name") or "Unknown"),
+                    category=slug,
+                    date=date_str,
+                    stock_quantity=_non_negative_int((variant.get("stockItem") or {}).get("quantity", 0)),
+                    total_sold=_non_negative_int(variant.get("orderedCounter", 0)),
+                    price=_non_negative_int(original_price if price is None else price),
+                    original_price=_non_negative_int(original_price),
+                    promotion=promotion,
+                    description=description,
+                ))
+            except KeyError as e:
+                logger.warning(f"Thiếu trường dữ liệu trong variant: {e}")
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Dữ liệu variant không hợp lệ ({variant.get('id')}): {e}")
+    return records
+
+
+def fetch_page(slug, page, limit):
+    """
+    Gọi API cho một trang (thử lại tối đa MAX_RETRIES lần).
+    Trả về body JSON, None nếu thất bại sau các lần thử; ném RuntimeError nếu API báo lỗi GraphQL.
+    """
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            logger.debug("Fetching slug=%s page=%d attempt=%d", slug, page, attempt)
+            with HTTP_PAGE_SECONDS.time():
+                response = requests.post(url, headers=headers, json=build_payload(slug, page, limit),
+                                         timeout=REQUEST_TIMEOUT)
+            HTTP_RESPONSES.inc(status=response.status_code)
+            if response.status_code == 200:
+                body = response.json()
+                if "errors" in body:
+                    raise RuntimeError(f"API returned errors: {body['errors']}")
+                return body
+            logger.warning(f"Request for page {page} failed with status code {response.status_code}")
+            delay = 2
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Network error on page {page}: {e}")
+            delay = 3
+        except json.JSONDecodeError as e:
+            logger.warning(f"JSON decode error on page {page}: {e}")
+            delay = 2
+        if attempt < MAX_RETRIES:
+            logger.info(f"Retrying page {page}... ({attempt}/{MAX_RETRIES})")
+            time.sleep(delay)
+    return None
+
+
+class MongoSink:
+    """Collection kf_new; delta tính từ LastStateMap nạp theo danh mục, dùng chung cả lần chạy"""
+    name = 'mongo'
+
+    def start(self):
+        import product_fetcher
+        from variant_last_state import LastStateMap
+
+        self.fetcher = product_fetcher
+        self.fetcher.collection.create_index("category")
+        self.last_state = LastStateMap()
+        self.warmed = set()
+
+    def write_page(self, batch):
+        if batch.slug not in self.warmed:
+            # Nạp trạng thái cuối của danh mục ở trang đầu tiên của danh mục đó (giống MySQLSink)
+            self.last_state.warm(self.fetcher.collection, batch.slug)
+            self.warmed.add(batch.slug)
+            logger.info(f"Mongo: trạng thái cuối của {len(self.last_state)} biến thể sau khi nạp {batch.slug}")
+        return self.fetcher.save_products_page(batch.records, batch.date, self.last_state, batch.page)
+
+    def finish(self):
+        pass
+
+
+class MySQLSink:
+    """Bảng product/price_history/stock_history; commit mỗi trang, làm mới snapshot khi kết thúc"""
+    name = 'mysql'
+
+    def start(self):
+        import test as mysql_fetcher
+        from write_elision import WRITE_ELISION, VariantStateCache
+
+        self.fetcher = mysql_fetcher
+        self.connection = mysql_fetcher.create_connection()
+        if not self.connection:
+            raise RuntimeError("Không thể kết nối đến MySQL")
+        mysql_fetcher.create_tables(self.connection)
+        self.state_cache = VariantStateCache() if WRITE_ELISION else None
+        self.warmed = set()
+        self.written = 0
+
+    def write_page(self, batch):
+        if self.state_cache is not None and batch.slug not in self.warmed:
+            # Nạp trạng thái đã ghi của danh mục ở trang đầu tiên của danh mục đó
+            cursor = self.connection.cursor()
+            self.state_cache.warm(cursor, batch.slug)
+            cursor.close()
+            self.warmed.add(batch.slug)
+        written = self.fetcher.save_products_page(
+            self.connection, batch.records, datetime.strptime(batch.date, "%Y-%m-%d"), self.state_cache
+        )
+        self.fetcher.commit_page(self.connection, batch.records, self.state_cache)
+        self.written += written
+        return written
+
+    def finish(self):
+        from data_version import bump_data_version
+        from inventory_snapshot import refresh_inventory_snapshot
+
+        try:
+            if self.written > 0:
+                # Làm mới snapshot tồn kho và báo cho dashboard biết dữ liệu đã thay đổi
+                cursor = self.connection.cursor()
+                refresh_inventory_snapshot(cursor)
+                bump_data_version(cursor, 'ingestion')
+                cursor.close()
+                self.connection.commit()
+            if self.state_cache is not None:
+                logger.info(f"MySQL: {self.state_cache.unchanged} biến thể không đổi (chỉ cập nhật last seen)")
+        finally:
+            self.connection.close()
+
+
+class ArchiveSink:
+    """Phản hồi thô vào response_archive (ghi nền)"""
+    name = 'archive'
+
+    def start(self):
+        pass
+
+    def write_page(self, batch):
+        response_archive.archive_response(batch.slug, batch.page, batch.body, batch.fetched_at)
+        return len(batch.records)
+
+    def finish(self):
+        pass
+
+
+class BigQueryStagingSink:
+    """
+    Gom VariantRecord vào bảng staging BigQuery bằng load job (WRITE_APPEND), mỗi dòng một biến thể
+    một lần crawl. Việc MERGE vào bảng chính (app.upload_to_bigquery) chạy phía BigQuery.
+    """
+    name = 'bigquery'
+    FLUSH_ROWS = 5000
+
+    def start(self):
+        from google.cloud import bigquery
+        from google.auth import default
+
+        project_id = os.getenv("BIGQUERY_PROJECT_ID")
+        dataset_id = os.getenv("BIGQUERY_DATASET_ID")
+        staging_table_id = os.getenv("BIGQUERY_STAGING_TABLE_ID") or \
+            f"{os.getenv('BIGQUERY_TABLE_ID') or 'product'}_staging"
+        credentials, _ = default()
+        self.client = bigquery.Client(credentials=credentials, project=project_id)
+        self.table_id = f"{project_id}.{dataset_id}.{staging_table_id}"
+        self.job_config = bigquery.LoadJobConfig(
+            schema=[
+                bigquery.SchemaField("id", "STRING"),
+                bigquery.SchemaField("parent_id", "STRING"),
+                bigquery.SchemaField("name", "STRING"),
+                bigquery.SchemaField("category", "STRING"),
+                bigquery.SchemaField("date", "DATE"),
+                bigquery.SchemaField("fetched_at", "TIMESTAMP"),
+                bigquery.SchemaField("stock_quantity", "INTEGER"),
+                bigquery.SchemaField("total_sold", "INTEGER"),
+                bigquery.SchemaField("price", "INTEGER"),
+                bigquery.SchemaField("original_price", "INTEGER"),
+                bigquery.SchemaField("promotion", "STRING"),
+                bigquery.SchemaField("description", "STRING"),
+            ],
+            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        )
+        self.rows = []
+
+    def write_page(self, batch):
+        fetched_at = batch.fetched_at.isoformat(timespec='seconds')
+        for record in batch.records:
+            row = record._asdict()
+            row['id'] = row.pop('product_id')
+            row['fetched_at'] = fetched_at
+            self.rows.append(row)
+        if len(self.rows) >= self.FLUSH_ROWS:
+            self.flush()
+        return len(batch.records)
+
+    def flush(self):
+        if not self.rows:
+            return
+        self.client.load_table_from_json(self.rows, self.table_id, job_config=self.job_config).result()
+        logger.info(f"BigQuery: nạp {len(self.rows)} dòng vào {self.table_id}")
+        self.rows = []
+
+    def finish(self):
+        self.flush()
+
+
+SINK_TYPES = {
+    'mongo': MongoSink,
+    'mysql': MySQLSink,
+    'archive': ArchiveSink,
+    'bigquery': BigQueryStagingSink,
+}
+
+
+def configured_sinks(default):
+    """Tên sink từ INGEST_SINKS (phân tách bằng dấu phẩy), nếu không có thì dùng default"""
+    if INGEST_SINKS:
+        return [name.strip() for name in INGEST_SINKS.split(',') if name.strip()]
+    return list(default)
+
+
+def make_sink(name):
+    sink_type = SINK_TYPES.get(name)
+    if sink_type is None:
+        raise ValueError(f"Sink không hợp lệ: {name} (chọn trong {sorted(SINK_TYPES)})")
+    return sink_type()
+
+
+class SinkWorker:
+    """
+    Một thread cho mỗi sink: các trang được ghi đúng thứ tự, các sink chạy song song với nhau
+    và với việc gọi API trang kế tiếp. Tối đa SINK_BACKLOG trang chờ mỗi sink.
+    """
+
+    def __init__(self, sink, backlog=SINK_BACKLOG):
+        self.sink = sink
+        self.backlog = backlog
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sink-{sink.name}")
+        self.pending = deque()
+        self.written = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def submit(self, batch):
+        while len(self.pending) >= self.backlog:
+            self.pending.popleft().result()
+        self.pending.append(self.executor.submit(self._write, batch))
+
+    def _write(self, batch):
+        try:
+            with PAGE_WRITE_SECONDS.time(sink=self.sink.name):
+                written = self.sink.write_page(batch)
+            VARIANTS_WRITTEN.inc(written, sink=self.sink.name)
+            with self.lock:
+                self.written += written
+        except Exception as e:
+            SINK_ERRORS.inc(sink=self.sink.name)
+            with self.lock:
+                self.errors += 1
+            logger.error(f"Sink {self.sink.name} lỗi ở trang {batch.page} ({batch.slug}): {e}")
+
+    def drain(self):
+        while self.pending:
+            self.pending.popleft().result()
+
+    def close(self):
+        self.drain()
+        self.executor.shutdown(wait=True)
+        try:
+            self.sink.finish()
+        except Exception as e:
+            logger.error(f"Sink {self.sink.name} lỗi khi kết thúc: {e}")
+
+
+def start_sinks(sinks):
+    """Khởi động các sink (tên hoặc đối tượng); sink không khởi động được sẽ bị bỏ qua"""
+    workers = []
+    for sink in sinks:
+        sink = make_sink(sink) if isinstance(sink, str) else sink
+        try:
+            sink.start()
+        except Exception as e:
+            logger.error(f"Không khởi động được sink {sink.name}: {e}")
+            continue
+        workers.append(SinkWorker(sink))
+    return workers
+
+
+def crawl_slug(workers, slug, start_page=1, end_page=None, limit=DEFAULT_LIMIT, target_date=None):
+    """Crawl một danh mục và phát từng trang tới các worker; trả về số biến thể đã parse"""
+    date_str = (target_date or datetime.now()).strftime("%Y-%m-%d")
+    total_variants = 0
+    page = start_page
+    consecutive_failures = 0
+
+    while end_page is None or page <= end_page:
+        page_start = time.perf_counter()
+        try:
+            body = fetch_page(slug, page, limit)
+        except RuntimeError as e:
+            logger.error(str(e))
+            break
+
+        if body is None:
+            consecutive_failures += 1
+            if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                logger.error(f"Failed {consecutive_failures} consecutive pages of {slug} (last: page {page}). Stopping.")
+                break
+            logger.error(f"Failed to process page {page} after {MAX_RETRIES} attempts. Moving to next page.")
+        else:
+            consecutive_failures = 0
+            products = page_products(body)
+            if not products:
+                logger.info(f"Trang {page} ({slug}) không có dữ liệu, dừng lại.")
+                break
+            records = parse_products(products, slug, date_str)
+            batch = PageBatch(slug, page, date_str, datetime.now(), body, records)
+            for worker in workers:
+                worker.submit(batch)
+            total_variants += len(records)
+            logger.info(f"slug={slug} page={page} products={len(products)} variants={len(records)} "
+                        f"seconds={time.perf_counter() - page_start:.2f}")
+
+        page += 1
+        time.sleep(PAGE_DELAY)
+
+    logger.info(f"slug={slug} total_variants={total_variants}")
+    return total_variants
+
+
+def crawl_categories(slugs, sinks, start_page=1, end_page=None, limit=DEFAULT_LIMIT, target_date=None,
+                     limits=None):
+    """
+    Crawl các danh mục trong một lần chạy và ghi vào mọi sink (tên trong SINK_TYPES hoặc đối tượng
+    có start/write_page/finish): kết nối, nạp trạng thái, metrics và tổng kết chỉ làm một lần.
+    limits: {slug: số sản phẩm mỗi trang} nếu mỗi danh mục cần limit riêng.
+    Trả về {tên sink: số biến thể đã ghi}.
+    """
+    slugs = list(slugs)
+    if not slugs:
+        return {}
+    metrics.start_http_server()
+    workers = start_sinks(sinks)
+    if not workers:
+        logger.error("Không có sink nào hoạt động, bỏ qua crawl")
+        return {}
+    try:
+        for slug in slugs:
+            try:
+                crawl_slug(workers, slug, start_page, end_page, (limits or {}).get(slug, limit), target_date)
+            except Exception as e:
+                logger.error(f"Lỗi khi crawl {slug}: {e}")
+            # Chờ các sink ghi xong danh mục trước khi sang danh mục kế tiếp
+            for worker in workers:
+                worker.drain()
+    finally:
+        for worker in workers:
+            worker.close()
+
+    stats = {worker.sink.name: worker.written for worker in workers}
+    errors = {worker.sink.name: worker.errors for worker in workers}
+    logger.info(f"ingest sinks={stats} errors={errors}")
+    metrics.dump_summary(f"ingest-{slugs[0]}" if len(slugs) == 1 else "ingest", log=logger)
+    return stats
+
+
+def crawl_category(slug, sinks, start_page=1, end_page=None, limit=DEFAULT_LIMIT, target_date=None):
+    """Một danh mục (tương thích); nhiều danh mục thì gọi crawl_categories một lần với mọi slug"""
+    return crawl_categories([slug], sinks, start_page, end_page, limit, target_date)
+
+
+def main():
+    import synthetic_data
+
+    parser = argparse.ArgumentParser(description='Crawl ListingProductsBySlug một lần vào nhiều sink')
+    parser.add_argument('--sinks', default=','.join(configured_sinks(['mysql', 'archive'])),
+                        help=f"Danh sách sink phân tách bằng dấu phẩy: {', '.join(SINK_TYPES)}")
+    parser.add_argument('--slugs', help='Các slug phân tách bằng dấu phẩy (mặc định: category_url.txt)')
+    parser.add_argument('--start-page', type=int, default=1)
+    parser.add_argument('--end-page', type=int)
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args()
+
+    slugs = args.slugs.split(',') if args.slugs else synthetic_data.load_category_slugs()
+    sinks = [name.strip() for name in args.sinks.split(',') if name.strip()]
+    crawl_categories(slugs, sinks, args.start_page, args.end_page, args.limit)
+
+
+if __name__ == "__main__":
+    main()
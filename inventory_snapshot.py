@@ -0,0 +1,61 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Trạng thái tồn kho theo thứ tự hiển thị (ngưỡng giống dashboard cũ)
+INVENTORY_STATUSES = ['Hết hàng', 'Sắp hết', 'Tồn kho thấp', 'Tồn kho tốt']
+
+INVENTORY_STATUS_SQL = """
+CASE
+    WHEN p.stock_quantity = 0 THEN 'Hết hàng'
+    WHEN p.stock_quantity <= 10 THEN 'Sắp hết'
+    WHEN p.stock_quantity <= 50 THEN 'Tồn kho thấp'
+    ELSE 'Tồn kho tốt'
+END
+"""
+
+# Ảnh chụp trạng thái tồn kho của từng sản phẩm, làm mới sau mỗi lần ingestion/migration.
+# Dashboard đếm theo status bằng GROUP BY trên index và chỉ đọc danh sách của trạng thái đang xem.
+INVENTORY_SNAPSHOT_SQL = """
+CREATE TABLE IF NOT EXISTS `inventory_snapshot` (
+    `product_id` VARCHAR(255) PRIMARY KEY,
+    `name` TEXT,
+    `category` VARCHAR(255),
+    `price` BIGINT UNSIGNED DEFAULT 0,
+    `stock_quantity` INT DEFAULT 0,
+    `status` VARCHAR(32) NOT NULL,
+    `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX `idx_status_stock` (`status`, `stock_quantity`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+def ensure_inventory_snapshot_table(cursor):
+    """Tạo bảng inventory_snapshot nếu chưa có"""
+    cursor.execute(INVENTORY_SNAPSHOT_SQL)
+
+
+def refresh_inventory_snapshot(cursor):
+    """
+    Làm mới toàn bộ snapshot từ bảng product (một INSERT ... SELECT) và xóa sản phẩm
+    không còn trong catalog. Gọi trong cùng transaction với lần ghi dữ liệu.
+    """
+    cursor.execute(f"""
+        INSERT INTO inventory_snapshot (product_id, name, category, price, stock_quantity, status)
+        SELECT p.product_id, p.name, p.category, p.price, p.stock_quantity, {INVENTORY_STATUS_SQL}
+        FROM product p
+        ON DUPLICATE KEY UPDATE
+            name = VALUES(name),
+            category = VALUES(category),
+            price = VALUES(price),
+            stock_quantity = VALUES(stock_quantity),
+            status = VALUES(status)
+    """)
+    upserted = cursor.rowcount
+    cursor.execute("""
+        DELETE s FROM inventory_snapshot s
+        LEFT JOIN product p ON s.product_id = p.product_id
+        WHERE p.product_id IS NULL
+    """)
+    logger.info(f"Đã làm mới inventory_snapshot ({upserted} dòng thay đổi, xóa {cursor.rowcount})")
+    return upserted
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# Metrics trong tiến trình cho crawl, migration và dashboard.
+# Xuất dạng Prometheus text tại http://<METRICS_HOST>:<METRICS_PORT>/metrics (khi có METRICS_PORT)
+# và dạng JSON tóm tắt ở cuối mỗi lần chạy (ghi thêm file nếu có METRICS_SUMMARY_DIR).
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = os.getenv('METRICS_PORT')
+METRICS_SUMMARY_DIR = os.getenv('METRICS_SUMMARY_DIR')
+
+# Mốc histogram (giây) phù hợp từ một truy vấn nhanh đến một trang API chậm
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_key):
+    if not label_key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in label_key) + "}"
+
+
+class Counter:
+    """Bộ đếm chỉ tăng, theo nhãn"""
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+    def summary(self):
+        with self.lock:
+            return {_format_labels(key) or 'total': value for key, value in self.values.items()}
+
+
+class Gauge(Counter):
+    """Giá trị tức thời (ví dụ rows/s của lần migration gần nhất)"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+
+class Histogram:
+    """Phân bố giá trị (thường là giây) theo các mốc cố định, kèm sum/count"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0,
+                                             'max': 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+            series['max'] = max(series['max'], value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Đo thời gian một khối lệnh và ghi vào histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        rows = []
+        with self.lock:
+            for key, series in self.series.items():
+                for bound, count in zip(self.buckets, series['counts']):
+                    rows.append((f"{self.name}_bucket", key + (('le', bound),), count))
+                rows.append((f"{self.name}_bucket", key + (('le', '+Inf'),), series['count']))
+                rows.append((f"{self.name}_sum", key, series['sum']))
+                rows.append((f"{self.name}_count", key, series['count']))
+        return rows
+
+    def summary(self):
+        with self.lock:
+            return {
+                _format_labels(key) or 'total': {
+                    'count': series['count'],
+                    'sum': round(series['sum'], 6),
+                    'avg': round(series['sum'] / series['count'], 6) if series['count'] else 0.0,
+                    'max': round(series['max'], 6),
+                }
+                for key, series in self.series.items()
+            }
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} đã được đăng ký với kiểu {metric.kind}")
+            return metric
+
+    def render_prometheus(self):
+        """Toàn bộ metrics ở định dạng Prometheus text exposition 0.0.4"""
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, key, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: metric.summary() for metric in metrics}
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text):
+    return REGISTRY._get_or_create(Counter, name, help_text)
+
+
+def gauge(name, help_text):
+    return REGISTRY._get_or_create(Gauge, name, help_text)
+
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS):
+    return REGISTRY._get_or_create(Histogram, name, help_text, buckets)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            body = REGISTRY.render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.split('?')[0] == '/metrics.json':
+            body = json.dumps(REGISTRY.summary(), ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port=None, host=METRICS_HOST):
+    """
+    Mở endpoint /metrics trong thread nền. Gọi nhiều lần chỉ mở một server;
+    không làm gì nếu không có port (tham số hoặc METRICS_PORT).
+    """
+    global _server
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+            except OSError as e:
+                logger.warning(f"Không mở được metrics endpoint {host}:{port}: {e}")
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name='metrics-http', daemon=True).start()
+            logger.info(f"Metrics endpoint: http://{host}:{port}/metrics")
+    return _server
+
+
+def dump_summary(run_name, log=None):
+    """
+    Ghi log JSON tóm tắt metrics ở cuối một lần chạy, thêm file nếu có METRICS_SUMMARY_DIR.
+    log: logger của tiến trình gọi (ví dụ logger 'ingest.*' của ingestion, vốn không chuyển lên root);
+    mặc định dùng logger của module này.
+    """
+    summary = {'run': run_name, 'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'metrics': REGISTRY.summary()}
+    text = json.dumps(summary, ensure_ascii=False)
+    (log or logger).info(f"Metrics summary: {text}")
+    if METRICS_SUMMARY_DIR:
+        os.makedirs(METRICS_SUMMARY_DIR, exist_ok=True)
+        path = os.path.join(METRICS_SUMMARY_DIR, f"{run_name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return summary
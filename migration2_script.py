@@ -14,6 +14,11 @@ import sys
 import hashlib
 import gc
 import subprocess
+import metrics
+from data_version import ensure_data_version_table, bump_data_version
+from sales_rollup import ensure_rollup_table, refresh_rollup_for_products
+from inventory_snapshot import ensure_inventory_snapshot_table, refresh_inventory_snapshot
+from product_search import search_name
 
 load_dotenv()
 
@@ -28,6 +33,11 @@ logging.basicConfig(
     ]
 )
 
+MIGRATION_BATCH_SECONDS = metrics.histogram('migration_batch_seconds', 'Thời gian đọc Mongo + ghi MySQL + commit một batch')
+MIGRATION_ROWS = metrics.counter('migration_rows_total', 'Số dòng đã ghi vào MySQL theo bảng')
+MIGRATION_ROWS_PER_SECOND = metrics.gauge('migration_rows_per_second', 'Số document/giây của lần migration gần nhất')
+
+
 class MongoToMySQLMigration:
     def __init__(self):
         self.mysql_conn = None
@@ -190,7 +200,7 @@ class MongoToMySQLMigration:
                 cursor.execute("SET sql_log_bin = 0")
                 
                 # Drop existing tables
-                tables_to_drop = ['price_history', 'stock_history', 'product']
+                tables_to_drop = ['inventory_snapshot', 'daily_sales_rollup', 'price_history', 'stock_history', 'product']
                 for table in tables_to_drop:
                     cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
                 
@@ -202,6 +212,7 @@ class MongoToMySQLMigration:
                     `original_id` VARCHAR(255),
                     `category` VARCHAR(255),
                     `name` TEXT,
+                    `name_search` TEXT,
                     `price` BIGINT UNSIGNED DEFAULT 0,
                     `promotion` TEXT,
                     `date` DATETIME,
@@ -212,7 +223,7 @@ class MongoToMySQLMigration:
                     `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                     INDEX `idx_mongo_id` (`mongo_id`),
                     INDEX `idx_original_id` (`original_id`),
-                    INDEX `idx_category` (`category`),
+                    INDEX `idx_category_price` (`category`, `price`),
                     INDEX `idx_price` (`price`),
                     INDEX `idx_stock` (`stock_quantity`),
                     INDEX `idx_date` (`date`)
@@ -221,6 +232,7 @@ class MongoToMySQLMigration:
                 cursor.execute(product_sql)
                 
                 # Create stock_history table
+                # Covering index: truy vấn dashboard lọc theo khoảng date chỉ cần đọc index, không đọc bảng
                 stock_history_sql = """
                 CREATE TABLE `stock_history` (
                     `id` INT AUTO_INCREMENT PRIMARY KEY,
@@ -230,8 +242,9 @@ class MongoToMySQLMigration:
                     `stock_decreased` INT DEFAULT 0,
                     `note` TEXT,
                     `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    INDEX `idx_product_date` (`product_id`, `date`),
-                    INDEX `idx_date` (`date`)
+                    INDEX `idx_date_sold` (`date`, `stock_decreased`, `product_id`, `stock_increased`),
+                    INDEX `idx_product_date_sold` (`product_id`, `date`, `stock_decreased`, `stock_increased`),
+                    INDEX `idx_date_id` (`date`, `id`)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
                 """
                 cursor.execute(stock_history_sql)
@@ -246,8 +259,9 @@ class MongoToMySQLMigration:
                     `original_price` BIGINT UNSIGNED DEFAULT 0,
                     `note` TEXT,
                     `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    INDEX `idx_product_date` (`product_id`, `date`),
-                    INDEX `idx_date` (`date`)
+                    INDEX `idx_date_price` (`date`, `product_id`, `price`, `original_price`),
+                    INDEX `idx_product_date_price` (`product_id`, `date`, `price`, `original_price`),
+                    INDEX `idx_date_id` (`date`, `id`)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
                 """
                 cursor.execute(price_history_sql)
@@ -275,6 +289,10 @@ class MongoToMySQLMigration:
                # Cột đã tồn tại, bỏ qua
                     pass
                 cursor.execute(migration_log_sql)
+                ensure_data_version_table(cursor)
+                # Rollup doanh số theo ngày, được cập nhật theo từng batch migration
+                ensure_rollup_table(cursor)
+                ensure_inventory_snapshot_table(cursor)
                 
                 # Re-enable checks
                 cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
@@ -295,11 +313,12 @@ class MongoToMySQLMigration:
         """Migrate products in batch with improved error handling"""
         product_sql = """
         INSERT INTO `product` 
-        (`product_id`, `mongo_id`, `original_id`, `category`, `name`, `price`, `promotion`, `date`, `original_price`, `stock_quantity`, `total_sold`) 
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        (`product_id`, `mongo_id`, `original_id`, `category`, `name`, `name_search`, `price`, `promotion`, `date`, `original_price`, `stock_quantity`, `total_sold`) 
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         ON DUPLICATE KEY UPDATE
         `category` = VALUES(`category`),
         `name` = VALUES(`name`),
+        `name_search` = VALUES(`name_search`),
         `price` = VALUES(`price`),
         `promotion` = VALUES(`promotion`),
         `date` = VALUES(`date`),
@@ -336,6 +355,7 @@ class MongoToMySQLMigration:
                     str(original_id)[:255] if original_id else None,
                     str(doc.get('category', ''))[:255],
                     str(doc.get('name', ''))[:1000],
+                    search_name(str(doc.get('name', ''))[:1000]),
                     self.clean_number(doc.get('price', 0)),
                     str(doc.get('promotion', ''))[:1000],
                     doc_date,
@@ -521,6 +541,7 @@ class MongoToMySQLMigration:
                         }
                         self.processed_docs.clear()
                         for start in range(0, total_docs, batch_size):
+                            batch_start = time.perf_counter()
                             try:
                                 batch_docs = list(collection.find().skip(start).limit(batch_size))
                                 if not batch_docs:
@@ -529,7 +550,12 @@ class MongoToMySQLMigration:
                                 products_migrated = self.migrate_products_batch(cursor, batch_docs, id_mapping)
                                 stock_migrated = self.migrate_stock_history_batch(cursor, batch_docs, id_mapping)
                                 price_migrated = self.migrate_price_history_batch(cursor, batch_docs, id_mapping)
+                                refresh_rollup_for_products(cursor, list(id_mapping.values()))
                                 mysql_conn.commit()
+                                MIGRATION_BATCH_SECONDS.observe(time.perf_counter() - batch_start)
+                                MIGRATION_ROWS.inc(products_migrated, table='product')
+                                MIGRATION_ROWS.inc(stock_migrated, table='stock_history')
+                                MIGRATION_ROWS.inc(price_migrated, table='price_history')
                                 self.migration_stats['total_processed'] += len(batch_docs)
                                 progress = (start + len(batch_docs)) / total_docs * 100
                                 self.logger.info(f"Progress: {progress:.1f}% | "
@@ -591,6 +617,9 @@ class MongoToMySQLMigration:
             status,
             notes
         ])
+        # Làm mới snapshot tồn kho và báo cho dashboard biết dữ liệu đã thay đổi (commit cùng migration_log)
+        refresh_inventory_snapshot(cursor)
+        bump_data_version(cursor, 'migration')
 
     def run_migration(self, batch_size=200):
         self.logger.info("Migration triggered by scheduler")  # Log mỗi lần scheduler gọi
@@ -598,10 +627,16 @@ class MongoToMySQLMigration:
         try:
             self.logger.info("Starting automated migration process...")
             self.create_table_structure()
+            migrate_start = time.perf_counter()
             self.migrate_data(batch_size=batch_size)
+            migrate_seconds = time.perf_counter() - migrate_start
+            if migrate_seconds > 0:
+                MIGRATION_ROWS_PER_SECOND.set(self.migration_stats['total_processed'] / migrate_seconds)
+            self.export_parquet_snapshot()
             end_time = time.time()
             duration = end_time - start_time
             self.logger.info(f"Migration completed in {duration:.2f} seconds")
+            metrics.dump_summary('migration')
             
             # Tự động chạy dashboard sau khi migration hoàn thành
             self.start_dashboard()
@@ -611,6 +646,38 @@ class MongoToMySQLMigration:
             self.logger.error(f"Migration failed: {e}")
             return False
 
+    def export_parquet_snapshot(self):
+        """Xuất snapshot Parquet sau migration nếu có cấu hình PARQUET_EXPORT_DIR"""
+        output_dir = os.getenv('PARQUET_EXPORT_DIR')
+        if not output_dir:
+            return
+        try:
+            from parquet_export import export_snapshot
+            with self.get_mysql_connection() as conn:
+                results = export_snapshot(conn, output_dir)
+            self.logger.info(f"Parquet snapshot exported to {output_dir}: {results}")
+        except Exception as e:
+            # Export lỗi không làm hỏng migration đã commit
+            self.logger.error(f"Parquet export failed: {e}")
+            return
+        self.refresh_duckdb_analytics(output_dir)
+
+    def refresh_duckdb_analytics(self, parquet_dir):
+        """Dựng lại file DuckDB cho dashboard từ snapshot Parquet khi DASHBOARD_BACKEND=duckdb"""
+        from duckdb_backend import DASHBOARD_BACKEND, refresh_from_parquet
+        if DASHBOARD_BACKEND != 'duckdb':
+            return
+        try:
+            refresh_from_parquet(parquet_dir)
+            # Snapshot DuckDB mới hơn dữ liệu lúc migration bump version: báo lại cho dashboard
+            with self.get_mysql_connection() as conn:
+                cursor = conn.cursor()
+                bump_data_version(cursor, 'analytics')
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            self.logger.error(f"DuckDB analytics refresh failed: {e}")
+
     def start_dashboard(self):
         """Tự động chạy dashboard Streamlit"""
         try:
@@ -667,6 +734,7 @@ def main():
     parser.add_argument('--batch-size', type=int, default=200,
                       help='Batch size for migration (default: 200)')
     args = parser.parse_args()
+    metrics.start_http_server()
     migration = MongoToMySQLMigration()
     try:
         if args.mode == 'once':
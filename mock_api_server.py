@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import synthetic_data
+import response_archive
+
+logger = logging.getLogger(__name__)
+
+# Server giả lập API GraphQL ListingProductsBySlug để chạy crawler offline:
+#   API_URL=http://127.0.0.1:8765/graphql python crawl_kf.py
+# Dữ liệu lấy từ catalog sinh bởi synthetic_data hoặc từ thư mục fixture đã ghi lại
+# (response_<slug>_page_<page>.json) hoặc từ response_archive của một ngày. Có thể cấu hình độ trễ, tỉ lệ lỗi và giới hạn tốc độ (429).
+OPERATION_NAME = 'ListingProductsBySlug'
+
+
+class MockApiConfig:
+    """Cấu hình hành vi của server"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, rate_limit=0.0,
+                 retry_after=1, seed=42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit      # request/giây, 0 = không giới hạn
+        self.retry_after = retry_after    # giây, header Retry-After của phản hồi 429
+        self.rng = random.Random(seed)
+
+
+class TokenBucket:
+    """Giới hạn tốc độ dùng chung cho mọi kết nối"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class CatalogSource:
+    """Trang dữ liệu từ catalog sinh ngẫu nhiên; /_advance_day chuyển sang ngày kế tiếp"""
+
+    def __init__(self, n_products, seed=42):
+        self.catalog = synthetic_data.generate_catalog(n_products, seed=seed)
+        self.grouped = synthetic_data.products_by_slug(self.catalog)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def page(self, slug, page, limit):
+        with self.lock:
+            return synthetic_data.listing_page(self.grouped.get(slug, []), slug, page, limit)
+
+    def advance_day(self):
+        with self.lock:
+            synthetic_data.advance_day(self.catalog, self.rng)
+
+
+class FixtureSource:
+    """Trang dữ liệu từ file response_<slug>_page_<page>.json đã ghi lại; thiếu file = trang rỗng"""
+
+    def __init__(self, fixture_dir):
+        self.fixture_dir = fixture_dir
+
+    def page(self, slug, page, limit):
+        path = os.path.join(self.fixture_dir, f"response_{slug}_page_{page}.json")
+        if not os.path.exists(path):
+            return synthetic_data.listing_page([], slug, page, limit)
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def advance_day(self):
+        pass
+
+
+class ArchiveSource:
+    """Trang dữ liệu từ response_archive của một ngày (bản lấy sau cùng của mỗi slug/trang)"""
+
+    def __init__(self, archive_dir, date_str):
+        self.pages = {
+            (record['slug'], record['page']): record['body']
+            for record in response_archive.iter_archived_pages(archive_dir, date_str, date_str)
+        }
+
+    def page(self, slug, page, limit):
+        body = self.pages.get((slug, page))
+        if body is None:
+            return synthetic_data.listing_page([], slug, page, limit)
+        return body
+
+    def advance_day(self):
+        pass
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == '/_stats':
+            with self.server.stats_lock:
+                self.send_json(200, dict(self.server.stats))
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        raw_body = self.rfile.read(length) if length else b''
+
+        if self.path == '/_advance_day':
+            self.server.source.advance_day()
+            self.send_json(200, {'ok': True})
+            return
+
+        config = self.server.config
+        self.server.count('requests')
+
+        if not self.server.bucket.try_acquire():
+            self.server.count('throttled')
+            self.send_json(429, {'errors': [{'message': 'Too Many Requests'}]},
+                           headers={'Retry-After': str(config.retry_after)})
+            return
+
+        delay_ms = config.latency_ms + (config.rng.uniform(-config.jitter_ms, config.jitter_ms)
+                                        if config.jitter_ms else 0)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+        if config.error_rate and config.rng.random() < config.error_rate:
+            self.server.count('errors')
+            self.send_json(500, {'errors': [{'message': 'Injected server error'}]})
+            return
+
+        try:
+            payload = json.loads(raw_body or b'{}')
+            variables = payload.get('variables') or {}
+            if payload.get('operationName') != OPERATION_NAME:
+                raise ValueError(f"Unsupported operation: {payload.get('operationName')}")
+            body = self.server.source.page(
+                variables.get('slug') or '',
+                int(variables.get('page') or 1),
+                int(variables.get('limit') or 102)
+            )
+        except (ValueError, TypeError) as e:
+            self.server.count('bad_requests')
+            self.send_json(400, {'errors': [{'message': str(e)}]})
+            return
+
+        self.server.count('ok')
+        self.send_json(200, body)
+
+
+class MockApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, source, config):
+        super().__init__(address, MockApiHandler)
+        self.source = source
+        self.config = config
+        self.bucket = TokenBucket(config.rate_limit)
+        self.stats = {'requests': 0, 'ok': 0, 'throttled': 0, 'errors': 0, 'bad_requests': 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/graphql"
+
+
+def start_server(source, config=None, host='127.0.0.1', port=0):
+    """Chạy server trong thread nền (port=0: tự chọn cổng). Gọi server.shutdown() để dừng"""
+    server = MockApiServer((host, port), source, config or MockApiConfig())
+    thread = threading.Thread(target=server.serve_forever, name='mock-api-server', daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    parser = argparse.ArgumentParser(description='Server giả lập API ListingProductsBySlug')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', help='Thư mục chứa response_<slug>_page_<page>.json đã ghi lại')
+    parser.add_argument('--archive', help='Thư mục response_archive để phát lại (dùng với --archive-date)')
+    parser.add_argument('--archive-date', help='Ngày YYYY-MM-DD trong archive (mặc định hôm nay)')
+    parser.add_argument('--products', type=int, default=2000, help='Số sản phẩm của catalog sinh ngẫu nhiên')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--latency-ms', type=float, default=0, help='Độ trễ trung bình mỗi request')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Dao động ± của độ trễ')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Tỉ lệ trả lỗi 500 (0-1)')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Số request/giây trước khi trả 429 (0 = tắt)')
+    parser.add_argument('--retry-after', type=int, default=1, help='Giá trị header Retry-After (giây)')
+    args = parser.parse_args()
+
+    if args.archive:
+        source = ArchiveSource(args.archive, args.archive_date or time.strftime('%Y-%m-%d'))
+    elif args.fixtures:
+        source = FixtureSource(args.fixtures)
+    else:
+        source = CatalogSource(args.products, seed=args.seed)
+    config = MockApiConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                           args.rate_limit, args.retry_after, seed=args.seed)
+    server = MockApiServer((args.host, args.port), source, config)
+    logger.info(f"Mock API đang chạy tại {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Thống kê: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
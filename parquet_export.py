@@ -0,0 +1,218 @@
+import os
+import sys
+import logging
+import argparse
+from datetime import datetime
+
+import mysql.connector
+import pyarrow as pa
+import pyarrow.dataset as ds
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Số dòng đọc từ MySQL mỗi lần để không phải giữ toàn bộ bảng trong RAM
+FETCH_CHUNK_SIZE = 50000
+UNKNOWN_CATEGORY = 'unknown'
+
+CATEGORY_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+# Mỗi bảng: câu truy vấn + schema Arrow. Cột `dt` (YYYY-MM-DD) và `category` là khóa phân vùng
+EXPORT_TABLES = {
+    'product': {
+        'query': """
+            SELECT p.product_id, p.original_id, p.name, p.price, p.original_price,
+                   p.promotion, p.stock_quantity, p.total_sold, p.date,
+                   COALESCE(p.category, %s) AS category
+            FROM product p
+        """,
+        'schema': pa.schema([
+            ('product_id', pa.string()),
+            ('original_id', pa.string()),
+            ('name', pa.string()),
+            ('price', pa.int64()),
+            ('original_price', pa.int64()),
+            ('promotion', pa.string()),
+            ('stock_quantity', pa.int64()),
+            ('total_sold', pa.int64()),
+            ('date', pa.timestamp('s')),
+            ('category', CATEGORY_TYPE),
+            ('dt', pa.string()),
+        ]),
+    },
+    'price_history': {
+        'query': """
+            SELECT ph.id, ph.product_id, ph.price, ph.original_price, ph.date,
+                   COALESCE(p.category, %s) AS category
+            FROM price_history ph
+            LEFT JOIN product p ON ph.product_id = p.product_id
+        """,
+        'schema': pa.schema([
+            ('id', pa.int64()),
+            ('product_id', pa.string()),
+            ('price', pa.int64()),
+            ('original_price', pa.int64()),
+            ('date', pa.timestamp('s')),
+            ('category', CATEGORY_TYPE),
+            ('dt', pa.string()),
+        ]),
+    },
+    'stock_history': {
+        'query': """
+            SELECT sh.id, sh.product_id, sh.stock_increased, sh.stock_decreased, sh.date,
+                   COALESCE(p.category, %s) AS category
+            FROM stock_history sh
+            LEFT JOIN product p ON sh.product_id = p.product_id
+        """,
+        'schema': pa.schema([
+            ('id', pa.int64()),
+            ('product_id', pa.string()),
+            ('stock_increased', pa.int64()),
+            ('stock_decreased', pa.int64()),
+            ('date', pa.timestamp('s')),
+            ('category', CATEGORY_TYPE),
+            ('dt', pa.string()),
+        ]),
+    },
+}
+
+
+def get_mysql_connection():
+    """Kết nối MySQL theo cùng biến môi trường với migration2_script.py"""
+    return mysql.connector.connect(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        port=int(os.getenv('MYSQL_PORT', '3306')),
+        user=os.getenv('MYSQL_USERNAME', 'root'),
+        password=os.getenv('MYSQL_PASSWORD', '123456789@'),
+        database=os.getenv('MYSQL_DATABASE', 'coffee_db'),
+        charset='utf8mb4'
+    )
+
+
+def rows_to_record_batch(rows, schema, snapshot_date):
+    """Chuyển các dòng MySQL thành RecordBatch, thêm cột phân vùng `dt`"""
+    data_columns = [field.name for field in schema if field.name != 'dt']
+    columns = list(zip(*rows)) if rows else [[] for _ in data_columns]
+    date_index = data_columns.index('date')
+
+    arrays = []
+    for name, values in zip(data_columns, columns):
+        field_type = schema.field(name).type
+        if name == 'category':
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field_type))
+
+    if snapshot_date:
+        # product là ảnh chụp hiện tại nên phân vùng theo ngày xuất
+        dt_values = [snapshot_date] * len(rows)
+    else:
+        dt_values = [value.strftime('%Y-%m-%d') if value else None for value in columns[date_index]]
+    arrays.append(pa.array(dt_values, type=pa.string()))
+
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_record_batches(conn, table_name, snapshot_date=None):
+    """Đọc bảng theo từng khối FETCH_CHUNK_SIZE dòng và trả về RecordBatch"""
+    spec = EXPORT_TABLES[table_name]
+    cursor = conn.cursor()
+    try:
+        cursor.execute(spec['query'], (UNKNOWN_CATEGORY,))
+        while True:
+            rows = cursor.fetchmany(FETCH_CHUNK_SIZE)
+            if not rows:
+                break
+            yield rows_to_record_batch(rows, spec['schema'], snapshot_date)
+    finally:
+        cursor.close()
+
+
+def export_table(conn, table_name, output_dir, snapshot_date=None):
+    """
+    Ghi một bảng ra Parquet phân vùng kiểu Hive: <output_dir>/<table>/dt=YYYY-MM-DD/category=<slug>/
+    Phân vùng đã tồn tại sẽ bị ghi đè, các phân vùng khác được giữ nguyên.
+    """
+    spec = EXPORT_TABLES[table_name]
+    row_count = 0
+
+    def counted_batches():
+        nonlocal row_count
+        for batch in iter_record_batches(conn, table_name, snapshot_date):
+            row_count += batch.num_rows
+            yield batch
+
+    partitioning = ds.partitioning(
+        pa.schema([('dt', pa.string()), ('category', CATEGORY_TYPE)]),
+        flavor='hive'
+    )
+    file_options = ds.ParquetFileFormat().make_write_options(compression='snappy', use_dictionary=True)
+
+    ds.write_dataset(
+        counted_batches(),
+        base_dir=os.path.join(output_dir, table_name),
+        schema=spec['schema'],
+        format='parquet',
+        partitioning=partitioning,
+        file_options=file_options,
+        basename_template=f"{table_name}-{{i}}.parquet",
+        existing_data_behavior='delete_matching'
+    )
+    logger.info(f"Exported {row_count} rows from {table_name} to {output_dir}")
+    return row_count
+
+
+def export_snapshot(conn, output_dir, tables=None):
+    """Xuất product, price_history, stock_history ra Parquet. Trả về số dòng theo từng bảng"""
+    snapshot_date = datetime.now().strftime('%Y-%m-%d')
+    results = {}
+    for table_name in tables or EXPORT_TABLES.keys():
+        results[table_name] = export_table(
+            conn,
+            table_name,
+            output_dir,
+            snapshot_date=snapshot_date if table_name == 'product' else None
+        )
+    return results
+
+
+def read_snapshot(output_dir, table_name, filter_expression=None):
+    """Đọc lại snapshot bằng pyarrow (category giữ kiểu dictionary)"""
+    dataset = ds.dataset(
+        os.path.join(output_dir, table_name),
+        format='parquet',
+        partitioning=ds.HivePartitioning.discover(infer_dictionary=True)
+    )
+    return dataset.to_table(filter=filter_expression)
+
+
+def main():
+    """
+    Xuất snapshot Parquet cho phân tích / BigQuery.
+    Nạp vào BigQuery: bq load --source_format=PARQUET --hive_partitioning_mode=AUTO
+      --hive_partitioning_source_uri_prefix=gs://<bucket>/<table> <dataset>.<table> "gs://<bucket>/<table>/*"
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    parser = argparse.ArgumentParser(description='Export MySQL product data to partitioned Parquet')
+    parser.add_argument('--output-dir', default=os.getenv('PARQUET_EXPORT_DIR', 'parquet_export'),
+                        help='Thư mục đích (mặc định: PARQUET_EXPORT_DIR hoặc ./parquet_export)')
+    parser.add_argument('--tables', nargs='+', choices=list(EXPORT_TABLES.keys()),
+                        help='Chỉ xuất các bảng được chọn')
+    args = parser.parse_args()
+
+    conn = get_mysql_connection()
+    try:
+        results = export_snapshot(conn, args.output_dir, args.tables)
+        logger.info(f"Parquet export completed: {results}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import glob
+import logging
+
+import numpy as np
+import joblib
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+# Model phân khúc giá được huấn luyện một lần trên toàn bộ catalog cho mỗi data_version,
+# lưu ra đĩa để khởi động lại dashboard không phải huấn luyện lại
+SEGMENT_MODEL_DIR = os.getenv('SEGMENT_MODEL_DIR', os.path.join('.cache', 'segment_models'))
+# Catalog lớn hơn ngưỡng này dùng MiniBatchKMeans
+MINIBATCH_THRESHOLD = int(os.getenv('SEGMENT_MINIBATCH_THRESHOLD', '20000'))
+N_SEGMENTS = 3
+SEGMENT_LABELS = ['Giá thấp', 'Giá trung', 'Giá cao']
+
+
+def train_segment_model(features, use_minibatch=None):
+    """
+    Huấn luyện K-Means trên ma trận (price, stock_quantity).
+    Tên phân khúc gán theo giá của tâm cụm: thấp -> trung -> cao.
+    """
+    features = np.asarray(features, dtype=float)
+    if use_minibatch is None:
+        use_minibatch = len(features) > MINIBATCH_THRESHOLD
+
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(features)
+
+    if use_minibatch:
+        kmeans = MiniBatchKMeans(n_clusters=N_SEGMENTS, random_state=42, n_init=3, batch_size=4096)
+    else:
+        kmeans = KMeans(n_clusters=N_SEGMENTS, random_state=42, n_init=10)
+    kmeans.fit(X_scaled)
+
+    centroid_prices = scaler.inverse_transform(kmeans.cluster_centers_)[:, 0]
+    labels = {int(cluster_id): SEGMENT_LABELS[rank]
+              for rank, cluster_id in enumerate(np.argsort(centroid_prices))}
+
+    logger.info(f"Đã huấn luyện {type(kmeans).__name__} trên {len(features)} sản phẩm")
+    return {'scaler': scaler, 'kmeans': kmeans, 'labels': labels}
+
+
+def assign_segments(model, features):
+    """Gán phân khúc cho một tập con sản phẩm bằng tâm cụm có sẵn (không huấn luyện lại)"""
+    features = np.asarray(features, dtype=float)
+    if len(features) == 0:
+        return []
+    clusters = model['kmeans'].predict(model['scaler'].transform(features))
+    return [model['labels'][int(cluster_id)] for cluster_id in clusters]
+
+
+def model_path(data_version, model_dir=SEGMENT_MODEL_DIR):
+    return os.path.join(model_dir, f"price_segments_v{data_version}.joblib")
+
+
+def load_or_train(data_version, fetch_features, model_dir=SEGMENT_MODEL_DIR):
+    """
+    Đọc model của data_version từ đĩa, hoặc huấn luyện từ fetch_features() rồi lưu lại.
+    Trả về None nếu catalog không đủ sản phẩm để chia cụm.
+    """
+    path = model_path(data_version, model_dir) if data_version is not None else None
+    if path and os.path.exists(path):
+        try:
+            return joblib.load(path)
+        except Exception as e:
+            logger.warning(f"Không đọc được model {path}, huấn luyện lại: {e}")
+
+    features = fetch_features()
+    if len(features) < N_SEGMENTS:
+        return None
+
+    model = train_segment_model(features)
+    if path:
+        try:
+            os.makedirs(model_dir, exist_ok=True)
+            joblib.dump(model, path)
+            # Chỉ giữ model của version hiện tại
+            for old_path in glob.glob(os.path.join(model_dir, "price_segments_v*.joblib")):
+                if old_path != path:
+                    os.remove(old_path)
+        except OSError as e:
+            logger.warning(f"Không lưu được model phân khúc giá: {e}")
+    return model
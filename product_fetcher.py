@@ -1,452 +1,129 @@
 import os
-import requests
-from pymongo import MongoClient
-from datetime import datetime
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import PyMongoError
 from dotenv import load_dotenv
-import json
+import ingest_logging
+import ingestion_core
 
 load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
-url = os.getenv("API_URL")
 
 client = MongoClient(MONGO_URI)
 db = client["db_kf"]
 collection = db["kf_new"] 
 
-headers = {
-    "Content-Type": "application/json",
-    "User-Agent": "Mozilla/5.0"
-}
-
-limit_value = 102
-slug_value = "bua-an-san-tien-loi"
-
-payload = {
- "operationName": "ListingProductsBySlug",
-    "query": """
-    query ListingProductsBySlug($slug: String, $page: Int, $limit: Int, $filters: [ListingProductBySlugInput], $order: ListingProductSortEnum, $direction: OrderDirectionEnum) {
-      listingProductsBySlug(
-        slug: $slug
-        page: $page
-        limit: $limit
-        filters: $filters
-        order: $order
-        direction: $direction
-      ) {
-        total
-        page
-        limit
-        data {
-          id
-          discountPercent
-          discountPrice
-          thumbnail
-          giftItems {
-            id
-            name
-            thumbnail
-            promotionInfo {
-              id
-              type
-              name
-              promotionSummary
-              promotionApplyLimit
-              __typename
-            }
-            __typename
-          }
-          images
-          inStock
-          isAlcohol
-          name
-          olClub {
-            discountPrice
-            discountPercent
-            __typename
-          }
-          originalPrice
-          slug
-          thumbnail
-          teasingInfo {
-            hasDelivery
-            openDate
-            deliveryDate
-            limitNote
-            receivedNoti
-            promotionId
-            variantId
-            productId
-            __typename
-          }
-          itemTrait {
-            itemType
-            itemPromotion
-            isTeasing
-            __typename
-          }
-          variants {
-            teasingInfo {
-              hasDelivery
-              openDate
-              deliveryDate
-              limitNote
-              receivedNoti
-              promotionId
-              variantId
-              productId
-              __typename
-            }
-            itemTrait {
-              itemType
-              itemPromotion
-              isTeasing
-              __typename
-            }
-            id
-            discountPercent
-            discountPrice
-            images
-            name
-            originalPrice
-            price
-            sku
-            inStock
-            thumbnail
-            stockItem {
-              quantity
-              maxSaleQuantity
-              minSaleQuantity
-              __typename
-            }
-            unit {
-              id
-              name
-              __typename
-            }
-            giftItems {
-              id
-              name
-              thumbnail
-              __typename
-            }
-            unitConversion {
-              isBaseVariant
-              baseUnitName
-              pricePerBaseUnit
-              conversion
-              formatPricePerBaseUnit
-              originalPricePerBaseUnit
-              __typename
-            }
-            isOrdered
-            isSelected
-            slug
-            isOnlineSale
-            isSale
-            preOrder {
-              counter {
-                ordered
-                remain
-                __typename
-              }
-              promotionDetail {
-                id
-                endAt
-                deliveryDate
-                termAndCondition {
-                  title
-                  content
-                  __typename
-                }
-                __typename
-              }
-              deliveryDate
-              __typename
-            }
-            groupBuy {
-              levelPrice {
-                level
-                price
-                costSavings
-                isSelected
-                discountTicker {
-                  tickerId
-                  position
-                  isOverride
-                  isImage
-                  type
-                  code
-                  name
-                  textColor
-                  backgroundColor
-                  strokeColor
-                  imageUrl
-                  deliveryDisplayText
-                  __typename
-                }
-                __typename
-              }
-              incentivePercent
-              groupCount
-              promotionDetail {
-                id
-                endAt
-                deliveryDate
-                __typename
-              }
-              __typename
-            }
-            deliveryDate
-            promotionInfoItems {
-              id
-              type
-              name
-              promotionSummary
-              promotionApplyLimit
-              __typename
-            }
-            promotionSummary
-            promotionApplyLimit
-            warnMsg {
-              type
-              message
-              __typename
-            }
-            orderedCounter
-            metadata
-            hasOneInManyLimitation
-            limitQuantity
-            highlightedData {
-              highlightedInfos {
-                code
-                text
-                textColor
-                backgroundColor
-                fillColor
-                fillRatio
-                headingIcon
-                boughtCustomerNames
-                hoverable
-                underlying
-                gifts {
-                  imageUrl
-                  name
-                  quantity
-                  sku
-                  isDisabled
-                  badgeItem {
-                    badgeId
-                    position
-                    isOverride
-                    isImage
-                    type
-                    code
-                    name
-                    textColor
-                    backgroundColor
-                    strokeColor
-                    imageUrl
-                    deliveryDisplayText
-                    __typename
-                  }
-                  __typename
-                }
-                __typename
-              }
-              __typename
-            }
-            __typename
-          }
-          isActive
-          subCate
-          tickerItems {
-            tickerId
-            isImage
-            type
-            code
-            name
-            textColor
-            backgroundColor
-            strokeColor
-            imageUrl
-            __typename
-          }
-          badgeItems {
-            badgeId
-            isImage
-            type
-            code
-            name
-            textColor
-            backgroundColor
-            strokeColor
-            imageUrl
-            __typename
-          }
-          __typename
+logger = ingest_logging.get_logger('product_fetcher')
+
+def build_variant_update(delta, fields, today_date, total_sold, stock_quantity, price, original_price):
+    """
+    UpdateOne cho một biến thể: $set các trường hiện tại, cập nhật phần tử của ngày hôm nay
+    bằng arrayFilters hoặc $push phần tử mới, không cần đọc lại document.
+    """
+    if not delta.exists:
+        fields = dict(fields,
+                      sales_history=[{"date": today_date, "total_sold": total_sold, "sold_in_date": 0}],
+                      stock_history=[{"date": today_date, "stock_quantity": stock_quantity,
+                                      "stock_increased": 0, "stock_decreased": 0}],
+                      price_history=[{"date": today_date, "price": price, "original_price": original_price}])
+        return UpdateOne({"id": fields["id"]}, {"$set": fields}, upsert=True)
+
+    set_fields = dict(fields)
+    inc_fields = {}
+    push_fields = {}
+    array_filters = []
+
+    if delta.sales_same_day:
+        set_fields["sales_history.$[sale].total_sold"] = total_sold
+        inc_fields["sales_history.$[sale].sold_in_date"] = delta.sold_in_date
+        array_filters.append({"sale.date": today_date})
+    else:
+        push_fields["sales_history"] = {"date": today_date, "total_sold": total_sold,
+                                        "sold_in_date": delta.sold_in_date}
+
+    if delta.stock_same_day:
+        set_fields["stock_history.$[stock].stock_quantity"] = stock_quantity
+        inc_fields["stock_history.$[stock].stock_increased"] = max(0, delta.stock_change)
+        inc_fields["stock_history.$[stock].stock_decreased"] = abs(min(0, delta.stock_change))
+        array_filters.append({"stock.date": today_date})
+    else:
+        push_fields["stock_history"] = {"date": today_date, "stock_quantity": stock_quantity,
+                                        "stock_increased": 0, "stock_decreased": 0}
+
+    if delta.price_same_day:
+        set_fields["price_history.$[price].price"] = price
+        set_fields["price_history.$[price].original_price"] = original_price
+        array_filters.append({"price.date": today_date})
+    else:
+        push_fields["price_history"] = {"date": today_date, "price": price, "original_price": original_price}
+
+    update = {"$set": set_fields}
+    if inc_fields:
+        update["$inc"] = inc_fields
+    if push_fields:
+        update["$push"] = push_fields
+    return UpdateOne({"id": fields["id"]}, update, upsert=True, array_filters=array_filters or None)
+
+
+def save_products_page(records, today_date, last_state, page=None):
+    """
+    Ghi một trang VariantRecord (ingestion_core.parse_products) vào Mongo cho ngày today_date
+    ('YYYY-MM-DD'). Dùng chung cho crawl và replay_backfill. Trả về số biến thể đã ghi.
+    last_state (variant_last_state.LastStateMap, dùng chung cả lần chạy) giữ trạng thái cuối để
+    tính delta trong bộ nhớ; cả trang được ghi bằng một bulk_write.
+    """
+    # Biến thể chưa có trong map (vừa đổi danh mục hoặc thật sự mới) được đọc lại một lần cho cả trang;
+    # không có trong collection mới là biến thể mới
+    missing_ids = {record.product_id for record in records if record.product_id not in last_state}
+    if missing_ids:
+        last_state.reload(collection, missing_ids)
+    operations = []
+    product_ids = []
+
+    for record in records:
+        product_id = record.product_id
+        delta = last_state.observe(product_id, today_date, record.total_sold, record.stock_quantity, record.price)
+        fields = {
+            "id": product_id,
+            "name": record.name,
+            "stock_quantity": record.stock_quantity,
+            "total_sold": record.total_sold,
+            "price": record.price,
+            "original_price": record.original_price,
+            "promotion": record.promotion,
+            "description": record.description,
+            "date": today_date,
+            "category": record.category
         }
-        cateId
-        subCateId
-        specCateId
-        brandId
-        __typename
-      }
-    }
-    """,
-    "variables": {
-        "limit": limit_value,
-        "page": None, 
-        "slug": slug_value,
-        "filters": []
-    }
-}
+        operations.append(build_variant_update(
+            delta, fields, today_date, record.total_sold, record.stock_quantity, record.price,
+            record.original_price
+        ))
+        product_ids.append(product_id)
+
+        logger.debug("Page %s - Product %s: new=%s sold_in_date=%s stock_change=%s price=%s "
+                     "original_price=%s", page, product_id, not delta.exists, delta.sold_in_date,
+                     delta.stock_change, record.price, record.original_price)
+
+    if operations:
+        try:
+            # ordered=True: một biến thể xuất hiện hai lần trong trang vẫn được ghi đúng thứ tự
+            collection.bulk_write(operations, ordered=True)
+        except PyMongoError as e:
+            logger.error(f"Bulk write trang {page} thất bại: {e}")
+            # Đồng bộ lại trạng thái trong bộ nhớ với những gì thực sự đã ghi
+            last_state.reload(collection, product_ids)
+            return 0
+    return len(operations)
 
 def fetch_and_save_products(start_page, end_page, limit_value, slug_value):
-    total_products = 0
-    for page in range(start_page, end_page + 1):
-        payload["variables"]["page"] = page
-        payload["variables"]["limit"] = limit_value
-        payload["variables"]["slug"] = slug_value
-        
-        print(f"Fetching data from page {page}...")
-        response = requests.post(url, headers=headers, json=payload)
-
-        if response.status_code == 200:
-            with open(f"response_page_{page}.json", "w", encoding="utf-8") as f:
-              f.write(response.text)
-            data = response.json()
-            products = data["data"]["listingProductsBySlug"]["data"]
-            if not products:
-                print(f"Trang {page} không có dữ liệu, dừng lại.")
-                break
-
-            today_date = datetime.now().strftime("%Y-%m-%d")
-            
-            for product in products:
-                total_products += 1
-                if product:
-                    description = product.get("descriptionJson", {}).get("introduction", "")
-                else:
-                    description = ""
-
-                giftItems = product.get("giftItems") or []
-                promotion = "Không có khuyến mãi" 
-
-                if giftItems:  
-                    for gift_item in giftItems:
-                        promotion_info = gift_item.get("promotionInfo")
-                        
-                        if promotion_info: 
-                            promotion = promotion_info.get("promotionSummary", "Không có khuyến mãi")
-                        else:
-                            promotion = "Không có khuyến mãi"
-                        
-                        print(promotion)
-                        
-                product_variants = product.get("variants", [])
-                
-
-                for variant in product_variants:
-                    product_id = variant["id"]
-                    total_sold = variant.get("orderedCounter", 0)
-                    stock_quantity = variant["stockItem"]["quantity"]
-                    # print(stock_quantity)
-                    original_price = variant["originalPrice"]
-                    price = variant["discountPrice"]
-
-                    existing_product = collection.find_one({"id": product_id})
-                    sales_history = []
-                    stock_history = []
-                    price_history = []
-                    product_data = {}
-
-                    if existing_product:
-                        product_data = existing_product
-                        sales_history = existing_product.get("sales_history", [])
-                        stock_history = existing_product.get("stock_history", [])
-                        price_history = existing_product.get("price_history", [])
-                        
-                  
-                        if sales_history and sales_history[-1]["date"] == today_date:
-                            previous_total_sold = sales_history[-1]["total_sold"]
-                           
-                            new_sold_today = max(0, total_sold - previous_total_sold)
-                            sales_history[-1]["sold_in_date"] += new_sold_today
-                            sales_history[-1]["total_sold"] = total_sold
-                        else:
-                            new_sold_today = max(0, total_sold - (sales_history[-1]["total_sold"] if sales_history else 0))
-                            sales_history.append({
-                                "date": today_date,
-                                "total_sold": total_sold,
-                                "sold_in_date": new_sold_today,
-                            })
-                        
-                        if stock_history and stock_history[-1]["date"] == today_date:
-                            previous_stock = stock_history[-1]["stock_quantity"]
-                            print("previous_stock", previous_stock)
-                            change = stock_quantity - previous_stock
-                            stock_history[-1]["stock_quantity"] = stock_quantity
-                            stock_history[-1]["stock_increased"] += max(0, change)
-                            stock_history[-1]["stock_decreased"] += abs(min(0, change))
-                        else:
-                            stock_history.append({
-                                "date": today_date,
-                                "stock_quantity": stock_quantity,
-                                "stock_increased": 0,
-                                "stock_decreased": 0,
-                            })
-                        
-        
-                        if price_history and price_history[-1]["date"] == today_date:
-                            price_history[-1]["price"] = price
-                            price_history[-1]["original_price"] = original_price
-                        else:
-                            price_history.append({
-                                "date": today_date,
-                                "price": price,
-                                "original_price": original_price,
-                            })
-                    else:
-                        sales_history.append({"date": today_date, "total_sold": total_sold, "sold_in_date": 0})
-                        stock_history.append({
-                            "date": today_date,
-                            "stock_quantity": stock_quantity,
-                            "stock_increased": 0,
-                            "stock_decreased": 0,
-                        })
-                        price_history.append({
-                            "date": today_date,
-                            "price": price,
-                            "original_price": original_price,
-                        })
-                    
-                    product_data.update({
-                        "id": product_id,
-                        "name": variant["name"],
-                        "stock_quantity": stock_quantity,
-                        "total_sold": total_sold,
-                        "price": price,
-                        "original_price": original_price,
-                        "promotion": promotion,
-                        "description": description,
-                        "date": today_date,
-                        "sales_history": sales_history,
-                        "stock_history": stock_history,
-                        "price_history": price_history,
-                        "category": slug_value 
-                    })
-
-                    collection.update_one({"id": product_id}, {"$set": product_data}, upsert=True)
-
-                    print(f"Page {page} - Product {product_id} updated: "
-                    f"Sold today {sales_history[-1]['sold_in_date']}, "
-                    f"Stock Increase: {stock_history[-1]['stock_increased']}, "
-                    f"Stock Decrease: {stock_history[-1]['stock_decreased']}, "
-                    f"Price: {price}, Original price: {original_price}")
-
-        else:
-            print(f"Request for page {page} failed with status code {response.status_code}: {response.text}")
-    print(f"\nTotal number of products retrieved: {total_products}")
+    """
+    Crawl một danh mục vào Mongo qua ingestion_core (kèm archive phản hồi thô). Giữ để tương thích:
+    crawl nhiều danh mục thì gọi ingestion_core.crawl_categories một lần với mọi slug.
+    INGEST_SINKS=mongo,mysql,... để cùng một lần crawl ghi vào các store khác.
+    """
+    return ingestion_core.crawl_category(
+        slug_value, ingestion_core.configured_sinks(['mongo', 'archive']),
+        start_page=start_page, end_page=end_page, limit=limit_value
+    )
 
 # fetch_and_save_products(start_page=1, end_page=2, limit_value=102, slug_value="bua-an-san-tien-loi")
-
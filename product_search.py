@@ -0,0 +1,140 @@
+import os
+import logging
+import unicodedata
+from collections import defaultdict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 3
+# Quá số product_id này thì không đưa danh sách vào IN (...) mà lọc bằng subquery LIKE trên
+# product.name_search (tên đã normalize_text, do ingestion/migration ghi) để kết quả giống hệt index
+MAX_ID_FILTER = int(os.getenv('SEARCH_MAX_ID_FILTER', '500'))
+LIKE_ESCAPE = '!'
+
+# Từ khóa đã giải một lần mỗi lần rerun: product_ids là tuple đã sắp xếp,
+# hoặc None khi phải lọc bằng LIKE (từ khóa quá ngắn hoặc khớp quá nhiều sản phẩm)
+KeywordFilter = namedtuple('KeywordFilter', ['keyword', 'product_ids'])
+
+
+def normalize_text(text):
+    """
+    Chuẩn hóa để so khớp không dấu: 'Cà Phê Đen' -> 'ca phe den'.
+    Tách dấu (NFD), bỏ ký tự dấu, đổi đ -> d, gộp khoảng trắng.
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFD', str(text).lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.replace('đ', 'd')
+    return " ".join(text.split())
+
+
+def ngrams(text, size=NGRAM_SIZE):
+    """Tập trigram của chuỗi đã chuẩn hóa"""
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class ProductSearchIndex:
+    """
+    Inverted index trigram trên tên sản phẩm (đã bỏ dấu).
+    Tìm kiếm = giao các posting list của trigram trong từ khóa, sau đó kiểm tra lại
+    bằng so khớp chuỗi con để cho kết quả giống LIKE '%keyword%' nhưng không phân biệt dấu.
+    """
+
+    def __init__(self, products=()):
+        self.names = {}
+        self.postings = defaultdict(set)
+        for product_id, name in products:
+            self.add(product_id, name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, product_id, name):
+        normalized = normalize_text(name)
+        self.names[product_id] = normalized
+        for gram in ngrams(normalized):
+            self.postings[gram].add(product_id)
+
+    def search(self, keyword):
+        """Trả về frozenset product_id có tên chứa từ khóa"""
+        query = normalize_text(keyword)
+        if not query:
+            return frozenset(self.names)
+
+        grams = ngrams(query)
+        if grams:
+            # Bắt đầu từ posting list ngắn nhất để giao nhanh
+            candidate_sets = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+            candidates = set(candidate_sets[0])
+            for postings in candidate_sets[1:]:
+                candidates &= postings
+                if not candidates:
+                    break
+        else:
+            # Từ khóa ngắn hơn một trigram: quét tên đã chuẩn hóa (vẫn chỉ trong bộ nhớ)
+            candidates = self.names.keys()
+
+        return frozenset(pid for pid in candidates if query in self.names[pid])
+
+
+def search_name(name):
+    """Giá trị cột product.name_search của một tên sản phẩm"""
+    return normalize_text(name)
+
+
+def backfill_search_names(cursor):
+    """Điền name_search cho các dòng chưa có (bảng tạo trước khi có cột). Trả về số dòng"""
+    cursor.execute("SELECT product_id, name FROM product WHERE name_search IS NULL")
+    rows = [(search_name(name), product_id) for product_id, name in cursor.fetchall()]
+    if rows:
+        cursor.executemany("UPDATE product SET name_search = %s WHERE product_id = %s", rows)
+        logger.info(f"Đã điền name_search cho {len(rows)} sản phẩm")
+    return len(rows)
+
+
+def like_pattern(keyword):
+    """Mẫu LIKE '%từ khóa%' trên name_search, escape % và _ để so khớp chuỗi con như index"""
+    query = normalize_text(keyword)
+    for ch in (LIKE_ESCAPE, '%', '_'):
+        query = query.replace(ch, LIKE_ESCAPE + ch)
+    return f"%{query}%"
+
+
+def load_search_index(cursor):
+    """Đọc toàn bộ tên sản phẩm và dựng index"""
+    cursor.execute("SELECT product_id, name FROM product")
+    index = ProductSearchIndex(cursor.fetchall())
+    logger.info(f"Đã dựng search index cho {len(index)} sản phẩm")
+    return index
+
+
+def resolve_keyword(keyword, load_index):
+    """
+    Giải từ khóa thành KeywordFilter. Từ khóa ngắn hơn một trigram khớp gần như toàn bộ
+    catalog nên không cần nạp index (load_index); kết quả quá MAX_ID_FILTER sản phẩm
+    cũng chuyển sang LIKE.
+    """
+    if len(normalize_text(keyword)) < NGRAM_SIZE:
+        return KeywordFilter(keyword, None)
+    product_ids = load_index().search(keyword)
+    if len(product_ids) > MAX_ID_FILTER:
+        return KeywordFilter(keyword, None)
+    return KeywordFilter(keyword, tuple(sorted(product_ids)))
+
+
+def product_id_filter_sql(column, keyword_filter):
+    """
+    Điều kiện SQL thay cho `name LIKE %keyword%`: `column IN (...)` với danh sách đã giải,
+    1=0 khi không có sản phẩm nào khớp, hoặc subquery LIKE trên name_search khi danh sách
+    quá lớn (cùng chuẩn hóa không dấu/chữ thường nên cho cùng tập kết quả). Trả về (sql, params).
+    """
+    product_ids = keyword_filter.product_ids
+    if product_ids is None:
+        return (f"{column} IN (SELECT product_id FROM product "
+                f"WHERE name_search LIKE %s ESCAPE '{LIKE_ESCAPE}')",
+                [like_pattern(keyword_filter.keyword)])
+    if not product_ids:
+        return "1=0", []
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    return f"{column} IN ({placeholders})", list(product_ids)
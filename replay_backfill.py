@@ -0,0 +1,212 @@
+import os
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import ingest_logging
+import ingestion_core
+import response_archive
+
+logger = ingest_logging.get_logger('replay')
+
+# Dựng lại dữ liệu lịch sử từ response_archive thay vì gọi lại API:
+#   python replay_backfill.py --start 2025-06-01 --end 2025-06-30 --sink mysql
+# Mỗi slug chạy trong một worker và xử lý các ngày theo thứ tự tăng dần (sold/stock của một ngày
+# tính theo ngày trước đó). Trong một ngày chỉ dùng bản lấy sau cùng của mỗi trang.
+# Nên replay vào database/collection chưa có dữ liệu mới hơn khoảng ngày được replay.
+REPLAY_WORKERS = int(os.getenv('REPLAY_WORKERS', '4'))
+SINKS = ['mysql', 'mongo']
+
+
+def latest_pages(records, start_page=1, end_page=None):
+    """{page: body} giữ bản lấy sau cùng (records đã sắp theo fetched_at)"""
+    pages = {}
+    for record in records:
+        page = record['page']
+        if page < start_page or (end_page is not None and page > end_page):
+            continue
+        pages[page] = record['body']
+    return dict(sorted(pages.items()))
+
+
+class MySQLReplaySink:
+    """Ghi qua test.save_products_page, mỗi worker một kết nối (kèm cache write elision của slug)"""
+    name = 'mysql'
+
+    def __init__(self, connection_factory=None):
+        import test as mysql_fetcher
+        self.fetcher = mysql_fetcher
+        self.connection_factory = connection_factory or mysql_fetcher.create_connection
+
+    def prepare(self):
+        connection = self._connect()
+        try:
+            self.fetcher.create_tables(connection)
+        finally:
+            connection.close()
+
+    def _connect(self):
+        connection = self.connection_factory()
+        if not connection:
+            raise RuntimeError("Không thể kết nối đến MySQL")
+        return connection
+
+    def open_worker(self, slug):
+        from write_elision import WRITE_ELISION, VariantStateCache
+
+        connection = self._connect()
+        state_cache = None
+        if WRITE_ELISION:
+            cursor = connection.cursor()
+            state_cache = VariantStateCache().warm(cursor, slug)
+            cursor.close()
+        return connection, state_cache
+
+    def close_worker(self, state):
+        connection, _ = state
+        connection.close()
+
+    def write_page(self, state, records, date_str, page):
+        connection, state_cache = state
+        written = self.fetcher.save_products_page(
+            connection, records, datetime.strptime(date_str, '%Y-%m-%d'), state_cache
+        )
+        self.fetcher.commit_page(connection, records, state_cache)
+        return written
+
+    def finish(self):
+        from data_version import bump_data_version
+        from inventory_snapshot import refresh_inventory_snapshot
+
+        connection = self._connect()
+        try:
+            cursor = connection.cursor()
+            refresh_inventory_snapshot(cursor)
+            bump_data_version(cursor, 'replay')
+            cursor.close()
+            connection.commit()
+        finally:
+            connection.close()
+
+
+class MongoReplaySink:
+    """
+    Ghi qua product_fetcher.save_products_page (MongoClient dùng chung giữa các thread).
+    Các worker dùng chung một LastStateMap, mỗi worker nạp phần của slug mình khi bắt đầu.
+    """
+    name = 'mongo'
+
+    def __init__(self):
+        import product_fetcher
+        self.fetcher = product_fetcher
+        self.last_state = None
+
+    def prepare(self):
+        from variant_last_state import LastStateMap
+        self.fetcher.collection.create_index("category")
+        self.last_state = LastStateMap()
+
+    def open_worker(self, slug):
+        self.last_state.warm(self.fetcher.collection, slug)
+        return None
+
+    def close_worker(self, state):
+        pass
+
+    def write_page(self, state, records, date_str, page):
+        return self.fetcher.save_products_page(records, date_str, self.last_state, page)
+
+    def finish(self):
+        pass
+
+
+def make_sink(name):
+    if name == 'mysql':
+        return MySQLReplaySink()
+    if name == 'mongo':
+        return MongoReplaySink()
+    raise ValueError(f"Sink không hợp lệ: {name} (chọn một trong {SINKS})")
+
+
+def replay_slug(sink, archive_dir, slug, dates, start_page=1, end_page=None):
+    """Replay các ngày của một slug theo thứ tự; trả về (số trang, số biến thể)"""
+    state = sink.open_worker(slug)
+    pages_written = 0
+    variants_written = 0
+    try:
+        for date_str in dates:
+            day_pages = day_variants = 0
+            records = response_archive.iter_archived_pages(archive_dir, date_str, date_str, slug)
+            for page, body in latest_pages(records, start_page, end_page).items():
+                products = ingestion_core.page_products(body)
+                if not products:
+                    continue
+                records = ingestion_core.parse_products(products, slug, date_str)
+                day_variants += sink.write_page(state, records, date_str, page)
+                day_pages += 1
+            pages_written += day_pages
+            variants_written += day_variants
+            logger.info(f"replay slug={slug} date={date_str} pages={day_pages} variants={day_variants}")
+    finally:
+        sink.close_worker(state)
+    return pages_written, variants_written
+
+
+def replay_archive(start_date, end_date, sink='mysql', slug=None, start_page=1, end_page=None,
+                   archive_dir=response_archive.RESPONSE_ARCHIVE_DIR, workers=REPLAY_WORKERS):
+    """
+    Replay các trang đã lưu từ start_date đến end_date ('YYYY-MM-DD', bao gồm hai đầu)
+    vào sink ('mysql', 'mongo' hoặc một đối tượng sink). Trả về thống kê theo slug.
+    """
+    if isinstance(sink, str):
+        sink = make_sink(sink)
+    dates = response_archive.list_archived_dates(archive_dir, start_date, end_date)
+    slugs = [slug] if slug else response_archive.list_archived_slugs(archive_dir, start_date, end_date)
+    if not dates or not slugs:
+        logger.warning(f"Không có dữ liệu archive trong {archive_dir} từ {start_date} đến {end_date}")
+        return {}
+
+    started = time.perf_counter()
+    sink.prepare()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(slugs))),
+                            thread_name_prefix='replay') as executor:
+        futures = {
+            name: executor.submit(replay_slug, sink, archive_dir, name, dates, start_page, end_page)
+            for name in slugs
+        }
+    stats = {}
+    for name, future in futures.items():
+        try:
+            stats[name] = future.result()
+        except Exception as e:
+            logger.error(f"Replay slug {name} thất bại: {e}")
+
+    if stats:
+        sink.finish()
+    total_pages = sum(pages for pages, _ in stats.values())
+    total_variants = sum(variants for _, variants in stats.values())
+    logger.info(f"replay sink={sink.name} days={len(dates)} slugs={len(stats)}/{len(slugs)} "
+                f"pages={total_pages} variants={total_variants} "
+                f"seconds={time.perf_counter() - started:.2f}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay response_archive vào MySQL/Mongo')
+    parser.add_argument('--start', required=True, help='Ngày bắt đầu YYYY-MM-DD')
+    parser.add_argument('--end', required=True, help='Ngày kết thúc YYYY-MM-DD')
+    parser.add_argument('--sink', choices=SINKS, default='mysql')
+    parser.add_argument('--slug', help='Chỉ replay một danh mục')
+    parser.add_argument('--start-page', type=int, default=1)
+    parser.add_argument('--end-page', type=int)
+    parser.add_argument('--archive-dir', default=response_archive.RESPONSE_ARCHIVE_DIR)
+    parser.add_argument('--workers', type=int, default=REPLAY_WORKERS)
+    args = parser.parse_args()
+
+    replay_archive(args.start, args.end, sink=args.sink, slug=args.slug, start_page=args.start_page,
+                   end_page=args.end_page, archive_dir=args.archive_dir, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import os
+import gzip
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Lưu trữ phản hồi thô của API ListingProductsBySlug để replay/backfill:
+#   <RESPONSE_ARCHIVE_DIR>/dt=YYYY-MM-DD/<slug>.ndjson.gz
+# Mỗi dòng là một trang {slug, page, fetched_at, body}. File chỉ được nối thêm (mỗi lần ghi là
+# một gzip member mới, gzip/zcat đọc liền mạch) nên lịch sử các lần chạy không bị ghi đè.
+# Việc nén và ghi đĩa chạy trong thread nền; vòng lặp crawl chỉ đẩy vào hàng đợi.
+RESPONSE_ARCHIVE_DIR = os.getenv('RESPONSE_ARCHIVE_DIR', 'response_archive')
+FLUSH_INTERVAL = float(os.getenv('RESPONSE_ARCHIVE_FLUSH_SECONDS', '2'))
+MAX_BATCH = 100
+
+_STOP = object()
+
+
+def partition_path(base_dir, date_str, slug):
+    return os.path.join(base_dir, f"dt={date_str}", f"{slug or '_'}.ndjson.gz")
+
+
+class ResponseArchive:
+    """Ghi bất đồng bộ các trang phản hồi vào NDJSON nén theo ngày/slug"""
+
+    def __init__(self, base_dir=RESPONSE_ARCHIVE_DIR, flush_interval=FLUSH_INTERVAL):
+        # Đường dẫn tuyệt đối: thread nền có thể ghi sau khi tiến trình đã đổi thư mục làm việc
+        self.base_dir = os.path.abspath(base_dir)
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.written = 0
+
+    def append(self, slug, page, body, fetched_at=None):
+        """Đưa một trang vào hàng đợi ghi (body là JSON đã parse của phản hồi)"""
+        fetched_at = fetched_at or datetime.now()
+        self._ensure_started()
+        self.queue.put((slug, page, fetched_at, body))
+
+    def _ensure_started(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='response-archive', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                items = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # Gom thêm những gì đang chờ để mỗi file chỉ mở một lần cho cả lô
+            while len(items) < MAX_BATCH:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in items:
+                stopping = True
+                items = [item for item in items if item is not _STOP]
+            self._write_batch(items)
+
+    def _write_batch(self, items):
+        batches = {}
+        for slug, page, fetched_at, body in items:
+            path = partition_path(self.base_dir, fetched_at.strftime('%Y-%m-%d'), slug)
+            record = {
+                'slug': slug,
+                'page': page,
+                'fetched_at': fetched_at.isoformat(timespec='seconds'),
+                'body': body,
+            }
+            batches.setdefault(path, []).append(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+
+        for path, lines in batches.items():
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with gzip.open(path, 'at', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+                self.written += len(lines)
+            except OSError as e:
+                logger.error(f"Không ghi được archive {path}: {e}")
+
+    def close(self):
+        """Ghi nốt hàng đợi rồi dừng thread nền"""
+        if self.thread is None:
+            return
+        self.queue.put(_STOP)
+        self.thread.join()
+        self.thread = None
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """Archive dùng chung của tiến trình (đóng tự động khi thoát)"""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = ResponseArchive()
+            atexit.register(_archive.close)
+        return _archive
+
+
+def archive_response(slug, page, body, fetched_at=None):
+    get_archive().append(slug, page, body, fetched_at)
+
+
+def _archived_partitions(base_dir, start_date=None, end_date=None):
+    if not os.path.isdir(base_dir):
+        return []
+    partitions = []
+    for partition in sorted(os.listdir(base_dir)):
+        if not partition.startswith('dt='):
+            continue
+        date_str = partition[3:]
+        if (start_date and date_str < start_date) or (end_date and date_str > end_date):
+            continue
+        partitions.append((date_str, os.path.join(base_dir, partition)))
+    return partitions
+
+
+def list_archived_slugs(base_dir=RESPONSE_ARCHIVE_DIR, start_date=None, end_date=None):
+    """Các slug có dữ liệu trong khoảng ngày"""
+    slugs = set()
+    for _, partition_dir in _archived_partitions(base_dir, start_date, end_date):
+        slugs.update(name[:-len('.ndjson.gz')] for name in os.listdir(partition_dir)
+                     if name.endswith('.ndjson.gz'))
+    return sorted(slugs)
+
+
+def list_archived_dates(base_dir=RESPONSE_ARCHIVE_DIR, start_date=None, end_date=None):
+    return [date_str for date_str, _ in _archived_partitions(base_dir, start_date, end_date)]
+
+
+def iter_archived_pages(base_dir=RESPONSE_ARCHIVE_DIR, start_date=None, end_date=None, slug=None):
+    """
+    Duyệt các trang đã lưu theo thứ tự ngày, slug, thời điểm lấy.
+    start_date/end_date là chuỗi 'YYYY-MM-DD' (bao gồm hai đầu).
+    """
+    for _, partition_dir in _archived_partitions(base_dir, start_date, end_date):
+        for file_name in sorted(os.listdir(partition_dir)):
+            if not file_name.endswith('.ndjson.gz'):
+                continue
+            if slug is not None and file_name != f"{slug}.ndjson.gz":
+                continue
+            path = os.path.join(partition_dir, file_name)
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            records.sort(key=lambda record: (record['fetched_at'], record['page']))
+            yield from records
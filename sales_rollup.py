@@ -0,0 +1,133 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Doanh số theo ngày × sản phẩm (kèm danh mục hiện tại của sản phẩm). Chỉ lưu các ngày có bán
+# (units_sold > 0) để dashboard tổng hợp trên vài nghìn dòng thay vì toàn bộ stock_history.
+# Khóa không gồm category: sản phẩm đổi danh mục thì dòng của ngày đó được cập nhật, không bị nhân đôi.
+DAILY_SALES_ROLLUP_SQL = """
+CREATE TABLE IF NOT EXISTS `daily_sales_rollup` (
+    `date` DATE NOT NULL,
+    `category` VARCHAR(255) NOT NULL DEFAULT '',
+    `product_id` VARCHAR(255) NOT NULL,
+    `units_sold` BIGINT UNSIGNED DEFAULT 0,
+    `revenue` BIGINT UNSIGNED DEFAULT 0,
+    `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (`date`, `product_id`),
+    INDEX `idx_category_date` (`category`, `date`, `units_sold`, `revenue`),
+    INDEX `idx_product_date` (`product_id`, `date`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+def ensure_rollup_table(cursor):
+    """Tạo bảng daily_sales_rollup nếu chưa có; bảng cũ có category trong khóa chính được chuyển khóa"""
+    cursor.execute(DAILY_SALES_ROLLUP_SQL)
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.KEY_COLUMN_USAGE
+        WHERE table_schema = DATABASE() AND table_name = 'daily_sales_rollup'
+        AND constraint_name = 'PRIMARY' AND column_name = 'category'
+    """)
+    if cursor.fetchone()[0]:
+        # Giữ dòng cập nhật sau cùng của mỗi (ngày, sản phẩm) rồi đổi khóa chính
+        cursor.execute("""
+            DELETE older FROM daily_sales_rollup older
+            JOIN daily_sales_rollup newer
+              ON older.date = newer.date AND older.product_id = newer.product_id
+             AND (older.updated_at < newer.updated_at
+                  OR (older.updated_at = newer.updated_at AND older.category < newer.category))
+        """)
+        cursor.execute("ALTER TABLE daily_sales_rollup DROP PRIMARY KEY, ADD PRIMARY KEY (`date`, `product_id`)")
+        logger.info("Đã đổi khóa chính daily_sales_rollup thành (date, product_id)")
+
+
+# Giá có hiệu lực tại thời điểm bán: bản ghi price_history gần nhất không sau sh.date,
+# nếu sản phẩm chưa có lịch sử giá thì dùng giá hiện tại. Dùng index idx_product_date_price.
+AS_OF_PRICE_SQL = """
+COALESCE((
+    SELECT ph.price FROM price_history ph
+    WHERE ph.product_id = sh.product_id AND ph.date <= sh.date
+    ORDER BY ph.date DESC, ph.id DESC
+    LIMIT 1
+), p.price)
+"""
+
+
+def refresh_rollup_for_products(cursor, product_ids):
+    """
+    Tính lại rollup của các sản phẩm từ stock_history (schema của migration, có stock_decreased).
+    Doanh thu = số lượng giảm × giá có hiệu lực tại ngày đó (as-of join với price_history).
+    Idempotent: chạy lại cho cùng sản phẩm sẽ ghi đè số liệu cũ.
+    """
+    if not product_ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(f"""
+        INSERT INTO daily_sales_rollup (date, category, product_id, units_sold, revenue)
+        SELECT DATE(sh.date), COALESCE(p.category, ''), sh.product_id,
+               SUM(sh.stock_decreased), SUM(sh.stock_decreased * {AS_OF_PRICE_SQL})
+        FROM stock_history sh
+        JOIN product p ON sh.product_id = p.product_id
+        WHERE sh.stock_decreased > 0
+        AND sh.product_id IN ({placeholders})
+        GROUP BY DATE(sh.date), p.category, sh.product_id
+        ON DUPLICATE KEY UPDATE
+            category = VALUES(category),
+            units_sold = VALUES(units_sold),
+            revenue = VALUES(revenue)
+    """, list(product_ids))
+    return cursor.rowcount
+
+
+def record_daily_sales(cursor, date_str, sales):
+    """
+    Dùng cho ingestion (test.py) nơi stock_history chỉ lưu stock_quantity theo ngày:
+    số bán trong ngày = lượng tồn giảm so với ngày gần nhất trước đó.
+    sales: các (product_id, category, tồn hiện tại, giá) của một trang; price là giá ghi nhận cho
+    chính ngày date_str nên doanh thu đã đúng theo giá lịch sử. Tồn ngày trước của cả trang đọc bằng
+    một truy vấn, rollup ghi bằng một INSERT nhiều dòng và một DELETE. Trả về tổng units_sold.
+    """
+    # Biến thể xuất hiện nhiều lần trong trang: lần sau cùng thắng (giống ghi từng dòng)
+    latest = {product_id: (category, stock, price) for product_id, category, stock, price in sales}
+    if not latest:
+        return 0
+    product_ids = list(latest)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(f"""
+        SELECT sh.product_id, sh.stock_quantity
+        FROM stock_history sh
+        JOIN (
+            SELECT product_id, MAX(date) AS previous_date
+            FROM stock_history
+            WHERE product_id IN ({placeholders}) AND date < %s
+            GROUP BY product_id
+        ) previous ON sh.product_id = previous.product_id AND sh.date = previous.previous_date
+    """, product_ids + [date_str])
+    previous_stock = dict(cursor.fetchall())
+
+    sold_rows = []
+    unsold_ids = []
+    for product_id, (category, stock, price) in latest.items():
+        previous = previous_stock.get(product_id)
+        units_sold = max(0, previous - stock) if previous is not None else 0
+        if units_sold > 0:
+            sold_rows.append((date_str, category or '', product_id, units_sold, units_sold * price))
+        else:
+            unsold_ids.append(product_id)
+
+    if sold_rows:
+        cursor.executemany("""
+            INSERT INTO daily_sales_rollup (date, category, product_id, units_sold, revenue)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                category = VALUES(category),
+                units_sold = VALUES(units_sold),
+                revenue = VALUES(revenue)
+        """, sold_rows)
+    if unsold_ids:
+        # Ngày không còn bán (tồn tăng lại trong ngày): bỏ dòng rollup
+        cursor.execute(f"""
+            DELETE FROM daily_sales_rollup
+            WHERE date = %s AND product_id IN ({", ".join(["%s"] * len(unsold_ids))})
+        """, [date_str] + unsold_ids)
+    return sum(row[3] for row in sold_rows)
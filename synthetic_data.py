@@ -0,0 +1,185 @@
+import os
+import math
+import random
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+# Sinh catalog giả lập cùng dạng dữ liệu với API ListingProductsBySlug để benchmark
+# và chạy thử crawler/migration/dashboard mà không cần gọi API thật.
+
+CATEGORY_URL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'category_url.txt')
+
+NAME_PREFIXES = ['Bánh', 'Cà phê', 'Trà', 'Sữa', 'Nước', 'Mì', 'Gạo', 'Dầu ăn', 'Kẹo', 'Nước mắm',
+                 'Xúc xích', 'Thịt', 'Cá', 'Rau', 'Táo', 'Cam', 'Dầu gội', 'Nước giặt', 'Khăn giấy', 'Kem']
+NAME_BRANDS = ['Vinamilk', 'TH True', 'Trung Nguyên', 'Highlands', 'Acecook', 'Nam Ngư', 'Kinh Đô',
+               'Orion', 'Omo', 'Sunsilk', 'Meizan', 'Vissan', 'CP', 'Đà Lạt GAP', 'Cholimex']
+NAME_SIZES = ['100g', '250g', '500g', '1kg', '330ml', '500ml', '1L', 'gói 5', 'lốc 6', 'thùng 24']
+PROMOTIONS = ['Mua 2 tặng 1', 'Giảm 10% khi mua 3', 'Tặng kèm ly', 'Combo tiết kiệm']
+
+
+def load_category_slugs(path=CATEGORY_URL_FILE):
+    """17 slug danh mục lấy từ category_url.txt"""
+    with open(path, encoding='utf-8') as f:
+        return [urlparse(line.strip()).path.strip('/') for line in f if line.strip()]
+
+
+def _price(rng):
+    # Giá lẻ siêu thị: log-normal quanh ~45.000₫, làm tròn 500₫
+    return max(5000, int(round(rng.lognormvariate(10.7, 0.7) / 500)) * 500)
+
+
+def generate_catalog(n_products, seed=42, categories=None):
+    """
+    Sinh n_products sản phẩm (1-3 biến thể) chia đều cho các danh mục.
+    Mỗi sản phẩm có dạng giống phần tử `data` của API, thêm khóa `category` (slug).
+    """
+    rng = random.Random(seed)
+    categories = categories or load_category_slugs()
+    catalog = []
+    variant_seq = 0
+    for index in range(n_products):
+        base_name = f"{rng.choice(NAME_PREFIXES)} {rng.choice(NAME_BRANDS)}"
+        gift_items = []
+        if rng.random() < 0.15:
+            gift_items.append({
+                'id': f"gift-{index}",
+                'name': 'Quà tặng',
+                'promotionInfo': {'promotionSummary': rng.choice(PROMOTIONS), '__typename': 'PromotionInfo'},
+                '__typename': 'GiftItem',
+            })
+
+        variants = []
+        for _ in range(rng.choice([1, 1, 1, 2, 3])):
+            variant_seq += 1
+            original_price = _price(rng)
+            discount = rng.choice([0, 0, 0, 5, 10, 20])
+            variants.append({
+                'id': f"syn-{variant_seq:08d}",
+                'name': f"{base_name} {rng.choice(NAME_SIZES)}",
+                'orderedCounter': rng.randint(0, 5000),
+                'stockItem': {'quantity': rng.randint(0, 300), '__typename': 'StockItem'},
+                'originalPrice': original_price,
+                'discountPrice': int(original_price * (100 - discount) / 100 // 500 * 500),
+                '__typename': 'ProductVariant',
+            })
+
+        catalog.append({
+            'id': f"prod-{index:08d}",
+            'category': categories[index % len(categories)],
+            'descriptionJson': {'introduction': f"Mô tả {base_name}"},
+            'giftItems': gift_items,
+            'inStock': True,
+            'variants': variants,
+            '__typename': 'Product',
+        })
+    return catalog
+
+
+def advance_day(catalog, rng):
+    """
+    Chuyển catalog sang ngày kế tiếp: bán hàng làm giảm tồn và tăng orderedCounter,
+    thỉnh thoảng nhập hàng hoặc đổi giá khuyến mãi.
+    """
+    for product in catalog:
+        for variant in product['variants']:
+            stock = variant['stockItem']['quantity']
+            sold = min(stock, int(rng.expovariate(1 / 4)))
+            variant['orderedCounter'] += sold
+            stock -= sold
+            if stock < 10 and rng.random() < 0.3:
+                stock += rng.randint(50, 300)
+            variant['stockItem']['quantity'] = stock
+            if rng.random() < 0.05:
+                discount = rng.choice([0, 5, 10, 15, 20, 30])
+                variant['discountPrice'] = int(variant['originalPrice'] * (100 - discount) / 100 // 500 * 500)
+
+
+def products_by_slug(catalog):
+    """Nhóm catalog theo slug danh mục"""
+    grouped = {}
+    for product in catalog:
+        grouped.setdefault(product['category'], []).append(product)
+    return grouped
+
+
+def listing_page(products, slug, page, limit):
+    """Body JSON của ListingProductsBySlug cho một trang (trang ngoài phạm vi trả data rỗng)"""
+    start = (page - 1) * limit
+    data = [
+        {key: value for key, value in product.items() if key != 'category'}
+        for product in products[start:start + limit]
+    ]
+    return {
+        'data': {
+            'listingProductsBySlug': {
+                'total': len(products),
+                'page': page,
+                'limit': limit,
+                'data': data,
+                '__typename': 'ListingProductsResponse',
+            }
+        }
+    }
+
+
+def page_count(n_items, limit):
+    return max(1, math.ceil(n_items / limit))
+
+
+def generate_mongo_documents(n_products, days, seed=42, start_date=None):
+    """
+    Sinh document theo đúng dạng product_fetcher ghi vào collection kf_new
+    (mỗi biến thể một document, kèm sales/stock/price_history theo ngày).
+    """
+    rng = random.Random(seed)
+    catalog = generate_catalog(n_products, seed=seed)
+    start_date = start_date or (datetime.now() - timedelta(days=days - 1))
+    documents = {}
+
+    for day in range(days):
+        date_str = (start_date + timedelta(days=day)).strftime('%Y-%m-%d')
+        for product in catalog:
+            promotion = "Không có khuyến mãi"
+            for gift_item in product['giftItems']:
+                promotion = gift_item['promotionInfo']['promotionSummary']
+            for variant in product['variants']:
+                doc = documents.get(variant['id'])
+                stock = variant['stockItem']['quantity']
+                total_sold = variant['orderedCounter']
+                if doc is None:
+                    doc = documents[variant['id']] = {
+                        'id': variant['id'],
+                        'sales_history': [{'date': date_str, 'total_sold': total_sold, 'sold_in_date': 0}],
+                        'stock_history': [{'date': date_str, 'stock_quantity': stock,
+                                           'stock_increased': 0, 'stock_decreased': 0}],
+                        'price_history': [],
+                    }
+                else:
+                    change = stock - doc['stock_quantity']
+                    doc['sales_history'].append({
+                        'date': date_str, 'total_sold': total_sold,
+                        'sold_in_date': max(0, total_sold - doc['total_sold']),
+                    })
+                    doc['stock_history'].append({
+                        'date': date_str, 'stock_quantity': stock,
+                        'stock_increased': max(0, change), 'stock_decreased': abs(min(0, change)),
+                    })
+                if not doc['price_history'] or doc['price_history'][-1]['price'] != variant['discountPrice']:
+                    doc['price_history'].append({
+                        'date': date_str, 'price': variant['discountPrice'],
+                        'original_price': variant['originalPrice'],
+                    })
+                doc.update({
+                    'name': variant['name'],
+                    'stock_quantity': stock,
+                    'total_sold': total_sold,
+                    'price': variant['discountPrice'],
+                    'original_price': variant['originalPrice'],
+                    'promotion': promotion,
+                    'description': product['descriptionJson']['introduction'],
+                    'date': date_str,
+                    'category': product['category'],
+                })
+        advance_day(catalog, rng)
+
+    return list(documents.values())
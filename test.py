@@ -1,18 +1,24 @@
 import os
-import requests
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
 from dotenv import load_dotenv
 import mysql.connector
 from mysql.connector import Error
-import json
-import time
+import metrics
+import ingest_logging
+import ingestion_core
+from data_version import ensure_data_version_table
+from sales_rollup import ensure_rollup_table, record_daily_sales
+from inventory_snapshot import ensure_inventory_snapshot_table
+from write_elision import product_fingerprint, touch_last_seen
+from product_search import search_name, backfill_search_names
 
 load_dotenv()
 MYSQL_HOST = os.getenv("MYSQL_HOST")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
 MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
-url = os.getenv("API_URL")
+
+logger = ingest_logging.get_logger('mysql')
 
 # Kết nối MySQL
 def create_connection():
@@ -25,10 +31,10 @@ def create_connection():
             password="123456789@"  
         )
         if connection.is_connected():
-            print("Kết nối MySQL thành công")
+            logger.info("Kết nối MySQL thành công")
             return connection
     except Error as e:
-        print(f"Lỗi kết nối MySQL: {e}")
+        logger.error(f"Lỗi kết nối MySQL: {e}")
         return None
 
 # SIMPLIFIED STOCK CALCULATION FUNCTION với UNIQUE KEY
@@ -41,7 +47,7 @@ def simple_stock_history_calculation(connection, product_id, current_stock, targ
     target_date_str = target_date.strftime("%Y-%m-%d")
     
     try:
-        print(f"🔄 Processing stock for {product_id} on {target_date_str}")
+        logger.debug("Processing stock for %s on %s", product_id, target_date_str)
         
         # Lấy thời gian hiện tại để insert
         current_time = datetime.now().strftime("%H:%M:%S")
@@ -56,19 +62,16 @@ def simple_stock_history_calculation(connection, product_id, current_stock, targ
         """, (product_id, target_date_str, current_stock, current_time))
         
         if cursor.rowcount == 1:
-            print(f"🆕 Created new stock record: {current_stock}")
+            logger.debug("Created new stock record for %s: %s", product_id, current_stock)
             return True
         elif cursor.rowcount == 2:
-            print(f"✅ Updated stock record: {current_stock}")
+            logger.debug("Updated stock record for %s: %s", product_id, current_stock)
             return True
         else:
-            print(f"⚖️ No stock change needed: {current_stock}")
+            logger.debug("No stock change needed for %s: %s", product_id, current_stock)
             return False
-        
-    except Exception as e:
-        print(f"❌ Error in stock calculation for {product_id}: {e}")
-        return False
     
+    # Lỗi ghi được ném lên save_products_page để rollback trang và bỏ trạng thái trong write elision
     finally:
         cursor.close()
 
@@ -96,7 +99,7 @@ def create_simplified_stock_history_table(connection):
                 UNIQUE KEY unique_product_date (product_id, date)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             """)
-            print("✅ Created simplified stock_history table with UNIQUE KEY")
+            logger.info("Created simplified stock_history table with UNIQUE KEY")
         else:
             # Kiểm tra nếu UNIQUE KEY đã tồn tại
             cursor.execute("""
@@ -113,7 +116,7 @@ def create_simplified_stock_history_table(connection):
                     ALTER TABLE stock_history 
                     ADD UNIQUE KEY unique_product_date (product_id, date)
                 """)
-                print("✅ Added UNIQUE KEY to existing stock_history table")
+                logger.info("Added UNIQUE KEY to existing stock_history table")
             
             # Kiểm tra và sửa created_at nếu có thể NULL
             cursor.execute("""
@@ -138,25 +141,23 @@ def create_simplified_stock_history_table(connection):
                     ALTER TABLE stock_history 
                     MODIFY COLUMN created_at TIME NOT NULL
                 """)
-                print("✅ Updated stock_history.created_at to NOT NULL")
+                logger.info("Updated stock_history.created_at to NOT NULL")
             else:
-                print("✅ Stock_history table already has proper constraints")
+                logger.debug("Stock_history table already has proper constraints")
         
         connection.commit()
         
     except Error as e:
-        print(f"❌ Error creating/updating table: {e}")
+        logger.error(f"Error creating/updating table: {e}")
     finally:
         cursor.close()
 
 def integrated_stock_processing(connection, product_id, current_stock, target_date):
     """
     Code tích hợp để thay thế phần stock processing trong fetch_and_save_products
+    (bảng stock_history đã được create_tables kiểm tra một lần cho mỗi lần chạy)
     """
     
-    # Tạo simplified table
-    create_simplified_stock_history_table(connection)
-    
     # Tính toán stock changes
     has_change = simple_stock_history_calculation(
         connection, product_id, current_stock, target_date
@@ -175,6 +176,7 @@ def create_tables(connection):
             `product_id` VARCHAR(255) PRIMARY KEY,
             `category` VARCHAR(255),
             `name` TEXT,
+            `name_search` TEXT,
             `price` BIGINT UNSIGNED DEFAULT 0,
             `promotion` TEXT,
             `date` DATE,
@@ -191,6 +193,18 @@ def create_tables(connection):
         table_exists = cursor.fetchone()
         
         if table_exists:
+            # Cột name_search (tên không dấu cho tìm kiếm của dashboard) thêm sau: bổ sung và điền cho dữ liệu cũ
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.COLUMNS 
+                WHERE table_name = 'product' 
+                AND column_name = 'name_search'
+                AND table_schema = DATABASE()
+            """)
+            if not cursor.fetchone()[0]:
+                cursor.execute("ALTER TABLE product ADD COLUMN name_search TEXT AFTER name")
+                backfill_search_names(cursor)
+                print("✅ Added product.name_search")
+            
             # Kiểm tra cột created_at có thể NULL không
             cursor.execute("""
                 SELECT IS_NULLABLE FROM information_schema.COLUMNS 
@@ -286,6 +300,15 @@ def create_tables(connection):
                 """)
                 print("✅ Updated price_history.created_at to NOT NULL")
         
+        # Bảng version để dashboard phát hiện dữ liệu mới
+        ensure_data_version_table(cursor)
+        
+        # Bảng rollup doanh số theo ngày cho dashboard
+        ensure_rollup_table(cursor)
+        
+        # Snapshot trạng thái tồn kho cho tab Tồn kho của dashboard
+        ensure_inventory_snapshot_table(cursor)
+        
         connection.commit()
         print("Các bảng đã được tạo/kiểm tra thành công")
         
@@ -295,494 +318,172 @@ def create_tables(connection):
         if cursor:
             cursor.close()
 
-headers = {
-    "Content-Type": "application/json",
-    "User-Agent": "Mozilla/5.0"
-}
+VARIANTS_UNCHANGED = metrics.counter('ingest_variants_unchanged_total', 'Số biến thể không đổi, chỉ cập nhật last seen')
+
+def save_products_page(connection, records, target_date, state_cache=None):
+    """
+    Ghi một trang VariantRecord (ingestion_core.parse_products) vào MySQL cho ngày target_date.
+    Dùng chung cho crawl và replay_backfill; người gọi tự commit. Trả về số biến thể đã xử lý.
+    state_cache (write_elision.VariantStateCache): bỏ qua ghi cho biến thể không đổi.
+    """
+    target_date_str = target_date.strftime("%Y-%m-%d")
+    cursor = connection.cursor()
+    page_products = 0
+    unchanged_ids = []
+    # Biến thể đã ghi trong transaction hiện tại (chưa commit) của trang
+    written_ids = []
+    # (product_id, category, tồn, giá) của biến thể đổi tồn kho, ghi rollup doanh số một lần cuối trang
+    page_sales = []
+    
+    def discard_uncommitted(product_id=None):
+        # Rollback bỏ mọi dòng chưa commit của trang: trừ khỏi số đã ghi và bỏ trạng thái trong cache
+        nonlocal page_products, written_ids, page_sales
+        try:
+            connection.rollback()
+        except Error as e:
+            logger.error(f"Lỗi rollback: {e}")
+        page_products -= len(written_ids)
+        if state_cache is not None:
+            for written_id in written_ids + [product_id]:
+                state_cache.forget(written_id)
+        written_ids = []
+        page_sales = []
+    
+    for record in records:
+        product_id = record.product_id
+        try:
+            product_name = record.name
+            stock_quantity = record.stock_quantity
+            total_sold = record.total_sold
+            price = record.price
+            original_price = record.original_price
+            promotion = record.promotion
+            slug_value = record.category
+
+            # Lấy thời gian hiện tại cho mỗi sản phẩm
+            current_time = datetime.now().strftime("%H:%M:%S")
+
+            fingerprint = product_fingerprint(product_name, stock_quantity, total_sold, price,
+                                              original_price, promotion, slug_value)
+            if state_cache is not None \
+                    and not state_cache.product_changed(product_id, fingerprint) \
+                    and not state_cache.stock_changed(product_id, stock_quantity) \
+                    and not state_cache.price_changed(product_id, price, original_price):
+                # Không đổi so với lần ghi trước: chỉ cập nhật last seen (theo lô cuối trang)
+                unchanged_ids.append(product_id)
+                page_products += 1
+                continue
+
+            # 1. Sử dụng INSERT ... ON DUPLICATE KEY UPDATE để xử lý cả insert và update
+            cursor.execute("""
+                INSERT INTO product (product_id, name, name_search, stock_quantity, total_sold, 
+                    price, original_price, promotion, category, date, created_at, updated_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    name = VALUES(name),
+                    name_search = VALUES(name_search),
+                    stock_quantity = VALUES(stock_quantity),
+                    total_sold = VALUES(total_sold),
+                    price = VALUES(price),
+                    original_price = VALUES(original_price),
+                    promotion = VALUES(promotion),
+                    category = VALUES(category),
+                    date = VALUES(date),
+                    updated_at = VALUES(updated_at)
+            """, (product_id, product_name, search_name(product_name), stock_quantity, total_sold, 
+                 price, original_price, promotion, slug_value, target_date_str, 
+                 current_time, current_time))
+
+            # 2. Xử lý lịch sử giá với INSERT ... ON DUPLICATE KEY UPDATE (chỉ khi giá đổi)
+            if state_cache is None or state_cache.price_changed(product_id, price, original_price):
+                cursor.execute("""
+                    INSERT INTO price_history (product_id, date, price, original_price, created_at)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE 
+                    price = VALUES(price), 
+                    original_price = VALUES(original_price),
+                    created_at = VALUES(created_at)
+                """, (product_id, target_date_str, price, original_price, current_time))
+
+            has_change = False
+            if state_cache is None or state_cache.stock_changed(product_id, stock_quantity):
+                # 3. Rollup doanh số ngày (so với tồn kho ngày trước đó) ghi theo lô cuối trang
+                page_sales.append((product_id, slug_value, stock_quantity, price))
+
+                # 4. Xử lý lịch sử kho - ĐƠN GIẢN
+                has_change = integrated_stock_processing(
+                    connection, product_id, stock_quantity, target_date
+                )
+
+            # Chỉ ghi nhớ sau khi mọi câu lệnh của biến thể đã chạy thành công
+            # (người gọi commit thất bại thì tự forget các biến thể của trang)
+            if state_cache is not None:
+                state_cache.remember(product_id, fingerprint, stock_quantity, price, original_price)
+            written_ids.append(product_id)
 
-# Payload template sẽ được cập nhật động
-payload_template = {
-    "operationName": "ListingProductsBySlug",
-    "query": """
-    query ListingProductsBySlug($slug: String, $page: Int, $limit: Int, $filters: [ListingProductBySlugInput], $order: ListingProductSortEnum, $direction: OrderDirectionEnum) {
-      listingProductsBySlug(
-        slug: $slug
-        page: $page
-        limit: $limit
-        filters: $filters
-        order: $order
-        direction: $direction
-      ) {
-        total
-        page
-        limit
-        data {
-          id
-          discountPercent
-          discountPrice
-          thumbnail
-          giftItems {
-            id
-            name
-            thumbnail
-            promotionInfo {
-              id
-              type
-              name
-              promotionSummary
-              promotionApplyLimit
-              __typename
-            }
-            __typename
-          }
-          images
-          inStock
-          isAlcohol
-          name
-          olClub {
-            discountPrice
-            discountPercent
-            __typename
-          }
-          originalPrice
-          slug
-          thumbnail
-          teasingInfo {
-            hasDelivery
-            openDate
-            deliveryDate
-            limitNote
-            receivedNoti
-            promotionId
-            variantId
-            productId
-            __typename
-          }
-          itemTrait {
-            itemType
-            itemPromotion
-            isTeasing
-            __typename
-          }
-          variants {
-            teasingInfo {
-              hasDelivery
-              openDate
-              deliveryDate
-              limitNote
-              receivedNoti
-              promotionId
-              variantId
-              productId
-              __typename
-            }
-            itemTrait {
-              itemType
-              itemPromotion
-              isTeasing
-              __typename
-            }
-            id
-            discountPercent
-            discountPrice
-            images
-            name
-            originalPrice
-            price
-            sku
-            inStock
-            thumbnail
-            stockItem {
-              quantity
-              maxSaleQuantity
-              minSaleQuantity
-              __typename
-            }
-            unit {
-              id
-              name
-              __typename
-            }
-            giftItems {
-              id
-              name
-              thumbnail
-              __typename
-            }
-            unitConversion {
-              isBaseVariant
-              baseUnitName
-              pricePerBaseUnit
-              conversion
-              formatPricePerBaseUnit
-              originalPricePerBaseUnit
-              __typename
-            }
-            isOrdered
-            isSelected
-            slug
-            isOnlineSale
-            isSale
-            preOrder {
-              counter {
-                ordered
-                remain
-                __typename
-              }
-              promotionDetail {
-                id
-                endAt
-                deliveryDate
-                termAndCondition {
-                  title
-                  content
-                  __typename
-                }
-                __typename
-              }
-              deliveryDate
-              __typename
-            }
-            groupBuy {
-              levelPrice {
-                level
-                price
-                costSavings
-                isSelected
-                discountTicker {
-                  tickerId
-                  position
-                  isOverride
-                  isImage
-                  type
-                  code
-                  name
-                  textColor
-                  backgroundColor
-                  strokeColor
-                  imageUrl
-                  deliveryDisplayText
-                  __typename
-                }
-                __typename
-              }
-              incentivePercent
-              groupCount
-              promotionDetail {
-                id
-                endAt
-                deliveryDate
-                __typename
-              }
-              __typename
-            }
-            deliveryDate
-            promotionInfoItems {
-              id
-              type
-              name
-              promotionSummary
-              promotionApplyLimit
-              __typename
-            }
-            promotionSummary
-            promotionApplyLimit
-            warnMsg {
-              type
-              message
-              __typename
-            }
-            orderedCounter
-            metadata
-            hasOneInManyLimitation
-            limitQuantity
-            highlightedData {
-              highlightedInfos {
-                code
-                text
-                textColor
-                backgroundColor
-                fillColor
-                fillRatio
-                headingIcon
-                boughtCustomerNames
-                hoverable
-                underlying
-                gifts {
-                  imageUrl
-                  name
-                  quantity
-                  sku
-                  isDisabled
-                  badgeItem {
-                    badgeId
-                    position
-                    isOverride
-                    isImage
-                    type
-                    code
-                    name
-                    textColor
-                    backgroundColor
-                    strokeColor
-                    imageUrl
-                    deliveryDisplayText
-                    __typename
-                    }
-                  __typename
-                }
-                __typename
-              }
-              __typename
-            }
-            __typename
-          }
-          isActive
-          subCate
-          tickerItems {
-            tickerId
-            isImage
-            type
-            code
-            name
-            textColor
-            backgroundColor
-            strokeColor
-            imageUrl
-            __typename
-          }
-          badgeItems {
-            badgeId
-            isImage
-            type
-            code
-            name
-            textColor
-            backgroundColor
-            strokeColor
-            imageUrl
-            __typename
-          }
-          __typename
-        }
-        cateId
-        subCateId
-        specCateId
-        brandId
-        __typename
-      }
-    }
-    """,
-    "variables": {
-        "limit": 102,
-        "page": 1,
-        "slug": "",
-        "filters": []
-    }
-}
+            logger.debug("Variant %s stock=%s changed=%s", product_id, stock_quantity, has_change)
+
+            page_products += 1
+
+        except Error as e:
+            logger.error(f"Lỗi khi xử lý sản phẩm {product_id}: {e}")
+            discard_uncommitted(product_id)
+        except Exception as e:
+            logger.error(f"Lỗi không xác định khi xử lý sản phẩm {product_id}: {e}")
+            discard_uncommitted(product_id)
+    
+    if page_sales:
+        try:
+            record_daily_sales(cursor, target_date_str, page_sales)
+        except Error as e:
+            logger.error(f"Lỗi khi cập nhật rollup doanh số cho {len(page_sales)} sản phẩm: {e}")
+            discard_uncommitted()
+    
+    if unchanged_ids:
+        try:
+            touch_last_seen(cursor, unchanged_ids, target_date_str, datetime.now().strftime("%H:%M:%S"))
+        except Error as e:
+            logger.error(f"Lỗi khi cập nhật last seen cho {len(unchanged_ids)} sản phẩm: {e}")
+        state_cache.unchanged += len(unchanged_ids)
+        VARIANTS_UNCHANGED.inc(len(unchanged_ids), sink='mysql')
+    
+    cursor.close()
+    return page_products
+
+def commit_page(connection, records, state_cache=None):
+    """
+    Commit một trang đã ghi bằng save_products_page. Commit lỗi thì rollback và bỏ trạng thái
+    write elision của các biến thể trong trang (để lần sau ghi lại), rồi ném lỗi cho người gọi.
+    """
+    try:
+        connection.commit()
+    except Error:
+        try:
+            connection.rollback()
+        except Error as e:
+            logger.error(f"Lỗi rollback: {e}")
+        if state_cache is not None:
+            for record in records:
+                state_cache.forget(record.product_id)
+        raise
 
 def fetch_and_save_products(start_page, end_page=None, limit_value=102, slug_value="", target_date=None):
     """
-    Hàm thu thập và lưu sản phẩm từ API vào MySQL - ĐÃ SỬA
+    Hàm thu thập và lưu sản phẩm từ API vào MySQL (qua ingestion_core, kèm archive phản hồi thô)
     - start_page: trang bắt đầu
     - end_page: trang kết thúc (None để lấy đến khi hết dữ liệu)
     - limit_value: số sản phẩm mỗi trang
     - slug_value: slug của danh mục
     - target_date: ngày mục tiêu để lưu dữ liệu (nếu None sẽ dùng ngày hiện tại)
+    INGEST_SINKS=mysql,mongo,... để cùng một lần crawl ghi vào các store khác.
+    Trả về số biến thể đã ghi vào MySQL. Giữ để tương thích: crawl nhiều danh mục thì gọi
+    ingestion_core.crawl_categories một lần với mọi slug.
     """
-    connection = create_connection()
-    if not connection:
-        print("Không thể kết nối đến MySQL")
-        return
-    
-    create_tables(connection)
-    
-    # Sử dụng ngày mục tiêu nếu được cung cấp, nếu không dùng ngày hiện tại
-    if target_date is None:
-        target_date = datetime.now()
-    
-    target_date_str = target_date.strftime("%Y-%m-%d")
-    current_time = datetime.now().strftime("%H:%M:%S")  # Lấy giờ hiện tại
-    
-    total_products = 0
-    page = start_page
-    has_more_data = True
-    max_retries = 3
-    
-    while has_more_data and (end_page is None or page <= end_page):
-        # Tạo payload mới cho mỗi trang
-        payload = {
-            "operationName": "ListingProductsBySlug",
-            "query": payload_template["query"],
-            "variables": {
-                "limit": limit_value,
-                "page": page,
-                "slug": slug_value,
-                "filters": []
-            }
-        }
-        
-        retry_count = 0
-        success = False
-        
-        while retry_count < max_retries and not success:
-            try:
-                print(f"Fetching data from page {page} for slug '{slug_value}'...")
-                response = requests.post(url, headers=headers, json=payload, timeout=30)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    # Kiểm tra nếu API trả về lỗi
-                    if "errors" in data:
-                        print(f"API returned errors: {data['errors']}")
-                        break
-                    
-                    products = data.get("data", {}).get("listingProductsBySlug", {}).get("data", [])
-                    
-                    # Kiểm tra nếu không còn sản phẩm thì dừng
-                    if not products:
-                        print(f"Trang {page} không có dữ liệu, dừng lại.")
-                        has_more_data = False
-                        break
-                    
-                    # Lưu response để debug (tùy chọn)
-                    with open(f"response_{slug_value}_page_{page}.json", "w", encoding="utf-8") as f:
-                        json.dump(data, f, ensure_ascii=False, indent=2)
-                    
-                    cursor = connection.cursor()
-                    page_products = 0
-                    
-                    for product in products:
-                        print(f"Processing product for date: {target_date_str}")
-                        
-                        description = product.get("descriptionJson", {}).get("introduction", "") if product else ""
-                        
-                        giftItems = product.get("giftItems") or []
-                        promotion = "Không có khuyến mãi"
-                        
-                        if giftItems:
-                            promotion_texts = []
-                            for gift_item in giftItems:
-                                promotion_info = gift_item.get("promotionInfo")
-                                if promotion_info:
-                                    promo_text = promotion_info.get("promotionSummary", "Khuyến mãi")
-                                    promotion_texts.append(promo_text)
-                            
-                            if promotion_texts:
-                                promotion = ", ".join(promotion_texts)
-                        
-                        product_variants = product.get("variants", [])
-                        
-                        for variant in product_variants:
-                            try:
-                                product_id = variant["id"]
-                                total_sold = variant.get("orderedCounter", 0)
-                                stock_quantity = int(variant.get("stockItem", {}).get("quantity", 0))
-                                original_price = variant.get("originalPrice", 0)
-                                price = variant.get("discountPrice", original_price)
-                                product_name = variant.get("name", "Unknown Product")
-                                
-                                # Validate and sanitize data
-                                product_name = str(product_name) if product_name else "Unknown"
-                                stock_quantity = max(0, int(stock_quantity)) if stock_quantity is not None else 0
-                                total_sold = max(0, int(total_sold)) if total_sold is not None else 0
-                                price = max(0, int(price)) if price is not None else 0
-                                original_price = max(0, int(original_price)) if original_price is not None else 0
-                                promotion = str(promotion) if promotion else "Không có khuyến mãi"
-                                
-                                # Lấy thời gian hiện tại cho mỗi sản phẩm
-                                current_time = datetime.now().strftime("%H:%M:%S")
-                                
-                                # 1. Sử dụng INSERT ... ON DUPLICATE KEY UPDATE để xử lý cả insert và update
-                                cursor.execute("""
-                                    INSERT INTO product (product_id, name, stock_quantity, total_sold, 
-                                        price, original_price, promotion, category, date, created_at, updated_at)
-                                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                    ON DUPLICATE KEY UPDATE
-                                        name = VALUES(name),
-                                        stock_quantity = VALUES(stock_quantity),
-                                        total_sold = VALUES(total_sold),
-                                        price = VALUES(price),
-                                        original_price = VALUES(original_price),
-                                        promotion = VALUES(promotion),
-                                        category = VALUES(category),
-                                        date = VALUES(date),
-                                        updated_at = VALUES(updated_at)
-                                """, (product_id, product_name, stock_quantity, total_sold, 
-                                     price, original_price, promotion, slug_value, target_date_str, 
-                                     current_time, current_time))
-                                
-                                # 2. Xử lý lịch sử giá với INSERT ... ON DUPLICATE KEY UPDATE
-                                cursor.execute("""
-                                    INSERT INTO price_history (product_id, date, price, original_price, created_at)
-                                    VALUES (%s, %s, %s, %s, %s)
-                                    ON DUPLICATE KEY UPDATE 
-                                    price = VALUES(price), 
-                                    original_price = VALUES(original_price),
-                                    created_at = VALUES(created_at)
-                                """, (product_id, target_date_str, price, original_price, current_time))
-                                
-                                # 3. Xử lý lịch sử kho - ĐƠN GIẢN
-                                has_change = integrated_stock_processing(
-                                    connection, product_id, stock_quantity, target_date
-                                )
-                                
-                                if has_change:
-                                    print(f"Stock updated for {product_id}: {stock_quantity}")
-                                else:
-                                    print(f"No stock change for {product_id}")
-                                
-                                page_products += 1
-                                total_products += 1
-                                
-                                if page_products % 10 == 0:
-                                    print(f"  Processed {page_products} products on page {page}")
-                                    
-                            except Error as e:
-                                print(f"Lỗi khi xử lý sản phẩm {product_id}: {e}")
-                                connection.rollback()
-                            except KeyError as e:
-                                print(f"Thiếu trường dữ liệu trong variant: {e}")
-                                continue
-                            except Exception as e:
-                                print(f"Lỗi không xác định khi xử lý sản phẩm {product_id}: {e}")
-                                continue
-                    
-                    cursor.close()
-                    connection.commit()
-                    print(f"Page {page} completed: {page_products} products processed")
-                    success = True
-                    
-                else:
-                    print(f"Request for page {page} failed with status code {response.status_code}")
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        print(f"Retrying... ({retry_count}/{max_retries})")
-                        time.sleep(2)
-                    
-            except requests.exceptions.RequestException as e:
-                print(f"Network error on page {page}: {e}")
-                retry_count += 1
-                if retry_count < max_retries:
-                    print(f"Retrying... ({retry_count}/{max_retries})")
-                    time.sleep(3)
-            except json.JSONDecodeError as e:
-                print(f"JSON decode error on page {page}: {e}")
-                retry_count += 1
-                if retry_count < max_retries:
-                    print(f"Retrying... ({retry_count}/{max_retries})")
-                    time.sleep(2)
-        
-        if not success:
-            print(f"Failed to process page {page} after {max_retries} attempts. Moving to next page.")
-        
-        page += 1
-        time.sleep(1)
-    
-    connection.close()
-    print(f"\nTotal number of products retrieved for '{slug_value}': {total_products}")
-    return total_products
+    stats = ingestion_core.crawl_category(
+        slug_value, ingestion_core.configured_sinks(['mysql', 'archive']),
+        start_page=start_page, end_page=end_page, limit=limit_value, target_date=target_date
+    )
+    return stats.get('mysql', 0)
 
 # UTILITY FUNCTIONS MỚI
 def calculate_daily_stock_changes(connection, product_id, days=7):
@@ -880,23 +581,15 @@ def validate_stock_consistency(connection, product_id):
 
 def fetch_historical_data(start_date, end_date, slug_value="", start_page=1, end_page=3):
     """
-    Thu thập dữ liệu lịch sử cho một khoảng thời gian
+    Dựng lại dữ liệu lịch sử cho một khoảng thời gian từ response_archive (không gọi API):
+    mỗi ngày dùng đúng phản hồi đã lấy trong ngày đó thay vì gán dữ liệu hôm nay cho ngày cũ
     """
-    current_date = datetime.strptime(start_date, "%Y-%m-%d")
-    end_date = datetime.strptime(end_date, "%Y-%m-%d")
-    
-    while current_date <= end_date:
-        print(f"\n📅 Fetching data for date: {current_date.strftime('%Y-%m-%d')}")
-        fetch_and_save_products(
-            start_page=start_page, 
-            end_page=end_page, 
-            limit_value=102,
-            slug_value=slug_value,
-            target_date=current_date
-        )
-        
-        current_date += timedelta(days=1)
-        time.sleep(1)
+    from replay_backfill import replay_archive
+
+    return replay_archive(
+        start_date, end_date, sink='mysql', slug=slug_value or None,
+        start_page=start_page, end_page=end_page
+    )
 
 def fix_existing_null_created_at(connection):
     """
@@ -0,0 +1,151 @@
+import os
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+# Kiểm tra kế hoạch thực thi (EXPLAIN) của các truy vấn dashboard sau khi viết lại điều kiện ngày
+# dạng sargable [day_start, day_after) và thêm covering index: bảng lịch sử/rollup phải dùng index,
+# không quét toàn bảng. Chạy trên database tạm dựng bằng DDL của migration2_script.
+# Bỏ qua khi không có mysql-connector hoặc không kết nối được MySQL (MYSQL_HOST/MYSQL_PORT/...).
+mysql_connector = pytest.importorskip("mysql.connector")
+
+PLAN_TEST_DATABASE = os.getenv('PLAN_TEST_DATABASE', 'kfm_plan_test')
+HISTORY_DAYS = 365
+PRODUCTS = 200
+WINDOW_DAYS = 30
+HISTORY_ALIASES = ('r', 'sh', 'ph')
+
+# Truy vấn đại diện (cùng dạng với các fetch_* trong dashboard.py)
+QUERY_PLAN_CHECKS = {
+    'rollup_revenue': """
+        SELECT COALESCE(SUM(r.revenue), 0)
+        FROM daily_sales_rollup r
+        WHERE r.date >= %s AND r.date < %s
+    """,
+    'rollup_trend': """
+        SELECT r.date, r.category, SUM(r.revenue)
+        FROM daily_sales_rollup r
+        WHERE r.date >= %s AND r.date < %s
+        GROUP BY r.date, r.category
+    """,
+    'stock_history_range': """
+        SELECT sh.id, sh.product_id, sh.stock_increased, sh.stock_decreased, sh.date
+        FROM stock_history sh
+        WHERE sh.date >= %s AND sh.date < %s
+        ORDER BY sh.date DESC
+    """,
+    'price_history_range': """
+        SELECT ph.id, ph.product_id, ph.price, ph.original_price, ph.date
+        FROM price_history ph
+        WHERE ph.date >= %s AND ph.date < %s
+        ORDER BY ph.date DESC
+    """,
+    'stock_history_keyset_page': """
+        SELECT sh.id, p.name, sh.stock_increased, sh.stock_decreased, sh.date
+        FROM stock_history sh
+        JOIN product p ON sh.product_id = p.product_id
+        WHERE sh.date >= %s AND sh.date < %s
+        ORDER BY sh.date DESC, sh.id DESC
+        LIMIT 101
+    """,
+}
+
+
+def connection_settings():
+    return {
+        'host': os.getenv('MYSQL_HOST', 'localhost'),
+        'port': int(os.getenv('MYSQL_PORT', '3306')),
+        'user': os.getenv('MYSQL_USERNAME', 'root'),
+        'password': os.getenv('MYSQL_PASSWORD', '123456789@'),
+        'connection_timeout': 5,
+    }
+
+
+def seed(cursor, start):
+    rng = random.Random(7)
+    products = [(f"p{i}", f"cat{i % 8}", f"Sản phẩm {i}", rng.randint(10000, 150000)) for i in range(PRODUCTS)]
+    cursor.executemany(
+        "INSERT INTO product (product_id, category, name, price) VALUES (%s, %s, %s, %s)", products
+    )
+    stock_rows, price_rows, rollup_rows = [], [], []
+    for day in range(HISTORY_DAYS):
+        date = start + timedelta(days=day)
+        for product_id, category, _, price in products:
+            sold = rng.randint(0, 5)
+            stock_rows.append((product_id, date, rng.randint(0, 3), sold))
+            price_rows.append((product_id, date, price, price))
+            if sold:
+                rollup_rows.append((date.date(), category, product_id, sold, sold * price))
+    cursor.executemany(
+        "INSERT INTO stock_history (product_id, date, stock_increased, stock_decreased) VALUES (%s, %s, %s, %s)",
+        stock_rows
+    )
+    cursor.executemany(
+        "INSERT INTO price_history (product_id, date, price, original_price) VALUES (%s, %s, %s, %s)",
+        price_rows
+    )
+    cursor.executemany(
+        "INSERT INTO daily_sales_rollup (date, category, product_id, units_sold, revenue) "
+        "VALUES (%s, %s, %s, %s, %s)", rollup_rows
+    )
+    for table in ('product', 'stock_history', 'price_history', 'daily_sales_rollup'):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+
+
+@pytest.fixture(scope='module')
+def plan_cursor(tmp_path_factory):
+    try:
+        server = mysql_connector.connect(**connection_settings())
+    except mysql_connector.Error as e:
+        pytest.skip(f"Không kết nối được MySQL: {e}")
+    pytest.importorskip("pymongo")
+    pytest.importorskip("schedule")
+    pytest.importorskip("dotenv")
+
+    cursor = server.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{PLAN_TEST_DATABASE}`")
+    cursor.execute(f"CREATE DATABASE `{PLAN_TEST_DATABASE}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+
+    # migration2_script cấu hình file log theo thư mục làm việc khi import
+    previous_cwd = os.getcwd()
+    previous_database = os.environ.get('MYSQL_DATABASE')
+    os.chdir(tmp_path_factory.mktemp('migration'))
+    os.environ['MYSQL_DATABASE'] = PLAN_TEST_DATABASE
+    try:
+        from migration2_script import MongoToMySQLMigration
+        MongoToMySQLMigration().create_table_structure()
+    finally:
+        os.chdir(previous_cwd)
+        if previous_database is None:
+            os.environ.pop('MYSQL_DATABASE', None)
+        else:
+            os.environ['MYSQL_DATABASE'] = previous_database
+
+    cursor.execute(f"USE `{PLAN_TEST_DATABASE}`")
+    end = datetime.combine(datetime.now().date(), datetime.min.time())
+    seed(cursor, end - timedelta(days=HISTORY_DAYS))
+    server.commit()
+    cursor.close()
+
+    dict_cursor = server.cursor(dictionary=True)
+    yield dict_cursor, end
+    dict_cursor.close()
+    cleanup = server.cursor()
+    cleanup.execute(f"DROP DATABASE IF EXISTS `{PLAN_TEST_DATABASE}`")
+    cleanup.close()
+    server.close()
+
+
+@pytest.mark.parametrize('name', sorted(QUERY_PLAN_CHECKS))
+def test_history_queries_use_index(plan_cursor, name):
+    cursor, end = plan_cursor
+    params = [end - timedelta(days=WINDOW_DAYS), end + timedelta(days=1)]
+    cursor.execute("EXPLAIN " + QUERY_PLAN_CHECKS[name], params)
+    plan = [row for row in cursor.fetchall() if row.get('table') in HISTORY_ALIASES]
+
+    assert plan, f"EXPLAIN {name} không có bảng lịch sử/rollup"
+    for row in plan:
+        assert row.get('type') != 'ALL', f"{name}: quét toàn bảng {row.get('table')}: {row}"
+        assert row.get('key'), f"{name}: {row.get('table')} không dùng index: {row}"
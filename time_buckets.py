@@ -0,0 +1,112 @@
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Gom dữ liệu theo ngày thành chuỗi kỳ liên tục (ngày/tuần/tháng/năm) bằng khóa số nguyên:
+#   day   -> số ngày kể từ 1970-01-01
+#   week  -> số tuần (bắt đầu thứ Hai) kể từ 1969-12-29
+#   month -> số tháng kể từ 1970-01
+#   year  -> năm
+# Kỳ trống được điền 0 bằng np.add.at trên mảng dày, không cần merge pandas.
+VIEW_TYPES = ('day', 'week', 'month', 'year')
+
+_EPOCH = date(1970, 1, 1)
+
+
+def day_number(value):
+    """Số ngày kể từ 1970-01-01 của một date/datetime"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return (value - _EPOCH).days
+
+
+def _day_keys_to_period(days, view_type):
+    """Đổi mảng số ngày sang khóa kỳ theo view_type"""
+    if view_type == 'day':
+        return days
+    if view_type == 'week':
+        # 1970-01-01 là thứ Năm: +3 để tuần bắt đầu từ thứ Hai
+        return (days + 3) // 7
+    as_dates = days.astype('datetime64[D]')
+    if view_type == 'month':
+        return as_dates.astype('datetime64[M]').astype(np.int64)
+    return as_dates.astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+@lru_cache(maxsize=64)
+def day_to_period_table(view_type, first_day, last_day):
+    """
+    Bảng tra khóa kỳ cho từng ngày trong [first_day, last_day] (đã cache theo khoảng ngày),
+    để mỗi lần gom chỉ còn một phép lấy chỉ số mảng.
+    """
+    table = _day_keys_to_period(np.arange(first_day, last_day + 1, dtype=np.int64), view_type)
+    table.setflags(write=False)
+    return table
+
+
+@lru_cache(maxsize=4096)
+def period_label(view_type, key):
+    """Nhãn hiển thị của một khóa kỳ"""
+    if view_type == 'day':
+        return (_EPOCH + timedelta(days=int(key))).strftime('%Y-%m-%d')
+    if view_type == 'week':
+        monday = _EPOCH + timedelta(days=int(key) * 7 - 3)
+        iso_year, iso_week, _ = monday.isocalendar()
+        return f"{iso_year}-W{iso_week:02d}"
+    if view_type == 'month':
+        return f"{1970 + int(key) // 12}-{int(key) % 12 + 1:02d}"
+    return str(int(key))
+
+
+def bucket_index(dates, start_date, end_date, view_type):
+    """
+    Vị trí kỳ (0..n_periods-1) của từng ngày trong dates, -1 nếu nằm ngoài khoảng.
+    Trả về (mảng vị trí, mảng khóa kỳ liên tục của cả khoảng); khoảng ngược
+    (end_date < start_date) không có kỳ nào.
+    """
+    if view_type not in VIEW_TYPES:
+        raise ValueError(f"view_type không hợp lệ: {view_type}")
+    first_day, last_day = day_number(start_date), day_number(end_date)
+    if last_day < first_day:
+        return np.full(len(dates), -1, dtype=np.int64), np.empty(0, dtype=np.int64)
+    table = day_to_period_table(view_type, first_day, last_day)
+    period_keys = np.unique(table)
+
+    days = np.fromiter((day_number(d) for d in dates), dtype=np.int64, count=len(dates))
+    in_range = (days >= first_day) & (days <= last_day)
+    positions = np.full(len(days), -1, dtype=np.int64)
+    positions[in_range] = table[days[in_range] - first_day] - period_keys[0]
+    return positions, period_keys
+
+
+def dense_series(dates, values, start_date, end_date, view_type='day'):
+    """Chuỗi (period, revenue) liên tục, kỳ không có dữ liệu = 0"""
+    positions, period_keys = bucket_index(dates, start_date, end_date, view_type)
+    totals = np.zeros(len(period_keys), dtype=float)
+    mask = positions >= 0
+    np.add.at(totals, positions[mask], np.asarray(values, dtype=float)[mask])
+    return pd.DataFrame({
+        'period': [period_label(view_type, key) for key in period_keys],
+        'revenue': totals,
+    })
+
+
+def dense_matrix(dates, categories, values, start_date, end_date, view_type='day'):
+    """
+    Ma trận kỳ × danh mục (điền 0) ở dạng dài (period, category, revenue)
+    để vẽ stacked chart mà không thiếu kỳ.
+    """
+    positions, period_keys = bucket_index(dates, start_date, end_date, view_type)
+    category_names, category_pos = np.unique(np.asarray(categories, dtype=object).astype(str), return_inverse=True)
+    matrix = np.zeros((len(period_keys), len(category_names)), dtype=float)
+    mask = positions >= 0
+    np.add.at(matrix, (positions[mask], category_pos[mask]), np.asarray(values, dtype=float)[mask])
+
+    labels = [period_label(view_type, key) for key in period_keys]
+    return pd.DataFrame({
+        'period': np.repeat(labels, len(category_names)),
+        'category': np.tile(category_names, len(period_keys)),
+        'revenue': matrix.ravel(),
+    })
@@ -0,0 +1,125 @@
+import threading
+from array import array
+from datetime import date
+
+# Trạng thái cuối của mỗi biến thể trong collection kf_new (product_fetcher.py) để tính
+# sold_in_date / stock_increased / stock_decreased trong bộ nhớ thay vì find_one từng biến thể.
+# Nạp theo danh mục khi bắt đầu crawl danh mục đó (chỉ lấy phần tử cuối của các mảng lịch sử),
+# dùng chung cho cả lần chạy, lưu trong các mảng song song kiểu số (array) với dict product_id -> vị trí.
+NO_DATE = 0
+
+LAST_STATE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "sales_history": {"$slice": -1},
+    "stock_history": {"$slice": -1},
+    "price_history": {"$slice": -1},
+}
+
+
+def day_ordinal(date_str):
+    return date.fromisoformat(date_str).toordinal()
+
+
+class VariantDelta:
+    """Kết quả so sánh một lần crawl với trạng thái cuối"""
+    __slots__ = ('exists', 'sales_same_day', 'sold_in_date', 'stock_same_day', 'stock_change',
+                 'price_same_day')
+
+    def __init__(self, exists, sales_same_day, sold_in_date, stock_same_day, stock_change, price_same_day):
+        self.exists = exists
+        self.sales_same_day = sales_same_day
+        self.sold_in_date = sold_in_date
+        self.stock_same_day = stock_same_day
+        self.stock_change = stock_change
+        self.price_same_day = price_same_day
+
+
+class LastStateMap:
+    """product_id -> (ngày/total_sold của sales cuối, ngày/tồn của stock cuối, ngày/giá của price cuối)"""
+
+    def __init__(self):
+        self.index = {}
+        self.sales_day = array('i')
+        self.total_sold = array('q')
+        self.stock_day = array('i')
+        self.stock = array('q')
+        self.price_day = array('i')
+        self.price = array('q')
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, product_id):
+        return product_id in self.index
+
+    @classmethod
+    def load(cls, collection, query=None):
+        """Một lần quét collection (chỉ phần tử cuối của mỗi mảng lịch sử)"""
+        state = cls()
+        state.update_from(collection.find(query or {}, LAST_STATE_PROJECTION))
+        return state
+
+    def warm(self, collection, category):
+        """Nạp trạng thái các biến thể của một danh mục (ở trang đầu tiên của danh mục đó)"""
+        self.update_from(collection.find({"category": category}, LAST_STATE_PROJECTION))
+        return self
+
+    def reload(self, collection, product_ids):
+        """Đọc lại trạng thái của một số sản phẩm (ví dụ sau khi bulk_write lỗi)"""
+        self.update_from(collection.find({"id": {"$in": list(product_ids)}}, LAST_STATE_PROJECTION))
+
+    def update_from(self, documents):
+        for doc in documents:
+            sales = (doc.get("sales_history") or [None])[-1]
+            stock = (doc.get("stock_history") or [None])[-1]
+            price = (doc.get("price_history") or [None])[-1]
+            with self.lock:
+                slot = self._slot(doc["id"])
+                self.sales_day[slot] = day_ordinal(sales["date"]) if sales else NO_DATE
+                self.total_sold[slot] = int(sales.get("total_sold") or 0) if sales else 0
+                self.stock_day[slot] = day_ordinal(stock["date"]) if stock else NO_DATE
+                self.stock[slot] = int(stock.get("stock_quantity") or 0) if stock else 0
+                self.price_day[slot] = day_ordinal(price["date"]) if price else NO_DATE
+                self.price[slot] = int(price.get("price") or 0) if price else 0
+
+    def _slot(self, product_id):
+        slot = self.index.get(product_id)
+        if slot is None:
+            slot = self.index[product_id] = len(self.sales_day)
+            for column in (self.sales_day, self.total_sold, self.stock_day, self.stock,
+                           self.price_day, self.price):
+                column.append(0)
+        return slot
+
+    def observe(self, product_id, today_date, total_sold, stock_quantity, price):
+        """
+        Tính delta của lần crawl này so với trạng thái cuối rồi cập nhật trạng thái,
+        theo đúng quy tắc của product_fetcher (cùng ngày thì cộng dồn, ngày mới thì thêm phần tử).
+        """
+        today = day_ordinal(today_date)
+        with self.lock:
+            slot = self.index.get(product_id)
+            if slot is None:
+                slot = self._slot(product_id)
+                delta = VariantDelta(False, False, 0, False, 0, False)
+            else:
+                sales_same_day = self.sales_day[slot] == today
+                previous_total = self.total_sold[slot] if self.sales_day[slot] != NO_DATE else 0
+                stock_same_day = self.stock_day[slot] == today
+                delta = VariantDelta(
+                    True,
+                    sales_same_day,
+                    max(0, total_sold - previous_total),
+                    stock_same_day,
+                    stock_quantity - self.stock[slot] if stock_same_day else 0,
+                    self.price_day[slot] == today,
+                )
+            self.sales_day[slot] = today
+            self.total_sold[slot] = total_sold
+            self.stock_day[slot] = today
+            self.stock[slot] = stock_quantity
+            self.price_day[slot] = today
+            self.price[slot] = price
+        return delta
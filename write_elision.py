@@ -0,0 +1,94 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bỏ qua ghi lại biến thể không đổi khi crawl (test.py): giữ trong bộ nhớ trạng thái đã ghi gần nhất
+# của mỗi biến thể (nạp sẵn từ DB khi bắt đầu). Biến thể không đổi chỉ được cập nhật mốc "last seen"
+# (product.date/updated_at) theo lô mỗi trang. price_history/stock_history chỉ ghi khi giá/tồn đổi;
+# các truy vấn giá đã dùng as-of join (sales_rollup.AS_OF_PRICE_SQL) nên không cần dòng cho mọi ngày.
+# WRITE_ELISION=0 để luôn ghi đầy đủ như trước.
+WRITE_ELISION = os.getenv('WRITE_ELISION', '1') != '0'
+
+
+def product_fingerprint(name, stock_quantity, total_sold, price, original_price, promotion, category):
+    """Các cột của bảng product mà crawl ghi (trừ date/created_at/updated_at)"""
+    return (name, stock_quantity, total_sold, price, original_price, promotion, category)
+
+
+class VariantStateCache:
+    """Trạng thái đã ghi gần nhất theo product_id: fingerprint product, tồn kho, (giá, giá gốc)"""
+
+    def __init__(self):
+        self.products = {}
+        self.stock = {}
+        self.prices = {}
+        self.unchanged = 0
+
+    def warm(self, cursor, category=None):
+        """
+        Nạp trạng thái hiện có trong DB (mỗi bảng một truy vấn). category giới hạn
+        theo danh mục đang crawl; sản phẩm không có trong cache sẽ được ghi bình thường.
+        """
+        where, params = ("WHERE p.category = %s", (category,)) if category is not None else ("", ())
+        cursor.execute(f"""
+            SELECT p.product_id, p.name, p.stock_quantity, p.total_sold, p.price,
+                   p.original_price, p.promotion, p.category
+            FROM product p {where}
+        """, params)
+        for product_id, *columns in cursor.fetchall():
+            self.products[product_id] = product_fingerprint(*columns)
+
+        # Dòng mới nhất mỗi sản phẩm (unique_product_date nên MAX(date) là duy nhất)
+        for table, target in (('stock_history', 'stock'), ('price_history', 'prices')):
+            value_columns = "h.stock_quantity" if table == 'stock_history' else "h.price, h.original_price"
+            cursor.execute(f"""
+                SELECT h.product_id, {value_columns}
+                FROM {table} h
+                JOIN (
+                    SELECT x.product_id, MAX(x.date) AS max_date
+                    FROM {table} x
+                    JOIN product p ON x.product_id = p.product_id
+                    {where}
+                    GROUP BY x.product_id
+                ) latest ON h.product_id = latest.product_id AND h.date = latest.max_date
+            """, params)
+            cache = getattr(self, target)
+            for row in cursor.fetchall():
+                cache[row[0]] = row[1] if table == 'stock_history' else (row[1], row[2])
+
+        logger.info(f"Write elision: nạp {len(self.products)} sản phẩm, {len(self.stock)} tồn kho, "
+                    f"{len(self.prices)} giá" + (f" cho {category}" if category is not None else ""))
+        return self
+
+    def product_changed(self, product_id, fingerprint):
+        return self.products.get(product_id) != fingerprint
+
+    def stock_changed(self, product_id, stock_quantity):
+        return self.stock.get(product_id) != stock_quantity
+
+    def price_changed(self, product_id, price, original_price):
+        return self.prices.get(product_id) != (price, original_price)
+
+    def remember(self, product_id, fingerprint, stock_quantity, price, original_price):
+        self.products[product_id] = fingerprint
+        self.stock[product_id] = stock_quantity
+        self.prices[product_id] = (price, original_price)
+
+    def forget(self, product_id):
+        """Bỏ trạng thái của sản phẩm (ví dụ khi transaction bị rollback)"""
+        self.products.pop(product_id, None)
+        self.stock.pop(product_id, None)
+        self.prices.pop(product_id, None)
+
+
+def touch_last_seen(cursor, product_ids, date_str, time_str):
+    """Cập nhật mốc last seen cho các sản phẩm không đổi bằng một UPDATE"""
+    if not product_ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(f"""
+        UPDATE product SET date = %s, updated_at = %s
+        WHERE product_id IN ({placeholders})
+    """, [date_str, time_str, *product_ids])
+    return cursor.rowcount